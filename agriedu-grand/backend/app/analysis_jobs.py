@@ -0,0 +1,190 @@
+"""Асинхронные анализы (mode=async): статус и результат в памяти процесса.
+
+Запрос отвечает 202 сразу после загрузки, анализ выполняется фоновой задачей.
+Одновременно в пул инференса идут не больше ``concurrency`` задач, остальные
+ждут в статусе queued. Готовый результат хранится ``result_ttl`` секунд, дальше
+его отдаёт история анализов (AnalysisStore). Смены статуса пишутся и в общую
+базу истории, поэтому опрос, попавший на другой воркер, видит задачу сразу.
+"""
+import asyncio
+import sqlite3
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Set
+
+from app import config
+
+ANALYSIS_JOB_STATUSES = ("queued", "running", "completed", "failed")
+FINAL_JOB_STATUSES = ("completed", "failed")
+
+
+class AnalysisJobsFull(Exception):
+    """Слишком много незавершённых асинхронных анализов"""
+
+
+class AnalysisJobs:
+    """Фоновые анализы с ожиданием результата (long-poll, SSE)"""
+
+    def __init__(
+        self,
+        max_pending: int = config.ANALYSIS_ASYNC_MAX_PENDING,
+        concurrency: int = config.ANALYSIS_ASYNC_CONCURRENCY,
+        result_ttl: float = config.ANALYSIS_ASYNC_RESULT_TTL,
+        store=None,
+    ):
+        self.max_pending = max_pending
+        self.concurrency = max(1, concurrency)
+        self.result_ttl = result_ttl
+        # AnalysisStore (put_job) для статусов, видимых всем воркерам
+        self.store = store
+
+        self._jobs: Dict[str, Dict] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Метрики
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.store_errors = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+
+    def pending(self) -> int:
+        return sum(1 for job in self._jobs.values() if job["status"] not in FINAL_JOB_STATUSES)
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished"] is not None and now - job["finished"] > self.result_ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    async def _publish(self, job_id: str, job: Dict):
+        if self.store is None:
+            return
+        try:
+            await self.store.put_job(job_id, job["status"], job["created_at"], job["error"], job["status_code"])
+        except sqlite3.Error:
+            # Статус остаётся виден этому воркеру; анализ из-за сбоя базы не прерывается
+            self.store_errors += 1
+
+    async def submit(
+        self, job_id: str, work: Callable[[], Awaitable[Dict]], on_done: Optional[Callable[[], None]] = None
+    ) -> Dict:
+        """Запуск work() в фоне; AnalysisJobsFull, если очередь заполнена.
+
+        Статус queued записан в общую базу до возврата, то есть до ответа 202.
+        on_done вызывается после завершения задачи, в том числе отменённой до старта.
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self._expire()
+        if self.pending() >= self.max_pending:
+            self.rejected += 1
+            raise AnalysisJobsFull()
+
+        job = {
+            "status": "queued",
+            "created_at": datetime.now().isoformat(),
+            "submitted": time.monotonic(),
+            "finished": None,
+            "result": None,
+            "error": None,
+            "status_code": None,
+            "done": asyncio.Event(),
+        }
+        self._jobs[job_id] = job
+        self.submitted += 1
+        await self._publish(job_id, job)
+        task = loop.create_task(self._run(job_id, job, work))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        if on_done is not None:
+            task.add_done_callback(lambda _: on_done())
+        return self._view(job_id, job)
+
+    async def _run(self, job_id: str, job: Dict, work: Callable[[], Awaitable[Dict]]):
+        try:
+            async with self._semaphore:
+                job["status"] = "running"
+                await self._publish(job_id, job)
+                started = time.monotonic()
+                self.wait_seconds += started - job["submitted"]
+                try:
+                    job["result"] = await work()
+                    job["status"] = "completed"
+                    self.completed += 1
+                finally:
+                    self.run_seconds += time.monotonic() - started
+        except asyncio.CancelledError:
+            job.update(status="failed", error="Сервер остановлен до завершения анализа", status_code=503)
+            self.failed += 1
+            raise
+        except Exception as e:
+            # HTTPException несёт код и текст для клиента, остальное - внутренняя ошибка
+            job.update(
+                status="failed",
+                error=getattr(e, "detail", None) or str(e),
+                status_code=getattr(e, "status_code", 500),
+            )
+            self.failed += 1
+        finally:
+            job["finished"] = time.monotonic()
+            job["done"].set()
+            await self._publish(job_id, job)
+
+    @staticmethod
+    def _view(job_id: str, job: Dict) -> Dict:
+        view = {"id": job_id, "kind": "disease", "status": job["status"], "created_at": job["created_at"]}
+        if job["status"] == "completed":
+            view["result"] = job["result"]
+        elif job["status"] == "failed":
+            view["error"] = job["error"]
+            view["status_code"] = job["status_code"]
+        return view
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self._jobs.get(job_id)
+        return self._view(job_id, job) if job is not None else None
+
+    async def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Ожидание завершения не дольше timeout секунд; текущее состояние задачи"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        if timeout > 0:
+            try:
+                await asyncio.wait_for(job["done"].wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._view(job_id, job)
+
+    def stats(self) -> Dict:
+        finished = self.completed + self.failed
+        return {
+            "max_pending": self.max_pending,
+            "concurrency": self.concurrency,
+            "pending": self.pending(),
+            "tracked": len(self._jobs),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "store_errors": self.store_errors,
+            "avg_wait_ms": round(self.wait_seconds / finished * 1000, 3) if finished else 0,
+            "avg_run_ms": round(self.run_seconds / finished * 1000, 3) if finished else 0,
+        }
+
+    async def shutdown(self):
+        """Отмена незавершённых анализов (клиенты увидят status failed)"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,474 @@
+"""История анализов и прогнозов в SQLite (WAL) с фоновой пакетной записью.
+
+Обработчики только кладут записи в очередь (``record``) и не ждут диска.
+Фоновая задача собирает до ``batch_size`` строк или ждёт ``flush_interval``
+секунд и пишет пачку одной транзакцией: строки в ``analyses`` и приращения
+дневных агрегатов в ``analysis_daily``. Статистика дашборда читается только
+из агрегатов, поэтому её стоимость не растёт вместе с историей.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app import config
+
+ANALYSIS_KINDS = ("disease", "yield")
+# Статусы асинхронных анализов старше этого срока удаляются, секунды
+JOB_STATUS_TTL = 24 * 3600
+
+# Измерения дневного агрегата; отсутствующее значение хранится как ''
+AGGREGATE_DIMENSIONS = ("day", "kind", "region", "crop", "disease")
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisStore:
+    """Хранилище истории: неблокирующая запись из обработчиков, чтение в потоке"""
+
+    COLUMNS = (
+        "id", "kind", "created_at", "region", "crop", "disease", "success",
+        "confidence", "area", "predicted_yield", "model_version", "payload",
+    )
+
+    def __init__(
+        self,
+        path: str = config.HISTORY_DB_PATH,
+        batch_size: int = config.HISTORY_BATCH_SIZE,
+        flush_interval: float = config.HISTORY_FLUSH_INTERVAL,
+        queue_size: int = config.HISTORY_QUEUE_SIZE,
+    ):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = max(0.0, flush_interval)
+        self.queue_size = queue_size
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Поставленные, но ещё не записанные строки: get() видит результат сразу после ответа
+        self._unwritten: Dict[str, Dict] = {}
+
+        # Метрики
+        self.pending = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.write_errors = 0
+        self.flushes = 0
+        self.write_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Вызывается под self._lock
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analyses ("
+                "id TEXT PRIMARY KEY, kind TEXT NOT NULL, created_at TEXT NOT NULL, "
+                "region TEXT, crop TEXT, disease TEXT, success INTEGER NOT NULL, "
+                "confidence REAL, area REAL, predicted_yield REAL, model_version TEXT, payload TEXT)"
+            )
+            for column in ("created_at", "region", "crop", "disease"):
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS analyses_{column} ON analyses ({column}, created_at)"
+                )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_daily ("
+                "day TEXT NOT NULL, kind TEXT NOT NULL, region TEXT NOT NULL, crop TEXT NOT NULL, "
+                "disease TEXT NOT NULL, count INTEGER NOT NULL, successes INTEGER NOT NULL, "
+                "confidence_sum REAL NOT NULL, area_sum REAL NOT NULL, yield_sum REAL NOT NULL, "
+                f"PRIMARY KEY ({', '.join(AGGREGATE_DIMENSIONS)}))"
+            )
+            # Статусы асинхронных анализов: видны всем воркерам, а не только принявшему запрос
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS analysis_jobs ("
+                "id TEXT PRIMARY KEY, status TEXT NOT NULL, created_at TEXT NOT NULL, "
+                "updated_at REAL NOT NULL, error TEXT, status_code INTEGER)"
+            )
+            self._conn = conn
+        return self._conn
+
+    # ---- запись ----
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self.pending = 0
+            self._unwritten.clear()
+            self._task = loop.create_task(self._run())
+
+    def start(self):
+        if self.enabled:
+            self._ensure_started()
+
+    def record(self, entry: Dict) -> bool:
+        return self.record_many([entry])
+
+    def record_many(self, entries: List[Dict]) -> bool:
+        """Постановка записей в очередь без ожидания; False, если очередь заполнена"""
+        if not self.enabled or not entries:
+            return False
+        self._ensure_started()
+        if self.pending + len(entries) > self.queue_size:
+            self.dropped += len(entries)
+            return False
+        self.pending += len(entries)
+        for entry in entries:
+            self._unwritten[entry["id"]] = entry
+        self._queue.put_nowait(entries)
+        return True
+
+    async def _collect(self) -> Tuple[List[Dict], bool]:
+        """Пачка строк и признак остановки (в очереди встретился None)"""
+        item = await self._queue.get()
+        if item is None:
+            return [], True
+        rows = list(item)
+        deadline = self._loop.time() + self.flush_interval
+        while len(rows) < self.batch_size:
+            if not self._queue.empty():
+                item = self._queue.get_nowait()
+            else:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            if item is None:
+                return rows, True
+            rows.extend(item)
+        return rows, False
+
+    async def _run(self):
+        while True:
+            rows, stop = await self._collect()
+            if rows:
+                try:
+                    await asyncio.to_thread(self._write, rows)
+                finally:
+                    self.pending -= len(rows)
+                    for entry in rows:
+                        self._unwritten.pop(entry["id"], None)
+            if stop:
+                return
+
+    def _write(self, entries: List[Dict]):
+        """Пачка одной транзакцией; если её отвергла одна плохая строка - поштучно"""
+        started = time.perf_counter()
+        try:
+            self._insert(entries)
+        except sqlite3.IntegrityError as e:
+            if len(entries) == 1:
+                self._write_failed(entries, e)
+                return
+            written = 0
+            for entry in entries:
+                try:
+                    self._insert([entry])
+                    written += 1
+                except sqlite3.Error as e:
+                    self._write_failed([entry], e)
+            self.written += written
+        except sqlite3.Error as e:
+            self._write_failed(entries, e)
+            return
+        else:
+            self.written += len(entries)
+
+        self.flushes += 1
+        self.write_seconds += time.perf_counter() - started
+
+    def _write_failed(self, entries: List[Dict], error: sqlite3.Error):
+        self.failed += len(entries)
+        self.write_errors += 1
+        logger.error(
+            "История анализов: не удалось записать %d строк (первая %s): %s",
+            len(entries), entries[0]["id"], error
+        )
+
+    def _insert(self, entries: List[Dict]):
+        """Одна транзакция: строки истории и приращения агрегатов"""
+        rows = [tuple(entry.get(column) for column in self.COLUMNS) for entry in entries]
+        increments: Dict[Tuple, List[float]] = {}
+        for entry in entries:
+            key = (entry["created_at"][:10], entry["kind"]) + tuple(
+                entry.get(name) or "" for name in AGGREGATE_DIMENSIONS[2:]
+            )
+            totals = increments.setdefault(key, [0, 0, 0.0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += 1 if entry["success"] else 0
+            totals[2] += entry.get("confidence") or 0.0
+            totals[3] += entry.get("area") or 0.0
+            totals[4] += entry.get("predicted_yield") or 0.0
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN")
+            try:
+                # Агрегаты считаются по всем строкам пачки: строка с повторным id (app.ids
+                # выдаёт уникальные, но запись могли поставить дважды) откатывает транзакцию
+                conn.executemany(
+                    f"INSERT INTO analyses ({', '.join(self.COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(self.COLUMNS))})",
+                    rows
+                )
+                conn.executemany(
+                    f"INSERT INTO analysis_daily VALUES ({', '.join('?' * 10)}) "
+                    f"ON CONFLICT ({', '.join(AGGREGATE_DIMENSIONS)}) DO UPDATE SET "
+                    "count = count + excluded.count, successes = successes + excluded.successes, "
+                    "confidence_sum = confidence_sum + excluded.confidence_sum, "
+                    "area_sum = area_sum + excluded.area_sum, yield_sum = yield_sum + excluded.yield_sum",
+                    [key + tuple(totals) for key, totals in increments.items()]
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    # ---- статусы асинхронных анализов ----
+
+    def _put_job(self, job_id: str, status: str, created_at: str, error: Optional[str], status_code: Optional[int]):
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT INTO analysis_jobs VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO UPDATE SET "
+                "status = excluded.status, updated_at = excluded.updated_at, "
+                "error = excluded.error, status_code = excluded.status_code",
+                (job_id, status, created_at, now, error, status_code)
+            )
+            if status == "queued":
+                conn.execute("DELETE FROM analysis_jobs WHERE updated_at < ?", (now - JOB_STATUS_TTL,))
+
+    async def put_job(
+        self, job_id: str, status: str, created_at: str,
+        error: Optional[str] = None, status_code: Optional[int] = None
+    ):
+        """Запись статуса асинхронного анализа (сразу, без очереди: его читают другие воркеры)"""
+        if self.enabled:
+            await asyncio.to_thread(self._put_job, job_id, status, created_at, error, status_code)
+
+    def _get_job(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT status, created_at, error, status_code FROM analysis_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, created_at, error, status_code = row
+        job = {"id": job_id, "kind": "disease", "status": status, "created_at": created_at}
+        if status == "failed":
+            job.update(error=error, status_code=status_code)
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        return await asyncio.to_thread(self._get_job, job_id)
+
+    # ---- чтение ----
+
+    def _row_to_entry(self, row) -> Dict:
+        entry = dict(zip(self.COLUMNS, row))
+        entry["success"] = bool(entry["success"])
+        entry["payload"] = json.loads(entry["payload"]) if entry["payload"] else None
+        return entry
+
+    def _get(self, analysis_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM analyses WHERE id = ?", (analysis_id,)
+            ).fetchone()
+        return self._row_to_entry(row) if row else None
+
+    async def get(self, analysis_id: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        if analysis_id in self._unwritten:
+            return self._row_to_entry(tuple(self._unwritten[analysis_id].get(c) for c in self.COLUMNS))
+        return await asyncio.to_thread(self._get, analysis_id)
+
+    def _query(self, filters: Dict, since: Optional[str], until: Optional[str], limit: int) -> List[Dict]:
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM analyses"
+        clauses, args = [], []
+        for column, value in filters.items():
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if since:
+            clauses.append("created_at >= ?")
+            args.append(since)
+        if until:
+            clauses.append("created_at < ?")
+            args.append(until)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._connection().execute(query, args + [limit]).fetchall()
+        return [self._row_to_entry(row) for row in rows]
+
+    async def query(
+        self,
+        kind: Optional[str] = None,
+        region: Optional[str] = None,
+        crop: Optional[str] = None,
+        disease: Optional[str] = None,
+        since: Optional[str] = None,
+        until: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict]:
+        """Последние записи по фильтрам (новые первыми)"""
+        if not self.enabled:
+            return []
+        filters = {"kind": kind, "region": region, "crop": crop, "disease": disease}
+        return await asyncio.to_thread(self._query, filters, since, until, limit)
+
+    def _summary(self, days: Optional[int], top: int) -> Dict:
+        where, args = "", []
+        if days:
+            where = "WHERE day >= ?"
+            args.append((datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d"))
+        sums = "SUM(count), SUM(successes), SUM(confidence_sum), SUM(area_sum), SUM(yield_sum)"
+        with self._lock:
+            conn = self._connection()
+            totals = conn.execute(f"SELECT kind, {sums} FROM analysis_daily {where} GROUP BY kind", args).fetchall()
+            today = conn.execute(
+                "SELECT kind, SUM(count) FROM analysis_daily WHERE day = ? GROUP BY kind",
+                (datetime.now().strftime("%Y-%m-%d"),)
+            ).fetchall()
+            breakdowns = {
+                name: conn.execute(
+                    f"SELECT {column}, SUM(count) FROM analysis_daily "
+                    f"{where + ' AND' if where else 'WHERE'} kind = ? AND {column} != '' "
+                    f"GROUP BY {column} ORDER BY 2 DESC LIMIT ?",
+                    args + [kind, top]
+                ).fetchall()
+                for name, column, kind in (
+                    ("top_diseases", "disease", "disease"),
+                    ("analyses_by_region", "region", "disease"),
+                    ("analyses_by_crop", "crop", "disease"),
+                    ("yield_predictions_by_crop", "crop", "yield"),
+                    ("yield_predictions_by_region", "region", "yield"),
+                )
+            }
+
+        by_kind = {kind: [0, 0, 0.0, 0.0, 0.0] for kind in ANALYSIS_KINDS}
+        for kind, *values in totals:
+            by_kind[kind] = values
+        count, successes, confidence_sum, _, _ = by_kind["disease"]
+        yield_count, _, _, area_sum, yield_sum = by_kind["yield"]
+        return {
+            "total_analyses": count,
+            "successful_predictions": successes,
+            "success_rate": round(successes / count * 100, 1) if count else 0.0,
+            "avg_confidence": round(confidence_sum / successes * 100, 1) if successes else 0.0,
+            "total_yield_predictions": yield_count,
+            "total_area_hectares": round(area_sum, 2),
+            "avg_yield_per_hectare": round(yield_sum / area_sum, 2) if area_sum else 0.0,
+            "today": {**dict.fromkeys(ANALYSIS_KINDS, 0), **dict(today)},
+            **{name: dict(rows) for name, rows in breakdowns.items()},
+        }
+
+    async def summary(self, days: Optional[int] = None, top: int = 5) -> Dict:
+        """Сводка для дашборда из дневных агрегатов (за последние days дней или за всё время)"""
+        if not self.enabled:
+            return self._empty_summary()
+        return await asyncio.to_thread(self._summary, days, top)
+
+    @staticmethod
+    def _empty_summary() -> Dict:
+        return {
+            "total_analyses": 0, "successful_predictions": 0, "success_rate": 0.0, "avg_confidence": 0.0,
+            "total_yield_predictions": 0, "total_area_hectares": 0.0, "avg_yield_per_hectare": 0.0,
+            "today": dict.fromkeys(ANALYSIS_KINDS, 0),
+            "top_diseases": {}, "analyses_by_region": {}, "analyses_by_crop": {},
+            "yield_predictions_by_crop": {}, "yield_predictions_by_region": {},
+        }
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "write_errors": self.write_errors,
+            "flushes": self.flushes,
+            "avg_flush_rows": round(self.written / self.flushes, 1) if self.flushes else 0,
+            "avg_flush_ms": round(self.write_seconds / self.flushes * 1000, 3) if self.flushes else 0,
+        }
+
+    async def shutdown(self):
+        """Остановка писателя: всё, что уже в очереди, записывается до закрытия базы"""
+        if self._task is not None and not self._task.done():
+            # Метка остановки встаёт за уже поставленными записями
+            self._queue.put_nowait(None)
+            await self._task
+        self._task = None
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def disease_entry(analysis_id: str, plant_type: str, region: Optional[str], result: Dict) -> Dict:
+    """Строка истории для анализа болезни (heatmap и её кодировки не сохраняются)"""
+    payload = {
+        key: value for key, value in result.items()
+        if not key.startswith("heatmap") and key not in ("analysis_id", "timestamp")
+    }
+    return {
+        "id": analysis_id,
+        "kind": "disease",
+        "created_at": result.get("timestamp") or datetime.now().isoformat(),
+        "region": region,
+        "crop": plant_type,
+        "disease": result.get("disease"),
+        "success": bool(result.get("success")),
+        "confidence": result.get("confidence"),
+        "model_version": result.get("model_version"),
+        "payload": json.dumps(payload, ensure_ascii=False, default=str),
+    }
+
+
+def yield_entry(prediction_id: str, crop: str, area: float, region: Optional[str], result: Dict,
+                created_at: Optional[str] = None) -> Dict:
+    """Строка истории для прогноза урожайности"""
+    return {
+        "id": prediction_id,
+        "kind": "yield",
+        "created_at": created_at or datetime.now().isoformat(),
+        "region": region,
+        "crop": crop,
+        "disease": None,
+        "success": True,
+        "confidence": result.get("confidence"),
+        "area": area,
+        "predicted_yield": result.get("predicted_yield_tons"),
+        "model_version": result.get("model_version"),
+        "payload": json.dumps(result, ensure_ascii=False, default=str),
+    }
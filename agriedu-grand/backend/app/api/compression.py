@@ -0,0 +1,161 @@
+"""Сжатие ответов gzip / brotli с порогом по размеру"""
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from app import config
+from app.api.http_cache import choose_encoding
+
+# Сжимаются только текстовые форматы; изображения и архивы уже сжаты
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/x-ndjson", "application/javascript",
+    "application/xml", "image/svg+xml",
+)
+# SSE должен уходить клиенту событие за событием, без буферизации в сжатии
+SKIPPED_TYPES = ("text/event-stream",)
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class _Compressor:
+    """Потоковый компрессор: chunk() отдаёт всё сжатое к этому моменту, finish() - хвост"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = _brotli().Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self._brotli is not None:
+            return self._brotli.process(data) + self._brotli.finish()
+        return self._zlib.compress(data) + self._zlib.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware: br или gzip по Accept-Encoding для текстовых ответов от min_size байт.
+
+    Ответ целиком (без more_body) меньше порога уходит как есть. Потоковые
+    ответы (NDJSON) сжимаются по чанкам с flush, чтобы строки доходили сразу.
+    Уже закодированные ответы (готовые .br/.gz фронтенда), HEAD, 204/304 и SSE
+    не трогаются. Сильный ETag сжатого ответа становится слабым: тело другое,
+    а If-None-Match сравнивается слабым сравнением.
+    """
+
+    def __init__(
+        self,
+        app,
+        min_size: int = config.COMPRESSION_MIN_SIZE,
+        gzip_level: int = config.COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = config.COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.encodings = ("br", "gzip") if _brotli() is not None else ("gzip",)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.min_size <= 0 or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        accept = None
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value.decode("latin-1")
+                break
+        encoding = choose_encoding(accept, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSend(send, encoding, self))
+
+
+class _CompressingSend:
+    def __init__(self, send, encoding: str, middleware: CompressionMiddleware):
+        self.send = send
+        self.encoding = encoding
+        self.middleware = middleware
+        self.start: Optional[Dict] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    def _eligible(self, headers: List[Tuple[bytes, bytes]]) -> bool:
+        if self.start["status"] in (204, 304) or self.start["status"] < 200:
+            return False
+        content_type = b""
+        for name, value in headers:
+            if name == b"content-encoding":
+                return False
+            if name == b"content-type":
+                content_type = value.lower()
+        content_type = content_type.decode("latin-1")
+        return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith(SKIPPED_TYPES)
+
+    def _compressed_headers(self, length: Optional[int]) -> List[Tuple[bytes, bytes]]:
+        headers = []
+        vary = None
+        for name, value in self.start["headers"]:
+            if name == b"content-length":
+                continue
+            if name == b"vary":
+                vary = value
+                continue
+            if name == b"etag" and not value.startswith(b"W/"):
+                value = b"W/" + value
+            headers.append((name, value))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        if vary is None:
+            headers.append((b"vary", b"Accept-Encoding"))
+        elif b"accept-encoding" not in vary.lower():
+            headers.append((b"vary", vary + b", Accept-Encoding"))
+        else:
+            headers.append((b"vary", vary))
+        if length is not None:
+            headers.append((b"content-length", str(length).encode()))
+        return headers
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = not self._eligible(message.get("headers", []))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        middleware = self.middleware
+
+        if self.compressor is None:
+            if not more_body:
+                # Ответ целиком: сжимаем, только если он не меньше порога и сжатие выгодно
+                if len(body) >= middleware.min_size:
+                    compressed = _Compressor(self.encoding, middleware.gzip_level, middleware.brotli_quality).finish(body)
+                    if len(compressed) < len(body):
+                        await self.send({**self.start, "headers": self._compressed_headers(len(compressed))})
+                        await self.send({"type": "http.response.body", "body": compressed})
+                        return
+                await self.send(self.start)
+                await self.send(message)
+                return
+            self.compressor = _Compressor(self.encoding, middleware.gzip_level, middleware.brotli_quality)
+            await self.send({**self.start, "headers": self._compressed_headers(None)})
+
+        data = self.compressor.chunk(body) if more_body else self.compressor.finish(body)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more_body})
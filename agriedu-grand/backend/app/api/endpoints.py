@@ -1,78 +1,204 @@
-﻿from fastapi import APIRouter, UploadFile, File, Form, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse, StreamingResponse
-from typing import List, Optional
-import json
+﻿from fastapi import APIRouter, UploadFile, File, Form, Header, HTTPException, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from typing import BinaryIO, Dict, List, Optional, Tuple, Union
 import asyncio
 from datetime import datetime
 
-from app.ml.plant_disease import PlantDiseaseModel
+from app import config
+from app.metrics import time_stage
+from app.ids import new_id
+from app.analysis_store import ANALYSIS_KINDS, AnalysisStore, disease_entry, yield_entry
+from app.analysis_jobs import AnalysisJobs, AnalysisJobsFull
+from app.lessons import InvalidCursor, LessonCatalogue, LessonNotFound
+from app.reference import ReferenceCatalogue
+from app.ml.registry import ModelRegistry, ModelVersionNotFound
+from app.ml.inference import InferencePool, InferenceQueueFull, InferenceTimeout
+from app.ml.batching import MicroBatcher
+from app.ml.cache import ResultCache, hash_image
+from app.ml.training import JOB_STATUSES, TrainingJobNotFound, TrainingQueueFull, TrainingScheduler
+from app.ml.heatmap import HEATMAP_ENCODINGS, HeatmapStore, encode_heatmap, heatmap_to_png
+from app.api.uploads import ingest_upload
+from app.api.image_batch import FieldSummary, archive_sources, upload_sources
+from app.api.http_cache import cached_response
+from app.api.rate_limit import AdmissionSlot, ApiKeys
+from app.api.responses import FastJSONResponse, dumps, dumps_line
+from app.api.yield_batch import (
+    SUPPORTED_TYPES as YIELD_BATCH_TYPES, DuplexStreamingResponse, YieldRowError,
+    content_type_of, iter_yield_rows, parse_yield_row
+)
 
 router = APIRouter()
-plant_model = PlantDiseaseModel()
-
-# Образовательные данные
-EDUCATION_LESSONS = {
-    "agriculture": [
-        {
-            "id": 1,
-            "title": "Основы современного растениеводства",
-            "description": "Введение в современные методы выращивания сельскохозяйственных культур",
-            "duration": "45 минут",
-            "level": "Начинающий",
-            "topics": ["Почвоведение", "Семеноводство", "Ирригация", "Защита растений"],
-            "video_url": "https://example.com/video1"
-        },
-        {
-            "id": 2,
-            "title": "Биологические методы защиты растений",
-            "description": "Использование энтомофагов и биопрепаратов в сельском хозяйстве",
-            "duration": "60 минут",
-            "level": "Продвинутый",
-            "topics": ["Энтомофаги", "Биопрепараты", "Севоборот", "Агротехнические методы"],
-            "video_url": "https://example.com/video2"
-        }
-    ],
-    "ai_technology": [
-        {
-            "id": 3,
-            "title": "ИИ в точном земледелии",
-            "description": "Применение искусственного интеллекта для оптимизации сельского хозяйства",
-            "duration": "50 минут",
-            "level": "Средний",
-            "topics": ["Анализ спутниковых снимков", "Прогнозирование урожая", "Автоматизация"],
-            "video_url": "https://example.com/video3"
-        }
-    ]
-}
+# Модель загружается отложенно (см. ModelRegistry), поэтому здесь ничего тяжёлого не создаётся
+model_registry = ModelRegistry()
+inference_pool = InferencePool()
+batcher = MicroBatcher(lambda batch: model_registry.active.predict_batch(batch))
+result_cache = ResultCache()
+heatmap_store = HeatmapStore()
+training_scheduler = TrainingScheduler()
+analysis_store = AnalysisStore()
+analysis_jobs = AnalysisJobs(store=analysis_store)
+# Ключи, с которыми разрешена горячая замена модели
+model_admin_keys = ApiKeys(config.MODEL_ADMIN_KEYS)
+
+# Образовательные данные (app/data/lessons.json, загружаются при первом запросе)
+lesson_catalogue = LessonCatalogue()
+# Регионы, почвы и советы (app/data/reference.json)
+reference_catalogue = ReferenceCatalogue()
 
 # Эндпоинты API
 @router.post("/analyze-plant")
 async def analyze_plant(
+    request: Request,
     image: UploadFile = File(..., description="Фото растения для анализа"),
     plant_type: str = Form("tomato", description="Тип растения"),
-    location: Optional[str] = Form(None, description="Местоположение")
+    location: Optional[str] = Form(None, description="Местоположение"),
+    heatmap: str = Form(config.HEATMAP_ENCODING, description="Формат heatmap: json, raw, png или url"),
+    mode: str = Query("sync", description="sync - ответ с результатом, async - 202 и id для опроса")
 ):
     """Анализ болезни растения по фотографии"""
+    check_heatmap_encoding(heatmap)
+    if mode not in ("sync", "async"):
+        raise HTTPException(status_code=400, detail="mode должен быть sync или async")
+    
     try:
-        image_bytes = await image.read()
+        # Размер тела уже ограничен UploadSizeLimitMiddleware
+        with time_stage("upload_read"):
+            image_file = await ingest_upload(image, config.UPLOAD_MAX_BYTES)
         
-        if len(image_bytes) > 10 * 1024 * 1024:  # 10MB limit
-            raise HTTPException(status_code=400, detail="Файл слишком большой")
+        if mode == "async":
+            # Временный файл загрузки закрывается вместе с запросом, поэтому читаем его сейчас
+            image_bytes = await asyncio.to_thread(image_file.read)
+            # Место допуска остаётся занятым до конца фонового анализа
+            slot = getattr(request.state, "admission_slot", None)
+            return await submit_async_analysis(image_bytes, plant_type, location, heatmap, slot)
         
-        result = plant_model.predict_disease(image_bytes, plant_type)
+        result = await complete_disease_analysis(image_file, plant_type, location, heatmap, new_analysis_id())
         
-        if location:
-            result["location"] = location
-            result["regional_advice"] = get_regional_advice(location, plant_type)
-        
-        # Добавляем timestamp
-        result["analysis_id"] = f"ANALYSIS_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        result["timestamp"] = datetime.now().isoformat()
-        
-        return JSONResponse(content=result)
+        with time_stage("serialisation"):
+            response = FastJSONResponse(content=result)
+        return response
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Ошибка анализа: {str(e)}")
+        raise analysis_http_error(e)
+
+@router.post("/analyze-plant/batch")
+async def analyze_plant_batch(
+    images: List[UploadFile] = File(None, description="Фото растений"),
+    archive: Optional[UploadFile] = File(None, description="Zip-архив с фото"),
+    plant_type: str = Form("tomato", description="Тип растения"),
+    location: Optional[str] = Form(None, description="Местоположение"),
+    heatmap: str = Form(config.HEATMAP_ENCODING, description="Формат heatmap: json, raw, png или url")
+):
+    """Анализ серии фото с поля: поток NDJSON по мере готовности и итоговая сводка"""
+    check_heatmap_encoding(heatmap)
+    
+    sources = upload_sources(images or [], config.UPLOAD_MAX_BYTES)
+    if archive is not None:
+        sources += await asyncio.to_thread(
+            archive_sources, archive.file, config.UPLOAD_MAX_BYTES, config.ANALYZE_BATCH_MAX_IMAGES
+        )
+    if not sources:
+        raise HTTPException(status_code=400, detail="Нужны файлы images или zip-архив archive")
+    if len(sources) > config.ANALYZE_BATCH_MAX_IMAGES:
+        raise HTTPException(status_code=413, detail=f"Не больше {config.ANALYZE_BATCH_MAX_IMAGES} изображений за запрос")
+    
+    summary = FieldSummary(new_id("ANALYSIS_BATCH"))
+    
+    async def analyse(index: int, filename: str, load) -> Dict:
+        try:
+            image = await asyncio.to_thread(load)
+            result = await complete_disease_analysis(image, plant_type, location, heatmap, new_analysis_id())
+        except Exception as e:
+            error = analysis_http_error(e)
+            result = {"success": False, "error": error.detail, "status_code": error.status_code}
+        return {"index": index, "filename": filename, **result}
+    
+    async def stream_results():
+        # Не больше ANALYZE_BATCH_CONCURRENCY изображений в работе; одновременные
+        # изображения попадают в общий батч MicroBatcher, декодирование идёт в пуле
+        pending = set()
+        queued = iter(enumerate(sources))
+        try:
+            while True:
+                for index, (filename, load) in queued:
+                    pending.add(asyncio.ensure_future(analyse(index, filename, load)))
+                    if len(pending) >= config.ANALYZE_BATCH_CONCURRENCY:
+                        break
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    summary.add(result)
+                    yield dumps_line(result)
+        finally:
+            # Клиент отключился - оставшиеся изображения не анализируются
+            for task in pending:
+                task.cancel()
+        yield dumps_line({"summary": summary.as_dict()})
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@router.get("/analysis/{analysis_id}")
+async def get_analysis(analysis_id: str, wait: float = 0):
+    """Результат анализа или прогноза по id; для async-анализа - статус, wait секунд long-poll"""
+    job = await find_analysis(analysis_id, min(max(wait, 0), config.ANALYSIS_ASYNC_MAX_WAIT))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Анализ не найден")
+    if job["status"] in ("queued", "running"):
+        return FastJSONResponse(status_code=202, content=job, headers={"Retry-After": "1"})
+    return job
+
+@router.get("/analysis/{analysis_id}/events")
+async def analysis_events(analysis_id: str):
+    """SSE-поток: событие status, затем result (или error) по завершении анализа"""
+    job = await find_analysis(analysis_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Анализ не найден")
+    
+    def event(name: str, data: Dict) -> bytes:
+        return b"event: " + name.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+    
+    async def stream():
+        current = job
+        yield event("status", {"id": analysis_id, "status": current["status"]})
+        deadline = asyncio.get_running_loop().time() + config.ANALYSIS_EVENTS_TIMEOUT
+        while current["status"] in ("queued", "running"):
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                yield event("timeout", {"id": analysis_id, "status": current["status"]})
+                return
+            previous = current["status"]
+            current = await find_analysis(analysis_id, min(config.ANALYSIS_EVENTS_HEARTBEAT, remaining))
+            if current is None:
+                return
+            if current["status"] != previous:
+                yield event("status", {"id": analysis_id, "status": current["status"]})
+            elif current["status"] in ("queued", "running"):
+                yield b": ping\n\n"
+        yield event("result" if current["status"] == "completed" else "error", current)
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/analysis/{analysis_id}/heatmap")
+async def get_analysis_heatmap(analysis_id: str, format: str = "png"):
+    """Heatmap анализа в бинарном виде: PNG или сырые uint8 построчно"""
+    if format not in ("png", "raw"):
+        raise HTTPException(status_code=400, detail="Формат должен быть png или raw")
+    heatmap_array = await asyncio.to_thread(heatmap_store.get, analysis_id)
+    if heatmap_array is None:
+        raise HTTPException(status_code=404, detail="Heatmap не найдена")
+    
+    height, width = heatmap_array.shape
+    headers = {"X-Heatmap-Width": str(width), "X-Heatmap-Height": str(height), "Cache-Control": "private, max-age=3600"}
+    if format == "raw":
+        return Response(content=heatmap_array.tobytes(), media_type="application/octet-stream", headers=headers)
+    body = await asyncio.to_thread(heatmap_to_png, heatmap_array)
+    return Response(content=body, media_type="image/png", headers=headers)
 
 @router.get("/predict-yield")
 async def predict_yield(
@@ -86,120 +212,416 @@ async def predict_yield(
         if area <= 0:
             raise HTTPException(status_code=400, detail="Площадь должна быть положительной")
         
-        result = plant_model.predict_yield(crop, area, region)
+        # id региона (chuy) и название дают один и тот же ключ модели и истории
+        region = reference_catalogue.region_name(region)
+        model = await model_registry.get_active()
+        result = model.predict_yield(crop, area, region)
         
         if soil_type:
             result["soil_type"] = soil_type
-            result["soil_recommendations"] = get_soil_recommendations(soil_type, crop)
+            result["soil_recommendations"] = reference_catalogue.soil_recommendations(soil_type)
         
-        result["prediction_id"] = f"YIELD_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        result["prediction_id"] = new_id("YIELD")
+        analysis_store.record(yield_entry(result["prediction_id"], crop, area, region, result))
         
-        return JSONResponse(content=result)
+        return FastJSONResponse(content=result)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка прогноза: {str(e)}")
 
+@router.post("/predict-yield/batch")
+async def predict_yield_batch(request: Request):
+    """Пакетный прогноз урожайности: JSON-массив, NDJSON или CSV на входе, поток NDJSON на выходе"""
+    if content_type_of(request) not in YIELD_BATCH_TYPES:
+        raise HTTPException(status_code=415, detail=f"Поддерживаются: {', '.join(YIELD_BATCH_TYPES)}")
+    
+    batch_id = new_id("YIELD_BATCH")
+    # Весь пакет считается одной версией модели, даже если её заменят во время запроса
+    model = await model_registry.get_active()
+    
+    def predict_chunk(rows: List[Dict]) -> Tuple[bytes, List[Dict]]:
+        for row in rows:
+            row["region"] = reference_catalogue.region_name(row["region"])
+        results = model.predict_yield_batch(
+            [row["crop"] for row in rows], [row["area"] for row in rows], [row["region"] for row in rows]
+        )
+        created_at = datetime.now().isoformat()
+        entries = [
+            yield_entry(f"{batch_id}:{row['index']}", row["crop"], row["area"], row["region"], result, created_at)
+            for row, result in zip(rows, results)
+        ]
+        lines = bytearray()
+        for row, result in zip(rows, results):
+            if row["soil_type"]:
+                result["soil_type"] = row["soil_type"]
+                result["soil_recommendations"] = reference_catalogue.soil_recommendations(row["soil_type"])
+            result["index"] = row["index"]
+            if row["id"] is not None:
+                result["id"] = row["id"]
+            lines += dumps_line(result)
+        return bytes(lines), entries
+    
+    async def run_chunk(rows: List[Dict]) -> bytes:
+        data, entries = await asyncio.to_thread(predict_chunk, rows)
+        analysis_store.record_many(entries)
+        return data
+    
+    async def stream_results():
+        summary = {"batch_id": batch_id, "model_version": model.version, "rows": 0, "predicted": 0, "errors": 0}
+        chunk = []
+        try:
+            async for raw in iter_yield_rows(request):
+                index = summary["rows"]
+                summary["rows"] += 1
+                if summary["rows"] > config.YIELD_BATCH_MAX_ROWS:
+                    raise YieldRowError(f"Превышен лимит строк: {config.YIELD_BATCH_MAX_ROWS}")
+                try:
+                    row = parse_yield_row(raw)
+                except YieldRowError as e:
+                    summary["errors"] += 1
+                    yield dumps_line({"index": index, "error": str(e)})
+                    continue
+                row["index"] = index
+                chunk.append(row)
+                if len(chunk) >= config.YIELD_BATCH_CHUNK_ROWS:
+                    summary["predicted"] += len(chunk)
+                    yield await run_chunk(chunk)
+                    chunk = []
+        except YieldRowError as e:
+            # Лимит строк или испорченное тело JSON: ответ уже начат, причина - в итоговой строке
+            summary["aborted"] = str(e)
+        if chunk:
+            summary["predicted"] += len(chunk)
+            yield await run_chunk(chunk)
+        yield dumps_line({"summary": summary})
+    
+    return DuplexStreamingResponse(stream_results(), media_type="application/x-ndjson")
+
 @router.get("/lessons")
 async def get_lessons(
-    category: Optional[str] = "agriculture",
+    request: Request,
+    category: str = "agriculture",
     level: Optional[str] = None,
-    limit: Optional[int] = 10
+    topic: Optional[str] = None,
+    q: Optional[str] = None,
+    lang: Optional[str] = None,
+    limit: int = 10,
+    offset: int = 0,
+    cursor: Optional[str] = None
 ):
-    """Получение образовательных материалов"""
+    """Получение образовательных материалов: фильтры, поиск q по названию, описанию и темам, страницы"""
     try:
-        lessons = EDUCATION_LESSONS.get(category, [])
-        
-        if level:
-            lessons = [lesson for lesson in lessons if lesson["level"] == level]
-        
-        if limit:
-            lessons = lessons[:limit]
-        
-        return {
-            "category": category,
-            "count": len(lessons),
-            "lessons": lessons
-        }
-        
+        body, etag = lesson_catalogue.page(category, level, topic, q, lang, offset, limit, cursor)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Ошибка получения уроков: {str(e)}")
+    return cached_response(request, body, etag, config.LESSONS_MAX_AGE)
+
+@router.get("/lessons/facets")
+async def get_lesson_facets(request: Request):
+    """Категории, уровни и темы каталога с числом уроков"""
+    body, etag = lesson_catalogue.facets()
+    return cached_response(request, body, etag, config.LESSONS_MAX_AGE)
+
+@router.get("/lessons/{lesson_id}")
+async def get_lesson(request: Request, lesson_id: int, lang: Optional[str] = None):
+    """Один урок по id"""
+    try:
+        body, etag = lesson_catalogue.lesson(lesson_id, lang)
+    except LessonNotFound:
+        raise HTTPException(status_code=404, detail="Урок не найден")
+    return cached_response(request, body, etag, config.LESSONS_MAX_AGE)
 
 @router.get("/dashboard/stats")
-async def get_dashboard_stats():
-    """Статистика для дашборда"""
+async def get_dashboard_stats(days: Optional[int] = None):
+    """Статистика для дашборда по сохранённой истории (за последние days дней или за всё время)"""
+    if days is not None and not 1 <= days <= 3650:
+        raise HTTPException(status_code=400, detail="days должно быть от 1 до 3650")
+    summary = await analysis_store.summary(days)
     return {
-        "total_analyses": 1250,
-        "successful_predictions": 1187,
-        "accuracy_rate": 95.0,
-        "total_farmers": 347,
-        "active_courses": 15,
-        "avg_yield_increase": "23.5%",
+        **summary,
+        "active_courses": lesson_catalogue.count,
+        "period_days": days,
         "last_updated": datetime.now().isoformat()
     }
 
-@router.post("/train-model")
-async def train_model(background_tasks: BackgroundTasks):
-    """Запуск обучения модели (асинхронно)"""
-    
-    async def train_task():
-        """Фоновая задача обучения"""
-        await asyncio.sleep(5)  # Имитация обучения
-        # Здесь будет реальное обучение модели
-    
-    background_tasks.add_task(train_task)
-    
+@router.get("/analyses")
+async def list_analyses(
+    kind: Optional[str] = None,
+    region: Optional[str] = None,
+    crop: Optional[str] = None,
+    disease: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 50
+):
+    """История анализов и прогнозов (новые первыми); since/until - ISO-дата или время"""
+    if kind is not None and kind not in ANALYSIS_KINDS:
+        raise HTTPException(status_code=400, detail=f"kind должен быть одним из: {', '.join(ANALYSIS_KINDS)}")
+    region = reference_catalogue.region_name(region)
+    items = await analysis_store.query(kind, region, crop, disease, since, until, max(1, min(limit, 500)))
+    return {"count": len(items), "items": items}
+
+@router.post("/train-model", status_code=202)
+async def train_model(
+    epochs: int = config.TRAINING_EPOCHS,
+    epoch_seconds: float = config.TRAINING_EPOCH_SECONDS,
+    dataset: Optional[str] = None
+):
+    """Постановка задачи обучения модели в очередь"""
+    if not 1 <= epochs <= 1000:
+        raise HTTPException(status_code=400, detail="epochs должно быть от 1 до 1000")
+    if not 0 < epoch_seconds <= 3600:
+        raise HTTPException(status_code=400, detail="epoch_seconds должно быть от 0 до 3600")
+
+    params = {"epochs": epochs, "epoch_seconds": epoch_seconds, "dataset": dataset}
+    try:
+        job = await training_scheduler.submit(params)
+    except TrainingQueueFull:
+        raise HTTPException(
+            status_code=503,
+            detail="Очередь обучения заполнена, повторите позже",
+            headers={"Retry-After": str(int(epochs * epoch_seconds) or 1)}
+        )
+
     return {
-        "status": "training_started",
-        "message": "Модель начала обучение в фоновом режиме",
-        "estimated_time": "5-10 минут",
-        "training_id": f"TRAIN_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        "status": job["status"],
+        "message": "Задача обучения поставлена в очередь",
+        "estimated_time": f"{round(epochs * epoch_seconds)} секунд после старта",
+        "training_id": job["id"],
+        "status_url": f"/api/train-model/{job['id']}",
+        "job": job
     }
 
-@router.get("/regions")
-async def get_regions():
-    """Получение списка регионов"""
+@router.get("/train-model")
+async def list_training_jobs(status: Optional[str] = None, limit: int = 50):
+    """Список задач обучения (новые первыми)"""
+    if status is not None and status not in JOB_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Неизвестный статус: {status}")
     return {
-        "regions": [
-            {"id": "chuy", "name": "Чуйская область", "climate": "Умеренно-континентальный"},
-            {"id": "issyk_kul", "name": "Иссык-Кульская область", "climate": "Горный"},
-            {"id": "osh", "name": "Ошская область", "climate": "Континентальный"},
-            {"id": "naryn", "name": "Нарынская область", "climate": "Резко континентальный"},
-            {"id": "talas", "name": "Таласская область", "climate": "Умеренный"},
-            {"id": "batken", "name": "Баткенская область", "climate": "Континентальный"},
-            {"id": "jalal_abad", "name": "Джалал-Абадская область", "climate": "Субтропический"}
-        ]
+        "jobs": await training_scheduler.list(status, max(1, min(limit, 500))),
+        "stats": training_scheduler.stats()
     }
 
-# Вспомогательные функции
-def get_regional_advice(region: str, plant_type: str) -> List[str]:
-    """Советы по регионам"""
-    advice_map = {
-        "Чуйская область": [
-            "Рекомендуется ранний посев из-за жаркого лета",
-            "Используйте засухоустойчивые сорта",
-            "Оптимальный полив - капельное орошение"
-        ],
-        "Иссык-Кульская область": [
-            "Учитывайте высокогорный климат",
-            "Используйте морозоустойчивые сорта",
-            "Защита от ветра обязательна"
-        ],
-        "Ошская область": [
-            "Благоприятные условия для теплолюбивых культур",
-            "Длинный вегетационный период",
-            "Возможно получение двух урожаев в год"
-        ]
+@router.get("/train-model/{training_id}")
+async def get_training_job(training_id: str):
+    """Статус и прогресс задачи обучения"""
+    try:
+        return await training_scheduler.get(training_id)
+    except TrainingJobNotFound:
+        raise HTTPException(status_code=404, detail="Задача обучения не найдена")
+
+@router.post("/train-model/{training_id}/cancel")
+async def cancel_training_job(training_id: str):
+    """Отмена задачи обучения: из очереди - сразу, выполняющейся - на ближайшей проверке"""
+    try:
+        return await training_scheduler.cancel(training_id)
+    except TrainingJobNotFound:
+        raise HTTPException(status_code=404, detail="Задача обучения не найдена")
+
+@router.get("/inference/stats")
+async def get_inference_stats():
+    """Состояние пула инференса и микро-батчинга"""
+    return {
+        "pool": inference_pool.stats(),
+        "batching": batcher.stats(),
+        "cache": result_cache.stats()
     }
+
+@router.get("/models")
+async def list_models():
+    """Доступные версии модели и активная версия"""
+    return {"available": model_registry.available(), **model_registry.info()}
+
+@router.post("/models/{version}/activate")
+async def activate_model(
+    version: str,
+    api_key: Optional[str] = Header(None, alias=config.RATE_LIMIT_KEY_HEADER)
+):
+    """Загрузка, прогрев и горячая замена активной версии модели во всех воркерах (нужен ключ из MODEL_ADMIN_KEYS)"""
+    if not model_admin_keys:
+        raise HTTPException(status_code=403, detail="Замена модели отключена: ключи не заданы (AGRIEDU_MODEL_ADMIN_KEYS)")
+    if model_admin_keys.match(api_key) is None:
+        raise HTTPException(status_code=401, detail="Нужен ключ администратора модели")
+    try:
+        return await model_registry.activate(version)
+    except ModelVersionNotFound:
+        raise HTTPException(status_code=404, detail=f"Версия модели не найдена: {version}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Ошибка загрузки модели: {str(e)}")
+
+@router.get("/regions")
+async def get_regions(request: Request):
+    """Получение списка регионов"""
+    body, etag = reference_catalogue.regions()
+    return cached_response(request, body, etag, config.REFERENCE_MAX_AGE)
+
+@router.get("/reference/bundle")
+async def get_reference_bundle(request: Request):
+    """Все справочники одним ответом: регионы с советами, почвы, культуры и болезни активной модели"""
+    model = await model_registry.get_active()
+    body, etag = reference_catalogue.bundle(model)
+    return cached_response(request, body, etag, config.REFERENCE_MAX_AGE)
+
+# Вспомогательные функции
+def analysis_http_error(error: Exception) -> HTTPException:
+    """Ошибка анализа -> HTTP-ответ (перегрузка пула - 503, таймаут - 504)"""
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, InferenceQueueFull):
+        return HTTPException(
+            status_code=503,
+            detail="Сервер перегружен, повторите запрос позже",
+            headers={"Retry-After": str(config.INFERENCE_RETRY_AFTER)}
+        )
+    if isinstance(error, InferenceTimeout):
+        return HTTPException(status_code=504, detail="Превышено время анализа")
+    return HTTPException(status_code=500, detail=f"Ошибка анализа: {str(error)}")
+
+async def complete_disease_analysis(
+    image: Union[bytes, BinaryIO], plant_type: str, location: Optional[str], heatmap: str, analysis_id: str
+) -> Dict:
+    """Анализ, советы по региону, heatmap и запись в историю"""
+    result = await run_disease_analysis(image, plant_type)
+    
+    if location:
+        result["location"] = location
+        result["regional_advice"] = reference_catalogue.regional_advice(location)
     
-    return advice_map.get(region, ["Соблюдайте общие рекомендации для вашего региона"])
+    # Добавляем timestamp
+    result["analysis_id"] = analysis_id
+    result["timestamp"] = datetime.now().isoformat()
+    await attach_heatmap(result, heatmap)
+    analysis_store.record(disease_entry(analysis_id, plant_type, reference_catalogue.region_name(location), result))
+    return result
 
-def get_soil_recommendations(soil_type: str, crop: str) -> List[str]:
-    """Рекомендации по типу почвы"""
-    recommendations = {
-        "чернозем": ["Богатая почва, умеренное удобрение", "Глубокая вспашка"],
-        "суглинок": ["Добавление органических удобрений", "Регулярное рыхление"],
-        "песчаная": ["Частый полив", "Внесение глины и органики", "Мульчирование"],
-        "глинистая": ["Дренаж обязателен", "Внесение песка", "Известкование"]
-    }
+async def submit_async_analysis(
+    image: bytes, plant_type: str, location: Optional[str], heatmap: str, slot: Optional[AdmissionSlot] = None
+) -> FastJSONResponse:
+    """Постановка анализа в фон: 202 с адресами для опроса и SSE; slot освобождается по его завершении"""
+    analysis_id = new_analysis_id()
+    
+    async def work() -> Dict:
+        try:
+            return await complete_disease_analysis(image, plant_type, location, heatmap, analysis_id)
+        except Exception as e:
+            raise analysis_http_error(e)
+    
+    try:
+        job = await analysis_jobs.submit(analysis_id, work, on_done=slot.detach().release if slot is not None else None)
+    except AnalysisJobsFull:
+        if slot is not None:
+            slot.release()
+        raise HTTPException(
+            status_code=503,
+            detail="Слишком много анализов в очереди, повторите позже",
+            headers={"Retry-After": str(config.INFERENCE_RETRY_AFTER)}
+        )
+    status_url = f"/api/analysis/{analysis_id}"
+    return FastJSONResponse(
+        status_code=202,
+        content={
+            **job,
+            "analysis_id": analysis_id,
+            "status_url": status_url,
+            "events_url": f"{status_url}/events"
+        },
+        headers={"Location": status_url, "Retry-After": "1"}
+    )
+
+async def find_analysis(analysis_id: str, wait: float = 0) -> Optional[Dict]:
+    """Состояние анализа: задача этого воркера, история или статус задачи другого воркера.
+
+    Задачу другого воркера видно только через общую базу, поэтому её ждём опросом
+    не дольше wait секунд - до смены статуса или появления результата в истории.
+    """
+    job = await analysis_jobs.wait(analysis_id, wait)
+    if job is not None:
+        return job
+    
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    seen = None
+    while True:
+        entry = await stored_analysis(analysis_id)
+        if entry is not None:
+            return entry
+        job = await analysis_store.get_job(analysis_id)
+        if job is None or job["status"] == "failed":
+            return job
+        if job["status"] == "completed":
+            # Результат готов, но ещё не записан в историю очередью AnalysisStore
+            job["status"] = "running"
+        remaining = deadline - loop.time()
+        if remaining <= 0 or seen not in (None, job["status"]):
+            return job
+        seen = job["status"]
+        await asyncio.sleep(min(config.ANALYSIS_STATUS_POLL_INTERVAL, remaining))
+
+async def stored_analysis(analysis_id: str) -> Optional[Dict]:
+    """Запись из истории анализов в формате ответа /analysis/{id}"""
+    entry = await analysis_store.get(analysis_id)
+    if entry is None:
+        return None
+    result = entry.pop("payload") or {}
+    if heatmap_store.shared and await asyncio.to_thread(heatmap_store.exists, analysis_id):
+        result["heatmap_url"] = f"/api/analysis/{analysis_id}/heatmap"
+    return {**entry, "status": "completed", "result": result}
+
+def new_analysis_id() -> str:
+    """Идентификатор анализа: уникален и сортируется по времени (см. app.ids)"""
+    return new_id("ANALYSIS")
+
+def check_heatmap_encoding(encoding: str):
+    if encoding not in HEATMAP_ENCODINGS:
+        raise HTTPException(status_code=400, detail=f"Формат heatmap должен быть одним из: {', '.join(HEATMAP_ENCODINGS)}")
+    if encoding == "url" and not heatmap_store.shared:
+        raise HTTPException(status_code=400, detail="Формат url требует общего хранилища heatmap (AGRIEDU_HEATMAP_STORE_DIR)")
+
+async def attach_heatmap(result: Dict, encoding: str):
+    """Кодирование heatmap в ответе и, при общем хранилище, сохранение для /analysis/{id}/heatmap"""
+    heatmap_array = result.pop("heatmap", None)
+    if heatmap_array is None:
+        return
+    
+    def encode_and_store() -> Dict:
+        fields = encode_heatmap(heatmap_array, encoding)
+        if heatmap_store.shared:
+            heatmap_store.put(result["analysis_id"], heatmap_array)
+            fields["heatmap_url"] = f"/api/analysis/{result['analysis_id']}/heatmap"
+        return fields
+    
+    with time_stage("heatmap_encode"):
+        result.update(await asyncio.to_thread(encode_and_store))
+
+async def run_disease_analysis(image: Union[bytes, BinaryIO], plant_type: str) -> Dict:
+    """Кэш по содержимому, иначе декодирование в пуле воркеров и прямой проход в общем батче"""
+    # Запрос целиком выполняется версией, активной на момент его начала
+    model = await model_registry.get_active()
+    if inference_pool.kind == "process" and not isinstance(image, bytes):
+        # Файловые объекты нельзя передать в другой процесс
+        image = await asyncio.to_thread(image.read)
+    
+    cache_key = None
+    if result_cache.enabled:
+        with time_stage("hash"):
+            digest = await asyncio.to_thread(hash_image, image)
+        cache_key = result_cache.make_key(digest, plant_type, model.version)
+        cached = await result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+    
+    try:
+        tensor = await inference_pool.call("preprocess_image", image, model=model)
+        probabilities = await batcher.submit(tensor, forward=model.predict_batch)
+    except (InferenceQueueFull, InferenceTimeout):
+        raise
+    except Exception as e:
+        return {"success": False, "error": str(e)}
     
-    return recommendations.get(soil_type, ["Проведите анализ почвы для точных рекомендаций"])
+    # Генерация heatmap - numpy до 224x224, вне цикла событий
+    result = await asyncio.to_thread(model.build_disease_result, probabilities, plant_type)
+    if cache_key is not None:
+        await result_cache.set(cache_key, result)
+    return result
@@ -0,0 +1,116 @@
+"""Вход пакетного анализа фото: несколько файлов multipart или zip-архив, и сводка по полю"""
+import os
+import zipfile
+from collections import Counter
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+
+from fastapi import HTTPException, UploadFile
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+SEVERITY_SCORES = {"Низкая": 1, "Средняя": 2, "Высокая": 3}
+
+# Источник изображения: имя и функция, возвращающая содержимое (вызывается в потоке)
+ImageSource = Tuple[str, Callable[[], Union[bytes, BinaryIO]]]
+
+
+def upload_sources(uploads: List[UploadFile], max_bytes: int) -> List[ImageSource]:
+    """Файлы multipart: содержимое уже во временных файлах парсера"""
+    sources = []
+    for upload in uploads:
+        if upload.size is not None and upload.size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Файл {upload.filename} слишком большой")
+
+        def load(file=upload.file):
+            file.seek(0)
+            return file
+
+        sources.append((upload.filename or f"image_{len(sources)}", load))
+    return sources
+
+
+def archive_sources(file: BinaryIO, max_bytes: int, max_images: int) -> List[ImageSource]:
+    """Изображения из zip; размеры проверяются по заголовкам до распаковки"""
+    try:
+        archive = zipfile.ZipFile(file)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Архив повреждён или не является zip")
+
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and not os.path.basename(info.filename).startswith(".")
+        and not info.filename.startswith("__MACOSX/")
+        and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+    ]
+    if len(members) > max_images:
+        raise HTTPException(status_code=413, detail=f"В архиве больше {max_images} изображений")
+    for info in members:
+        if info.file_size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Файл {info.filename} слишком большой")
+
+    return [(info.filename, lambda info=info: archive.read(info)) for info in members]
+
+
+class FieldSummary:
+    """Сводка по пакету: распределение болезней, средние тяжесть, площадь поражения и уверенность"""
+
+    def __init__(self, batch_id: str):
+        self.batch_id = batch_id
+        self.images = 0
+        self.analysed = 0
+        self.failed = 0
+        self.diseases = Counter()
+        self.severity_sum = 0
+        self.severity_count = 0
+        self.affected_sum = 0.0
+        self.confidence_sum = 0.0
+        self.model_versions = set()
+
+    def add(self, result: Dict):
+        self.images += 1
+        if not result.get("success"):
+            self.failed += 1
+            return
+        self.analysed += 1
+        self.diseases[result.get("disease")] += 1
+        self.confidence_sum += result.get("confidence") or 0.0
+        if result.get("model_version"):
+            self.model_versions.add(result["model_version"])
+        score = SEVERITY_SCORES.get(result.get("severity"))
+        if score is not None:
+            self.severity_sum += score
+            self.severity_count += 1
+        affected = _percent(result.get("affected_area"))
+        if affected is not None:
+            self.affected_sum += affected
+
+    def as_dict(self) -> Dict:
+        mean_severity = self.severity_sum / self.severity_count if self.severity_count else None
+        return {
+            "batch_id": self.batch_id,
+            "images": self.images,
+            "analysed": self.analysed,
+            "failed": self.failed,
+            "disease_distribution": {
+                disease: {"count": count, "share": round(count / self.analysed, 3)}
+                for disease, count in self.diseases.most_common()
+            },
+            "mean_severity": round(mean_severity, 2) if mean_severity is not None else None,
+            "mean_severity_label": _severity_label(mean_severity),
+            "mean_affected_area_percent": round(self.affected_sum / self.analysed, 1) if self.analysed else None,
+            "mean_confidence": round(self.confidence_sum / self.analysed, 3) if self.analysed else None,
+            "model_versions": sorted(self.model_versions),
+        }
+
+
+def _percent(value) -> Optional[float]:
+    try:
+        return float(str(value).rstrip("%"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _severity_label(score: Optional[float]) -> Optional[str]:
+    if score is None:
+        return None
+    return min(SEVERITY_SCORES, key=lambda label: abs(SEVERITY_SCORES[label] - score))
@@ -0,0 +1,428 @@
+"""Ограничение частоты запросов по клиентам и допуск дорогих запросов.
+
+Лимит - корзина токенов в форме GCRA: на пару (лимит, клиент) хранится одно
+число, теоретическое время прихода следующего запроса (TAT), поэтому проверка
+O(1) по времени и памяти. Хранилище - память процесса или, для нескольких
+воркеров, общий Redis-совместимый сервер (атомарный Lua-скрипт на его часах).
+
+Допуск - общий предел одновременно выполняемых дорогих запросов с короткой
+очередью: запрос, не получивший места за ``queue_timeout``, сразу получает 503,
+а не ждёт, пока задержка вырастет у всех.
+"""
+import asyncio
+import hashlib
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Iterable, Optional, Tuple, Union
+
+from fastapi.responses import JSONResponse
+
+from app import config
+from app.metrics import REGISTRY, Counter
+
+RATE_LIMITED = REGISTRY.register(Counter(
+    "agriedu_rate_limited_total", "Requests rejected by per-client rate limits", ("limit",)))
+ADMISSION_REJECTED = REGISTRY.register(Counter(
+    "agriedu_admission_rejected_total", "Requests shed by the admission controller", ("reason",)))
+
+# GCRA на стороне сервера: время берётся с часов сервера, одинаковых для всех воркеров
+GCRA_SCRIPT = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then tat = now end
+local new_tat = tat + cost * interval
+local allow_at = new_tat - burst * interval
+if allow_at > now then
+    return {0, allow_at - now, math.floor((now - (tat - burst * interval)) / interval)}
+end
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {1, 0, math.floor((now - allow_at) / interval)}
+"""
+
+
+class RateLimit:
+    """Лимит: per_minute запросов в минуту в среднем и до burst подряд"""
+
+    def __init__(self, name: str, per_minute: int, burst: int):
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = max(1, burst)
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+
+class LocalRateStore:
+    """TAT клиентов в памяти процесса; давно не приходившие клиенты вытесняются первыми"""
+
+    kind = "local"
+
+    def __init__(self, max_keys: int = config.RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max(1, max_keys)
+        self._tat: "OrderedDict[str, float]" = OrderedDict()
+        self.evicted = 0
+
+    async def take(self, key: str, limit: RateLimit, cost: int = 1) -> Tuple[bool, float, int]:
+        """(разрешён ли запрос, через сколько секунд повторить, сколько запросов ещё доступно)"""
+        now = time.monotonic()
+        tat = max(self._tat.get(key, now), now)
+        new_tat = tat + cost * limit.interval
+        allow_at = new_tat - limit.burst * limit.interval
+        if allow_at > now:
+            return False, allow_at - now, int((now - (tat - limit.burst * limit.interval)) / limit.interval)
+        self._tat[key] = new_tat
+        self._tat.move_to_end(key)
+        # Вытесненный клиент начинает с полной корзиной - цена ограничения памяти
+        while len(self._tat) > self.max_keys:
+            self._tat.popitem(last=False)
+            self.evicted += 1
+        return True, 0.0, int((now - allow_at) / limit.interval + 1e-9)
+
+    def stats(self) -> Dict:
+        return {"keys": len(self._tat), "evicted": self.evicted}
+
+    async def close(self):
+        pass
+
+
+class RedisRateStore:
+    """TAT клиентов на Redis-совместимом сервере, общий для всех воркеров.
+
+    Если сервер недоступен, проверка на retry_interval секунд переходит на
+    локальное хранилище процесса: лимиты становятся по-процессными, но запросы
+    не отклоняются и не ждут таймаута соединения из-за сбоя хранилища.
+    """
+
+    kind = "redis"
+
+    def __init__(
+        self,
+        url: str,
+        prefix: str = "agriedu:rate:",
+        max_keys: int = config.RATE_LIMIT_MAX_KEYS,
+        retry_interval: float = 5.0,
+    ):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("Для AGRIEDU_RATE_LIMIT_STORE_URL нужен пакет redis")
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._script = self._client.register_script(GCRA_SCRIPT)
+        self.fallback = LocalRateStore(max_keys)
+        self.retry_interval = retry_interval
+        self._down_until = 0.0
+        self.errors = 0
+
+    async def take(self, key: str, limit: RateLimit, cost: int = 1) -> Tuple[bool, float, int]:
+        if time.monotonic() < self._down_until:
+            return await self.fallback.take(key, limit, cost)
+        try:
+            allowed, retry_ms, remaining = await self._script(
+                keys=[self.prefix + key], args=[limit.interval * 1000, limit.burst, cost]
+            )
+        except Exception:
+            self.errors += 1
+            self._down_until = time.monotonic() + self.retry_interval
+            return await self.fallback.take(key, limit, cost)
+        return bool(allowed), int(retry_ms) / 1000, int(remaining)
+
+    def stats(self) -> Dict:
+        return {"store_errors": self.errors, **self.fallback.stats()}
+
+    async def close(self):
+        close = getattr(self._client, "aclose", None) or self._client.close
+        await close()
+
+
+def create_store(url: str = config.RATE_LIMIT_STORE_URL):
+    return RedisRateStore(url) if url else LocalRateStore()
+
+
+def _key_digest(key: bytes) -> str:
+    # Сам ключ в памяти и во внешнем хранилище не держим
+    return hashlib.blake2b(key, digest_size=12).hexdigest()
+
+
+class ApiKeys:
+    """Известные API-ключи (хранятся только дайджесты)"""
+
+    def __init__(self, keys: Iterable[str]):
+        self.digests = {_key_digest(key.encode("latin-1")) for key in keys}
+
+    def __bool__(self) -> bool:
+        return bool(self.digests)
+
+    def match(self, key: Union[str, bytes, None]) -> Optional[str]:
+        """Дайджест ключа, если он известен, иначе None"""
+        if not key or not self.digests:
+            return None
+        digest = _key_digest(key.encode("latin-1") if isinstance(key, str) else key)
+        return digest if digest in self.digests else None
+
+
+class RateLimiter:
+    """Лимиты по именам и определение клиента по известному API-ключу или IP.
+
+    Ключ из заголовка учитывается, только если он есть в api_keys: иначе
+    клиент получал бы новую полную корзину с каждым случайным ключом.
+    X-Forwarded-For читается справа: последние forwarded_hops адресов добавлены
+    доверенными прокси, всё левее клиент мог прислать сам.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, RateLimit],
+        store=None,
+        key_header: str = config.RATE_LIMIT_KEY_HEADER,
+        api_keys: Iterable[str] = config.RATE_LIMIT_API_KEYS,
+        forwarded_hops: int = config.RATE_LIMIT_FORWARDED_HOPS,
+    ):
+        self.limits = limits
+        self.store = store if store is not None else create_store()
+        self.key_header = key_header.lower().encode("latin-1")
+        self.api_keys = ApiKeys(api_keys)
+        self.forwarded_hops = max(0, forwarded_hops)
+        self.allowed = 0
+        self.limited = 0
+
+    def client_key(self, scope) -> str:
+        forwarded = []
+        for name, value in scope["headers"]:
+            if name == self.key_header:
+                digest = self.api_keys.match(value)
+                if digest is not None:
+                    return "key:" + digest
+            elif name == b"x-forwarded-for":
+                forwarded.extend(part.strip() for part in value.split(b","))
+        forwarded = [address for address in forwarded if address]
+        if self.forwarded_hops and forwarded:
+            # Адрес, добавленный самым внешним доверенным прокси
+            address = forwarded[-min(self.forwarded_hops, len(forwarded))]
+            return "ip:" + address.decode("latin-1")
+        client = scope.get("client")
+        return "ip:" + (client[0] if client else "unknown")
+
+    async def check(self, name: str, client: str) -> Tuple[bool, Dict[str, str]]:
+        """Проверка и списание одного запроса; второе значение - заголовки RateLimit-* для ответа"""
+        limit = self.limits[name]
+        allowed, retry_after, remaining = await self.store.take(f"{name}:{client}", limit)
+        headers = {"RateLimit-Limit": str(limit.burst), "RateLimit-Remaining": str(max(0, remaining))}
+        if allowed:
+            self.allowed += 1
+        else:
+            self.limited += 1
+            RATE_LIMITED.labels(name).inc()
+            headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+        return allowed, headers
+
+    def stats(self) -> Dict:
+        return {"allowed": self.allowed, "limited": self.limited, **self.store.stats()}
+
+
+class AdmissionController:
+    """Не больше max_concurrent запросов одновременно, до max_queue ждущих и не дольше queue_timeout"""
+
+    def __init__(
+        self,
+        max_concurrent: int = config.ADMISSION_MAX_CONCURRENT,
+        max_queue: int = config.ADMISSION_MAX_QUEUE,
+        queue_timeout: float = config.ADMISSION_QUEUE_TIMEOUT,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+        # Метрики
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_concurrent > 0
+
+    async def acquire(self) -> Optional[str]:
+        """Занять место; None - допущен, иначе причина отказа (queue_full или timeout)"""
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return None
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            ADMISSION_REJECTED.labels("queue_full").inc()
+            return "queue_full"
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # Место передано в момент таймаута - запрос допущен
+                self.admitted += 1
+                return None
+            self.rejected_timeout += 1
+            ADMISSION_REJECTED.labels("timeout").inc()
+            return "timeout"
+        except asyncio.CancelledError:
+            # Клиент ушёл; если место уже передано этому запросу, отдаём его следующему
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        # Место передано из release(): active не менялся
+        self.admitted += 1
+        return None
+
+    def release(self):
+        """Освободить место: оно сразу передаётся первому ждущему"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "queued": len(self._waiters),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+class AdmissionSlot:
+    """Занятое место допуска. detach() передаёт освобождение фоновой задаче запроса"""
+
+    def __init__(self, controller: AdmissionController):
+        self._controller = controller
+        self._released = False
+        self.detached = False
+
+    def detach(self) -> "AdmissionSlot":
+        self.detached = True
+        return self
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self._controller.release()
+
+
+class RateLimitMiddleware:
+    """ASGI middleware: лимит клиента (429), затем допуск (503) для маршрутов из routes.
+
+    routes - {(метод, путь): имя лимита}; проверяется одним поиском в словаре,
+    остальные запросы проходят без накладных расходов. Место допуска занято,
+    пока ответ не отправлен целиком (в том числе потоковый); маршрут может
+    забрать его из ``request.state.admission_slot`` и держать дольше ответа.
+    """
+
+    def __init__(self, app, limiter: RateLimiter, admission: AdmissionController, routes: Dict[Tuple[str, str], str]):
+        self.app = app
+        self.limiter = limiter
+        self.admission = admission
+        self.routes = routes
+
+    async def __call__(self, scope, receive, send):
+        name = self.routes.get((scope["method"], scope["path"])) if scope["type"] == "http" else None
+        if name is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers: Dict[str, str] = {}
+        if self.limiter.limits[name].enabled:
+            allowed, headers = await self.limiter.check(name, self.limiter.client_key(scope))
+            if not allowed:
+                await JSONResponse(
+                    status_code=429,
+                    content={"detail": f"Слишком много запросов, повторите через {headers['Retry-After']} с"},
+                    headers=headers
+                )(scope, receive, send)
+                return
+
+        if not self.admission.enabled:
+            await self.app(scope, receive, self._with_headers(send, headers))
+            return
+        if await self.admission.acquire() is not None:
+            await JSONResponse(
+                status_code=503,
+                content={"detail": "Сервер перегружен, повторите запрос позже"},
+                headers={**headers, "Retry-After": str(config.INFERENCE_RETRY_AFTER)}
+            )(scope, receive, send)
+            return
+        slot = AdmissionSlot(self.admission)
+        scope.setdefault("state", {})["admission_slot"] = slot
+        try:
+            await self.app(scope, receive, self._with_headers(send, headers))
+        finally:
+            if not slot.detached:
+                slot.release()
+
+    @staticmethod
+    def _with_headers(send, headers: Dict[str, str]):
+        if not headers:
+            return send
+        extra = [(key.lower().encode("latin-1"), value.encode("latin-1")) for key, value in headers.items()]
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), *extra]}
+            await send(message)
+
+        return send_with_headers
+
+
+def default_limits() -> Dict[str, RateLimit]:
+    """Лимиты из настроек: одиночные, пакетные запросы и train-model"""
+    return {
+        "analyze-plant": RateLimit("analyze-plant", config.RATE_LIMIT_ANALYZE_PER_MIN, config.RATE_LIMIT_ANALYZE_BURST),
+        "analyze-plant-batch": RateLimit(
+            "analyze-plant-batch", config.RATE_LIMIT_ANALYZE_BATCH_PER_MIN, config.RATE_LIMIT_ANALYZE_BATCH_BURST
+        ),
+        "predict-yield": RateLimit(
+            "predict-yield", config.RATE_LIMIT_PREDICT_YIELD_PER_MIN, config.RATE_LIMIT_PREDICT_YIELD_BURST
+        ),
+        "predict-yield-batch": RateLimit(
+            "predict-yield-batch",
+            config.RATE_LIMIT_PREDICT_YIELD_BATCH_PER_MIN,
+            config.RATE_LIMIT_PREDICT_YIELD_BATCH_BURST,
+        ),
+        "train-model": RateLimit("train-model", config.RATE_LIMIT_TRAIN_PER_MIN, config.RATE_LIMIT_TRAIN_BURST),
+    }
+
+
+def default_routes(prefix: str = "/api") -> Dict[Tuple[str, str], str]:
+    """Маршруты под лимитами default_limits.
+
+    Пакет стоит сотни одиночных запросов, а размер его известен только после
+    разбора тела, поэтому у пакетных маршрутов своя корзина, а не общая с
+    одиночными по одному токену за запрос.
+    """
+    return {
+        ("POST", f"{prefix}/analyze-plant"): "analyze-plant",
+        ("POST", f"{prefix}/analyze-plant/batch"): "analyze-plant-batch",
+        ("GET", f"{prefix}/predict-yield"): "predict-yield",
+        ("POST", f"{prefix}/predict-yield/batch"): "predict-yield-batch",
+        ("POST", f"{prefix}/train-model"): "train-model",
+    }
@@ -0,0 +1,84 @@
+"""Быстрая JSON-сериализация ответов: orjson (если установлен) или стандартный json.
+
+Массивы и скаляры numpy сериализуются без ручного ``tolist()``. Маршруты,
+возвращающие словарь, проходят ещё и через jsonable_encoder FastAPI; тяжёлые
+ответы возвращают ``FastJSONResponse`` напрямую и этот шаг пропускают.
+"""
+import json
+import math
+from datetime import date, datetime
+from functools import lru_cache
+
+from fastapi.responses import JSONResponse
+
+from app import config
+
+
+@lru_cache(maxsize=None)
+def _orjson():
+    """Модуль orjson или None (AGRIEDU_JSON_BACKEND=json либо пакет не установлен)"""
+    if config.JSON_BACKEND == "json":
+        return None
+    try:
+        import orjson
+    except ImportError:
+        if config.JSON_BACKEND == "orjson":
+            raise
+        return None
+    return orjson
+
+
+def json_backend() -> str:
+    return "orjson" if _orjson() is not None else "json"
+
+
+def _default(value):
+    # numpy.ndarray и numpy-скаляры, которые orjson не взял сам (другой dtype, не C-порядок)
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Тип {type(value).__name__} не сериализуется в JSON")
+
+
+def _finite(value):
+    """Копия без NaN и бесконечностей (-> None), как их выдаёт orjson"""
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_finite(item) for item in value]
+    if hasattr(value, "tolist"):
+        return _finite(value.tolist())
+    return value
+
+
+def _json_dumps(content) -> str:
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default)
+
+
+def dumps(content) -> bytes:
+    """JSON в UTF-8 без экранирования кириллицы и без пробелов; NaN и бесконечности -> null"""
+    orjson = _orjson()
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    try:
+        return _json_dumps(content).encode()
+    except ValueError:
+        # Нечисловые значения встречаются редко: копия с заменой строится только для таких ответов
+        return _json_dumps(_finite(content)).encode()
+
+
+def dumps_line(content) -> bytes:
+    """Строка NDJSON"""
+    return dumps(content) + b"\n"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse с сериализатором dumps (класс ответа по умолчанию для приложения)"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,100 @@
+"""Потоковый приём загружаемых файлов с ограничением размера"""
+import asyncio
+from typing import BinaryIO, Dict
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+
+
+class UploadTooLarge(HTTPException):
+    """Тело запроса превысило допустимый размер"""
+
+    def __init__(self, detail: str = "Файл слишком большой"):
+        super().__init__(status_code=413, detail=detail)
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware, ограничивающее размер тела запроса для выбранных путей.
+
+    Запрос с Content-Length больше лимита отклоняется до чтения тела,
+    с некорректным Content-Length - ответом 400.
+    Без Content-Length (chunked) байты считаются по мере поступления, и
+    разбор multipart прерывается на первом чанке сверх лимита - сервер не
+    буферизует (и не пишет на диск) остаток тела.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None:
+            if not content_length.isdigit():
+                await self._reject(scope, receive, send, 400, "Некорректный заголовок Content-Length")
+                return
+            if int(content_length) > limit:
+                await self._reject(scope, receive, send)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise UploadTooLarge()
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except UploadTooLarge:
+            if response_started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send, status_code: int = 413, detail: str = "Файл слишком большой"):
+        response = JSONResponse(
+            status_code=status_code,
+            content={"detail": detail},
+            headers={"Connection": "close"}
+        )
+        await response(scope, receive, send)
+
+
+async def ingest_upload(upload: UploadFile, max_bytes: int) -> BinaryIO:
+    """Проверка размера загрузки и возврат файла, готового к декодированию.
+
+    Multipart-парсер уже сложил файл в SpooledTemporaryFile (до 1 МБ в памяти,
+    дальше - на диске), поэтому PIL читает прямо из него без копии в bytes.
+    """
+    size = upload.size
+    if size is None:
+        size = await asyncio.to_thread(_measure, upload.file)
+    if size > max_bytes:
+        raise UploadTooLarge()
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Пустой файл")
+
+    await upload.seek(0)
+    return upload.file
+
+
+def _measure(file: BinaryIO) -> int:
+    size = file.seek(0, 2)
+    file.seek(0)
+    return size
@@ -0,0 +1,136 @@
+"""Разбор входа пакетного прогноза урожайности: JSON-массив, NDJSON или CSV"""
+import csv
+import json
+from typing import AsyncIterator, Dict, Optional, Union
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+
+JSON_TYPES = ("application/json",)
+NDJSON_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+CSV_TYPES = ("text/csv", "application/csv")
+SUPPORTED_TYPES = JSON_TYPES + NDJSON_TYPES + CSV_TYPES
+
+
+class YieldRowError(ValueError):
+    """Некорректная строка входа; вне строки (лимит, тело JSON) - весь пакет"""
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """Потоковый ответ, который пишется, пока тело запроса ещё читается.
+
+    Обычный StreamingResponse параллельно ждёт http.disconnect через receive()
+    и тем самым забирает чанки тела у генератора. Здесь receive не трогается;
+    обрыв соединения проявится как ClientDisconnect при чтении тела или
+    ошибка при отправке.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+def content_type_of(request: Request) -> str:
+    return request.headers.get("content-type", "application/json").split(";")[0].strip().lower()
+
+
+async def _iter_lines(request: Request) -> AsyncIterator[bytes]:
+    """Строки тела запроса по мере поступления, без чтения всего тела в память"""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line
+    if buffer:
+        yield buffer
+
+
+def _decode(line: bytes) -> str:
+    try:
+        return line.decode("utf-8-sig").rstrip("\r")
+    except UnicodeDecodeError:
+        raise YieldRowError("Строка не в кодировке UTF-8")
+
+
+async def iter_yield_rows(request: Request) -> AsyncIterator[Union[Dict, YieldRowError]]:
+    """Сырые строки входа в виде словарей.
+
+    Испорченная строка NDJSON/CSV приходит как YieldRowError вместо словаря и
+    становится ошибкой своей строки; разбор следующих строк продолжается.
+    """
+    content_type = content_type_of(request)
+
+    if content_type in NDJSON_TYPES:
+        async for line in _iter_lines(request):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(_decode(line))
+            except YieldRowError as e:
+                yield e
+            except ValueError as e:
+                yield YieldRowError(f"Некорректный JSON: {e}")
+
+    elif content_type in CSV_TYPES:
+        header = None
+        async for line in _iter_lines(request):
+            if not line.strip():
+                continue
+            try:
+                values = next(csv.reader([_decode(line)]))
+            except (YieldRowError, csv.Error) as e:
+                if header is None:
+                    raise YieldRowError(f"Некорректный заголовок CSV: {e}")
+                yield e if isinstance(e, YieldRowError) else YieldRowError(f"Некорректная строка CSV: {e}")
+                continue
+            if header is None:
+                header = [name.strip().lower() for name in values]
+            elif len(values) != len(header):
+                yield YieldRowError(f"Ожидается значений: {len(header)}, получено: {len(values)}")
+            else:
+                yield dict(zip(header, values))
+
+    else:
+        try:
+            data = json.loads(await request.body())
+        except ValueError as e:
+            raise YieldRowError(f"Некорректный JSON: {e}")
+        rows = data.get("fields", []) if isinstance(data, dict) else data
+        if not isinstance(rows, list):
+            raise YieldRowError("Ожидается массив полей или объект с ключом fields")
+        for row in rows:
+            yield row
+
+
+def _optional_str(value) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def parse_yield_row(raw) -> Dict:
+    """Проверка и приведение типов одной строки"""
+    if isinstance(raw, YieldRowError):
+        raise raw
+    if not isinstance(raw, dict):
+        raise YieldRowError("Строка должна быть объектом")
+    crop = _optional_str(raw.get("crop"))
+    if crop is None:
+        raise YieldRowError("Не указана культура (crop)")
+    try:
+        area = float(raw.get("area"))
+    except (TypeError, ValueError):
+        raise YieldRowError("Площадь (area) должна быть числом")
+    if not area > 0:
+        raise YieldRowError("Площадь должна быть положительной")
+
+    return {
+        "id": raw.get("id"),
+        "crop": crop,
+        "area": area,
+        "region": _optional_str(raw.get("region")),
+        "soil_type": _optional_str(raw.get("soil_type")),
+    }
@@ -0,0 +1,227 @@
+"""Настройки приложения (переопределяются переменными окружения AGRIEDU_*)"""
+import os
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value else default
+
+
+def _env_str(name: str, default: str) -> str:
+    return os.environ.get(name) or default
+
+
+# ============ ДАННЫЕ ============
+# Каталог рабочих файлов сервера (базы SQLite); в репозитории игнорируется
+DATA_DIR = _env_str("AGRIEDU_DATA_DIR", "data")
+
+# ============ ИНФЕРЕНС ============
+# Тип пула: "thread" (по умолчанию) или "process"
+INFERENCE_EXECUTOR = _env_str("AGRIEDU_INFERENCE_EXECUTOR", "thread")
+INFERENCE_WORKERS = _env_int("AGRIEDU_INFERENCE_WORKERS", os.cpu_count() or 1)
+# Сколько задач может ждать свободного воркера сверх уже выполняющихся
+INFERENCE_QUEUE_SIZE = _env_int("AGRIEDU_INFERENCE_QUEUE_SIZE", 32)
+# Таймаут одного анализа, секунды
+INFERENCE_TIMEOUT = _env_float("AGRIEDU_INFERENCE_TIMEOUT", 30.0)
+# Значение заголовка Retry-After при переполнении очереди, секунды
+INFERENCE_RETRY_AFTER = _env_int("AGRIEDU_INFERENCE_RETRY_AFTER", 1)
+
+# ============ МИКРО-БАТЧИНГ ============
+# Максимальный размер батча (1 - без батчинга)
+BATCH_MAX_SIZE = _env_int("AGRIEDU_BATCH_MAX_SIZE", 16)
+# Сколько ждать добора батча после первого изображения, миллисекунды
+BATCH_MAX_WAIT_MS = _env_float("AGRIEDU_BATCH_MAX_WAIT_MS", 5.0)
+# Максимум изображений, ожидающих прямого прохода
+BATCH_QUEUE_SIZE = _env_int("AGRIEDU_BATCH_QUEUE_SIZE", 256)
+
+# ============ ЗАГРУЗКА ФАЙЛОВ ============
+# Максимальный размер одного изображения, байты
+UPLOAD_MAX_BYTES = _env_int("AGRIEDU_UPLOAD_MAX_BYTES", 10 * 1024 * 1024)
+# Запас на multipart-заголовки и текстовые поля формы, байты
+UPLOAD_FORM_OVERHEAD = _env_int("AGRIEDU_UPLOAD_FORM_OVERHEAD", 64 * 1024)
+
+# ============ КЭШ РЕЗУЛЬТАТОВ ============
+# Записей в памяти (0 - кэш выключен)
+CACHE_MAX_ENTRIES = _env_int("AGRIEDU_CACHE_MAX_ENTRIES", 1024)
+# Время жизни записи, секунды
+CACHE_TTL = _env_float("AGRIEDU_CACHE_TTL", 3600.0)
+# Путь к SQLite-файлу дискового уровня (пусто - только память)
+CACHE_DISK_PATH = _env_str("AGRIEDU_CACHE_DISK_PATH", "")
+CACHE_DISK_MAX_ENTRIES = _env_int("AGRIEDU_CACHE_DISK_MAX_ENTRIES", 100000)
+
+# ============ HEATMAP ============
+# Сторона квадратной heatmap: от 8 до 224 (полное разрешение входа модели)
+HEATMAP_RESOLUTION = max(8, min(_env_int("AGRIEDU_HEATMAP_RESOLUTION", 22), 224))
+# Формат по умолчанию: json (base64 в ответе, как раньше), raw, png или url (см. app/ml/heatmap.py)
+HEATMAP_ENCODING = _env_str("AGRIEDU_HEATMAP_ENCODING", "json")
+# Каталог, общий для всех воркеров, для /api/analysis/{id}/heatmap и формата url.
+# Пусто - heatmap отдаются только в самом ответе: память одного воркера не видна другим
+HEATMAP_STORE_DIR = _env_str("AGRIEDU_HEATMAP_STORE_DIR", "")
+# Сколько последних heatmap хранить
+HEATMAP_STORE_SIZE = _env_int("AGRIEDU_HEATMAP_STORE_SIZE", 1024)
+
+# ============ HEALTH ============
+# Период фонового обновления системной статистики, секунды
+HEALTH_SAMPLE_INTERVAL = _env_float("AGRIEDU_HEALTH_SAMPLE_INTERVAL", 5.0)
+# Доля заполнения очередей инференса, после которой /api/health/ready отвечает 503
+READY_QUEUE_THRESHOLD = _env_float("AGRIEDU_READY_QUEUE_THRESHOLD", 0.9)
+
+# ============ ПАКЕТНЫЙ ПРОГНОЗ УРОЖАЙНОСТИ ============
+# Строк за один векторный проход
+YIELD_BATCH_CHUNK_ROWS = _env_int("AGRIEDU_YIELD_BATCH_CHUNK_ROWS", 5000)
+YIELD_BATCH_MAX_ROWS = _env_int("AGRIEDU_YIELD_BATCH_MAX_ROWS", 200000)
+# Лимит тела запроса, байты
+YIELD_BATCH_MAX_BYTES = _env_int("AGRIEDU_YIELD_BATCH_MAX_BYTES", 64 * 1024 * 1024)
+
+# ============ ОБУЧЕНИЕ ============
+# SQLite-файл очереди задач обучения (переживает перезапуск сервера)
+TRAINING_DB_PATH = _env_str("AGRIEDU_TRAINING_DB_PATH", os.path.join(DATA_DIR, "training_jobs.db"))
+# Сколько задач обучения выполняется одновременно (по всем воркерам на общей базе)
+TRAINING_MAX_CONCURRENT = _env_int("AGRIEDU_TRAINING_MAX_CONCURRENT", 1)
+# Сколько задач может ждать в очереди
+TRAINING_MAX_QUEUED = _env_int("AGRIEDU_TRAINING_MAX_QUEUED", 16)
+# Приоритет процессов обучения (nice), чтобы они уступали CPU инференсу
+TRAINING_NICE = _env_int("AGRIEDU_TRAINING_NICE", 10)
+# Период опроса очереди и процессов, секунды
+TRAINING_POLL_INTERVAL = _env_float("AGRIEDU_TRAINING_POLL_INTERVAL", 0.5)
+# Сколько ждать добровольной остановки после отмены, прежде чем завершить процесс, секунды
+TRAINING_CANCEL_GRACE = _env_float("AGRIEDU_TRAINING_CANCEL_GRACE", 5.0)
+# Аренда выполняющейся задачи: воркер-владелец продлевает её, пока жив; задачи
+# с истёкшей арендой (владелец упал) возвращаются в очередь, секунды
+TRAINING_LEASE_SECONDS = _env_float("AGRIEDU_TRAINING_LEASE_SECONDS", 30.0)
+# Параметры обучения по умолчанию
+TRAINING_EPOCHS = _env_int("AGRIEDU_TRAINING_EPOCHS", 10)
+TRAINING_EPOCH_SECONDS = _env_float("AGRIEDU_TRAINING_EPOCH_SECONDS", 1.0)
+
+# ============ РЕЕСТР МОДЕЛЕЙ ============
+# Каталог артефактов: <MODEL_DIR>/<версия>/model.json
+MODEL_DIR = _env_str("AGRIEDU_MODEL_DIR", "models")
+# Версия, активная после старта (пусто - встроенная демо-модель)
+MODEL_VERSION = _env_str("AGRIEDU_MODEL_VERSION", "")
+# Активная версия, общая для всех воркеров: файл переписывается при активации,
+# остальные воркеры проверяют его раз в MODEL_SYNC_INTERVAL секунд и переключаются сами
+MODEL_ACTIVE_FILE = _env_str("AGRIEDU_MODEL_ACTIVE_FILE", os.path.join(DATA_DIR, "active_model.json"))
+MODEL_SYNC_INTERVAL = _env_float("AGRIEDU_MODEL_SYNC_INTERVAL", 2.0)
+# Ключи (заголовок RATE_LIMIT_KEY_HEADER), с которыми разрешено переключать версию
+# модели, через запятую; пусто - POST /api/models/{version}/activate отключён
+MODEL_ADMIN_KEYS = [key.strip() for key in _env_str("AGRIEDU_MODEL_ADMIN_KEYS", "").split(",") if key.strip()]
+# Когда загружать модель:
+#   background - в фоне сразу после старта сервера (readiness 503 до конца прогрева)
+#   lazy       - при первом запросе, которому нужна модель
+#   preload    - при импорте app.main, до fork воркеров (gunicorn --preload):
+#                воркеры делят страницы модели через copy-on-write
+MODEL_LOADING = _env_str("AGRIEDU_MODEL_LOADING", "background")
+# Веса артефакта отображаются в память (0 - читаются в память каждого процесса)
+MODEL_WEIGHTS_MMAP = _env_int("AGRIEDU_MODEL_WEIGHTS_MMAP", 1) == 1
+
+# ============ ONNX RUNTIME ============
+# Потоки внутри оператора и между операторами (0 - выбор onnxruntime)
+ONNX_INTRA_OP_THREADS = _env_int("AGRIEDU_ONNX_INTRA_OP_THREADS", 0)
+ONNX_INTER_OP_THREADS = _env_int("AGRIEDU_ONNX_INTER_OP_THREADS", 0)
+# Оптимизация графа: disable, basic, extended или all
+ONNX_GRAPH_OPTIMIZATION = _env_str("AGRIEDU_ONNX_GRAPH_OPTIMIZATION", "all")
+# Использовать INT8-модель (model_int8 в манифесте), если она есть
+ONNX_QUANTIZED = _env_int("AGRIEDU_ONNX_QUANTIZED", 0) == 1
+
+# ============ ИСТОРИЯ АНАЛИЗОВ ============
+# SQLite-файл истории анализов и прогнозов (пусто - история не сохраняется)
+HISTORY_DB_PATH = _env_str("AGRIEDU_HISTORY_DB_PATH", os.path.join(DATA_DIR, "analyses.db"))
+# Фоновая запись: строк в одной транзакции и максимальная задержка записи, секунды
+HISTORY_BATCH_SIZE = _env_int("AGRIEDU_HISTORY_BATCH_SIZE", 500)
+HISTORY_FLUSH_INTERVAL = _env_float("AGRIEDU_HISTORY_FLUSH_INTERVAL", 0.5)
+# Сколько строк может ждать записи; сверх этого записи отбрасываются, а не тормозят запросы
+HISTORY_QUEUE_SIZE = _env_int("AGRIEDU_HISTORY_QUEUE_SIZE", 50000)
+
+# ============ ИДЕНТИФИКАТОРЫ ============
+# 16-битный номер узла в id анализов (-1 - младшие биты pid воркера).
+# При нескольких серверах задайте каждому свой диапазон
+ID_NODE = _env_int("AGRIEDU_ID_NODE", -1)
+
+# ============ АСИНХРОННЫЙ АНАЛИЗ ============
+# Сколько анализов mode=async может ждать или выполняться; сверх этого - 503
+ANALYSIS_ASYNC_MAX_PENDING = _env_int("AGRIEDU_ANALYSIS_ASYNC_MAX_PENDING", 64)
+# Сколько из них одновременно идут в пул инференса (остальные ждут в статусе queued)
+ANALYSIS_ASYNC_CONCURRENCY = _env_int("AGRIEDU_ANALYSIS_ASYNC_CONCURRENCY", 4)
+# Сколько секунд готовый результат (с heatmap в запрошенном формате) хранится в памяти
+ANALYSIS_ASYNC_RESULT_TTL = _env_float("AGRIEDU_ANALYSIS_ASYNC_RESULT_TTL", 300.0)
+# Предел long-poll ожидания (?wait=) и длительность SSE-потока, секунды
+ANALYSIS_ASYNC_MAX_WAIT = _env_float("AGRIEDU_ANALYSIS_ASYNC_MAX_WAIT", 30.0)
+ANALYSIS_EVENTS_TIMEOUT = _env_float("AGRIEDU_ANALYSIS_EVENTS_TIMEOUT", 120.0)
+# Интервал комментариев-пингов в SSE, чтобы прокси и мобильные сети не рвали соединение
+ANALYSIS_EVENTS_HEARTBEAT = _env_float("AGRIEDU_ANALYSIS_EVENTS_HEARTBEAT", 15.0)
+# Интервал опроса общей базы, когда анализ выполняет другой воркер, секунды
+ANALYSIS_STATUS_POLL_INTERVAL = _env_float("AGRIEDU_ANALYSIS_STATUS_POLL_INTERVAL", 0.5)
+
+# ============ ПАКЕТНЫЙ АНАЛИЗ ФОТО ============
+# Лимиты POST /api/analyze-plant/batch: число изображений и общий размер тела
+ANALYZE_BATCH_MAX_IMAGES = _env_int("AGRIEDU_ANALYZE_BATCH_MAX_IMAGES", 200)
+ANALYZE_BATCH_MAX_BYTES = _env_int("AGRIEDU_ANALYZE_BATCH_MAX_BYTES", 512 * 1024 * 1024)
+# Сколько изображений пакета одновременно в работе; меньше INFERENCE_QUEUE_SIZE,
+# чтобы пакет не вытеснял одиночные запросы из очереди пула
+ANALYZE_BATCH_CONCURRENCY = _env_int("AGRIEDU_ANALYZE_BATCH_CONCURRENCY", BATCH_MAX_SIZE)
+
+# ============ КАТАЛОГ УРОКОВ ============
+# JSON-файл каталога: {"категория": [уроки, ...]}
+LESSONS_PATH = _env_str("AGRIEDU_LESSONS_PATH", os.path.join(os.path.dirname(__file__), "data", "lessons.json"))
+# Сколько готовых тел ответов /api/lessons держать в памяти
+LESSONS_CACHE_SIZE = _env_int("AGRIEDU_LESSONS_CACHE_SIZE", 256)
+LESSONS_MAX_LIMIT = _env_int("AGRIEDU_LESSONS_MAX_LIMIT", 100)
+# Cache-Control: max-age для ответов каталога, секунды
+LESSONS_MAX_AGE = _env_int("AGRIEDU_LESSONS_MAX_AGE", 300)
+
+# ============ СПРАВОЧНИКИ ============
+# JSON-файл справочников: регионы (id, название, климат, советы) и почвы
+REFERENCE_PATH = _env_str("AGRIEDU_REFERENCE_PATH", os.path.join(os.path.dirname(__file__), "data", "reference.json"))
+# Cache-Control: max-age для /api/regions и /api/reference/bundle, секунды
+REFERENCE_MAX_AGE = _env_int("AGRIEDU_REFERENCE_MAX_AGE", 3600)
+
+# ============ ФРОНТЕНД ============
+# Каталог собранного фронтенда, который отдаёт сам backend (пусто - не отдавать).
+# Например ../frontend: страница и API на одном origin, без CORS-запросов
+FRONTEND_DIR = _env_str("AGRIEDU_FRONTEND_DIR", "")
+
+# ============ СЕРИАЛИЗАЦИЯ И СЖАТИЕ ОТВЕТОВ ============
+# JSON-сериализатор ответов: auto (orjson, если установлен), orjson или json
+JSON_BACKEND = _env_str("AGRIEDU_JSON_BACKEND", "auto")
+# Ответы меньше порога не сжимаются (0 - сжатие выключено)
+COMPRESSION_MIN_SIZE = _env_int("AGRIEDU_COMPRESSION_MIN_SIZE", 1024)
+COMPRESSION_GZIP_LEVEL = _env_int("AGRIEDU_COMPRESSION_GZIP_LEVEL", 6)
+# Brotli используется, если установлен пакет brotli; 4-5 - баланс для динамических ответов
+COMPRESSION_BROTLI_QUALITY = _env_int("AGRIEDU_COMPRESSION_BROTLI_QUALITY", 4)
+
+# ============ ОГРАНИЧЕНИЕ ЧАСТОТЫ И ДОПУСК ЗАПРОСОВ ============
+# Лимиты на клиента (API-ключ или IP): запросов в минуту и размер всплеска (0 - без лимита)
+RATE_LIMIT_ANALYZE_PER_MIN = _env_int("AGRIEDU_RATE_LIMIT_ANALYZE_PER_MIN", 60)
+RATE_LIMIT_ANALYZE_BURST = _env_int("AGRIEDU_RATE_LIMIT_ANALYZE_BURST", 20)
+RATE_LIMIT_PREDICT_YIELD_PER_MIN = _env_int("AGRIEDU_RATE_LIMIT_PREDICT_YIELD_PER_MIN", 300)
+RATE_LIMIT_PREDICT_YIELD_BURST = _env_int("AGRIEDU_RATE_LIMIT_PREDICT_YIELD_BURST", 60)
+RATE_LIMIT_TRAIN_PER_MIN = _env_int("AGRIEDU_RATE_LIMIT_TRAIN_PER_MIN", 6)
+RATE_LIMIT_TRAIN_BURST = _env_int("AGRIEDU_RATE_LIMIT_TRAIN_BURST", 2)
+# Пакетные запросы (до ANALYZE_BATCH_MAX_IMAGES фото, тысячи строк) - свои, меньшие лимиты
+RATE_LIMIT_ANALYZE_BATCH_PER_MIN = _env_int("AGRIEDU_RATE_LIMIT_ANALYZE_BATCH_PER_MIN", 2)
+RATE_LIMIT_ANALYZE_BATCH_BURST = _env_int("AGRIEDU_RATE_LIMIT_ANALYZE_BATCH_BURST", 2)
+RATE_LIMIT_PREDICT_YIELD_BATCH_PER_MIN = _env_int("AGRIEDU_RATE_LIMIT_PREDICT_YIELD_BATCH_PER_MIN", 6)
+RATE_LIMIT_PREDICT_YIELD_BATCH_BURST = _env_int("AGRIEDU_RATE_LIMIT_PREDICT_YIELD_BATCH_BURST", 3)
+# Заголовок с ключом клиента. Своя корзина только у ключей из RATE_LIMIT_API_KEYS
+# (через запятую); с неизвестным ключом или без него клиент определяется по IP
+RATE_LIMIT_KEY_HEADER = _env_str("AGRIEDU_RATE_LIMIT_KEY_HEADER", "X-API-Key")
+RATE_LIMIT_API_KEYS = [key.strip() for key in _env_str("AGRIEDU_RATE_LIMIT_API_KEYS", "").split(",") if key.strip()]
+# Число доверенных обратных прокси перед приложением: IP клиента - адрес, который
+# добавил в X-Forwarded-For самый внешний из них (0 - заголовок не учитывается)
+RATE_LIMIT_FORWARDED_HOPS = _env_int("AGRIEDU_RATE_LIMIT_FORWARDED_HOPS", 0)
+# Клиентов в памяти процесса; самые давние вытесняются
+RATE_LIMIT_MAX_KEYS = _env_int("AGRIEDU_RATE_LIMIT_MAX_KEYS", 100000)
+# Общее хранилище лимитов для нескольких воркеров: redis://host:6379/0 (нужен пакет redis;
+# подойдёт любой совместимый сервер с EVALSHA). Пусто - лимиты в памяти каждого процесса
+RATE_LIMIT_STORE_URL = _env_str("AGRIEDU_RATE_LIMIT_STORE_URL", "")
+# Одновременно выполняемых дорогих запросов на процесс (0 - без ограничения)
+ADMISSION_MAX_CONCURRENT = _env_int("AGRIEDU_ADMISSION_MAX_CONCURRENT", 64)
+# Сколько запросов может ждать свободного места; остальные сразу получают 503
+ADMISSION_MAX_QUEUE = _env_int("AGRIEDU_ADMISSION_MAX_QUEUE", 128)
+# Сколько запрос может ждать места, секунды: дольше - 503, пока задержка не выросла для всех
+ADMISSION_QUEUE_TIMEOUT = _env_float("AGRIEDU_ADMISSION_QUEUE_TIMEOUT", 2.0)
@@ -0,0 +1,152 @@
+"""Раздача собранного фронтенда самим backend (AGRIEDU_FRONTEND_DIR).
+
+Индекс файлов строится один раз при старте. Для текстовых файлов берутся
+готовые ``.br``/``.gz`` рядом с файлом (результат сборки) или gzip-вариант
+создаётся в памяти. Ссылки на локальные ассеты в index.html получают
+``?v=<хэш>``: такие запросы кэшируются на год (immutable), а index.html и
+запросы без версии перепроверяются по ETag. Путь без расширения, которого нет
+в индексе, получает index.html (маршруты SPA); пути /api/* никогда.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from email.utils import formatdate
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
+
+from app.api.http_cache import choose_encoding, etag_matches
+from app.static_index import (
+    COMPRESS_MIN_SIZE, COMPRESSIBLE, EXCLUDED, IMMUTABLE, INDEX, MEMORY_LIMIT, REVALIDATE, version_assets, walk,
+)
+
+# Пути backend, для которых SPA-fallback не применяется
+BACKEND_PREFIXES = ("/api/", "/metrics")
+# Порядок предпочтения кодирований
+ENCODINGS = ("br", "gzip")
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Адрес API в index.html: фронтенд и API на одном origin
+API_BASE_META = re.compile(rb'(<meta name="agriedu-api-base" content=")[^"]*(")')
+
+
+class FrontendFile:
+    """Файл фронтенда: ETag, заголовки и варианты тела по кодированию"""
+
+    def __init__(self, path: str, content: bytes, mtime: float):
+        self.path = path
+        self.size = len(content)
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.digest = hashlib.blake2b(content, digest_size=8).hexdigest()
+        self.last_modified = formatdate(mtime, usegmt=True)
+        # Кодирование -> тело в памяти или путь к готовому файлу на диске
+        self.variants: Dict[str, Tuple[Optional[bytes], Optional[str]]] = {
+            "identity": (content, None) if self.size <= MEMORY_LIMIT else (None, path)
+        }
+        if self.media_type.startswith(COMPRESSIBLE):
+            self._add_compressed(content)
+
+    def _add_compressed(self, content: bytes):
+        for encoding, suffix in ENCODING_SUFFIXES.items():
+            # Готовый файл сборки учитывается, только если он не старше исходного
+            prebuilt = self.path + suffix
+            if os.path.exists(prebuilt) and os.path.getmtime(prebuilt) >= os.path.getmtime(self.path):
+                self.variants[encoding] = (None, prebuilt)
+        if "gzip" not in self.variants and COMPRESS_MIN_SIZE <= self.size <= MEMORY_LIMIT:
+            compressed = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(compressed) < self.size:
+                self.variants["gzip"] = (compressed, None)
+
+    def response(self, encoding: Optional[str], versioned: bool, if_none_match: Optional[str], head: bool) -> Response:
+        encoding = encoding or "identity"
+        etag = f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": self.last_modified,
+            "Cache-Control": IMMUTABLE if versioned else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        body, path = self.variants[encoding]
+        if body is not None:
+            return Response(content=b"" if head else body, media_type=self.media_type, headers={
+                **headers, "Content-Length": str(len(body))
+            })
+        return FileResponse(path, media_type=self.media_type, headers=headers, method="HEAD" if head else "GET")
+
+
+class FrontendFiles:
+    """ASGI-приложение со статикой фронтенда; монтируется последним, после маршрутов API"""
+
+    def __init__(self, directory: str):
+        self.directory = os.path.abspath(directory)
+        self.files: Dict[str, FrontendFile] = {}
+        self.build()
+
+    def build(self):
+        files = {}
+        for url, full in walk(self.directory, EXCLUDED + tuple(ENCODING_SUFFIXES.values())):
+            with open(full, "rb") as f:
+                content = f.read()
+            files[url] = FrontendFile(full, content, os.path.getmtime(full))
+
+        index = files.get("/" + INDEX)
+        if index is not None:
+            with open(index.path, "rb") as f:
+                html = self._rewrite_index(f.read(), files)
+            rewritten = FrontendFile(index.path, html, os.path.getmtime(index.path))
+            # Готовые .br/.gz относятся к исходному index.html, а не к переписанному
+            rewritten.variants = {"identity": (html, None)}
+            compressed = gzip.compress(html, compresslevel=9, mtime=0)
+            if len(compressed) < len(html):
+                rewritten.variants["gzip"] = (compressed, None)
+            files["/" + INDEX] = rewritten
+        self.files = files
+
+    @staticmethod
+    def _rewrite_index(html: bytes, files: Dict[str, FrontendFile]) -> bytes:
+        """Версии ассетов и пустой адрес API: страница и API на одном origin"""
+        return API_BASE_META.sub(rb"\1\2", version_assets(html, files))
+
+    def resolve(self, path: str, query: str) -> Tuple[Optional[FrontendFile], bool]:
+        """Файл для пути запроса и признак версии (?v=<хэш>)"""
+        if path.endswith("/"):
+            path += INDEX
+        static = self.files.get(path)
+        if static is None and not path.startswith(BACKEND_PREFIXES) and "." not in path.rsplit("/", 1)[-1]:
+            static = self.files.get("/" + INDEX)
+        return static, static is not None and query == f"v={static.digest}"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return
+        method = scope["method"]
+        if method not in ("GET", "HEAD"):
+            response = PlainTextResponse("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+            await response(scope, receive, send)
+            return
+
+        static, versioned = self.resolve(scope["path"], scope.get("query_string", b"").decode("latin-1"))
+        if static is None:
+            # Как у маршрутов FastAPI, чтобы клиенты API не различали источник 404
+            await JSONResponse({"detail": "Not Found"}, status_code=404)(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        available = [encoding for encoding in ENCODINGS if encoding in static.variants]
+        encoding = choose_encoding(headers.get("accept-encoding"), available)
+        response = static.response(encoding, versioned, headers.get("if-none-match"), method == "HEAD")
+        await response(scope, receive, send)
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self.files),
+            "bytes": sum(f.size for f in self.files.values()),
+            "precompressed": sum(len(f.variants) - 1 for f in self.files.values()),
+        }
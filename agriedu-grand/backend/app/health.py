@@ -0,0 +1,137 @@
+"""Фоновый сбор системной статистики для /api/health и отчёт о памяти воркеров"""
+import asyncio
+import os
+import platform
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+from app import config
+
+
+def _disk_root() -> str:
+    """Корень диска с рабочей папкой: 'C:\\' на Windows, '/' на Linux"""
+    drive = os.path.splitdrive(os.path.abspath(os.getcwd()))[0]
+    return drive + os.sep
+
+
+class SystemStatsSampler:
+    """Периодически обновляет снимок CPU/памяти/диска в фоновом потоке.
+
+    Обработчики health-эндпоинтов только читают готовый снимок и никогда
+    не ждут psutil. cpu_percent считается между двумя соседними замерами,
+    поэтому не требует sleep.
+    """
+
+    def __init__(self, interval: float = config.HEALTH_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.disk_root = _disk_root()
+        self.started_at = time.time()
+        self._snapshot: Optional[Dict] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def sample(self) -> Dict:
+        """Один замер (без блокирующего ожидания)"""
+        import psutil
+
+        try:
+            disk = psutil.disk_usage(self.disk_root).percent
+        except OSError:
+            disk = 0.0
+        self._snapshot = {
+            "cpu_percent": round(psutil.cpu_percent(interval=None), 2),
+            "memory_percent": round(psutil.virtual_memory().percent, 2),
+            "disk_percent": round(disk, 2),
+            "python_version": platform.python_version(),
+            "platform": platform.system(),
+            "sampled_at": datetime.now().isoformat(),
+        }
+        return self._snapshot
+
+    @property
+    def snapshot(self) -> Dict:
+        if self._snapshot is None:
+            return self.sample()
+        return self._snapshot
+
+    @property
+    def uptime_seconds(self) -> float:
+        return round(time.time() - self.started_at, 1)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sample)
+            except Exception:
+                pass
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            # psutil импортируется при старте, а не при импорте приложения.
+            # Первый вызов задаёт точку отсчёта для cpu_percent
+            import psutil
+
+            psutil.cpu_percent(interval=None)
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+def _process_memory(process) -> Dict:
+    """RSS процесса с разбивкой: uss - только его страницы, shared - общие с другими"""
+    info = process.memory_full_info()
+    result = {
+        "pid": process.pid,
+        "rss_mb": round(info.rss / 2 ** 20, 2),
+        "uss_mb": round(info.uss / 2 ** 20, 2),
+        "shared_mb": round((info.rss - info.uss) / 2 ** 20, 2),
+    }
+    if hasattr(info, "pss"):
+        result["pss_mb"] = round(info.pss / 2 ** 20, 2)
+    return result
+
+
+def memory_report(mapped_dir: Optional[str] = None) -> Dict:
+    """Память этого воркера и соседних воркеров (дети того же родителя с тем же интерпретатором).
+
+    Для файлов из mapped_dir (веса модели) показывается, сколько их страниц
+    процесс держит в RSS и какая часть из них общая. Чтение smaps занимает
+    миллисекунды, поэтому вызывать через asyncio.to_thread.
+    """
+    import psutil
+
+    me = psutil.Process()
+    report = {"worker": _process_memory(me), "workers": []}
+
+    parent = me.parent()
+    if parent is not None:
+        for sibling in parent.children():
+            try:
+                if sibling.exe() == me.exe():
+                    report["workers"].append(_process_memory(sibling))
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+    report["workers"].sort(key=lambda row: row["pid"])
+
+    if mapped_dir and hasattr(me, "memory_maps"):
+        prefix = os.path.abspath(mapped_dir)
+        mapped = {"rss_mb": 0.0, "shared_mb": 0.0, "private_mb": 0.0, "files": 0}
+        try:
+            maps = me.memory_maps(grouped=True)
+        except (psutil.AccessDenied, NotImplementedError):
+            maps = []
+        for region in maps:
+            if not region.path.startswith(prefix):
+                continue
+            mapped["files"] += 1
+            mapped["rss_mb"] += region.rss / 2 ** 20
+            shared = getattr(region, "shared_clean", 0) + getattr(region, "shared_dirty", 0)
+            mapped["shared_mb"] += shared / 2 ** 20
+            mapped["private_mb"] += (region.rss - shared) / 2 ** 20
+        report["mapped_weights"] = {key: round(value, 2) for key, value in mapped.items()}
+
+    return report
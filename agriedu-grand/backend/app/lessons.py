@@ -0,0 +1,226 @@
+"""Каталог уроков из JSON-файла: индексы, полнотекстовый поиск и готовые тела ответов.
+
+Файл - словарь ``{"категория": [урок, ...]}``; урок может содержать
+``"translations": {"en": {"title": ..., "description": ..., "topics": [...]}}``.
+Каталог неизменяем после загрузки, поэтому индексы строятся один раз, а
+сериализованные страницы с их ETag кэшируются (LRU) и отдаются без повторной сериализации.
+"""
+import bisect
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from app import config
+from app.api.http_cache import make_etag
+from app.api.responses import dumps
+
+ALL_CATEGORIES = "all"
+SEARCH_FIELDS = ("title", "description", "topics")
+
+_TOKEN = re.compile(r"\w+")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower().replace("ё", "е"))
+
+
+class LessonNotFound(Exception):
+    """Урок не найден"""
+
+
+class InvalidCursor(ValueError):
+    """Курсор не относится к этому каталогу"""
+
+
+class LessonCatalogue:
+    """Уроки с индексами по категории, уровню, теме и словам; загрузка при первом обращении"""
+
+    def __init__(
+        self,
+        path: str = config.LESSONS_PATH,
+        cache_size: int = config.LESSONS_CACHE_SIZE,
+        max_limit: int = config.LESSONS_MAX_LIMIT,
+    ):
+        self.path = path
+        self.cache_size = cache_size
+        self.max_limit = max_limit
+        self._lessons: Optional[Dict[int, Dict]] = None
+        self._pages: "OrderedDict[Tuple, Tuple[bytes, str]]" = OrderedDict()
+        self.version = None
+
+        # Метрики
+        self.hits = 0
+        self.misses = 0
+
+    def _ensure_loaded(self):
+        if self._lessons is None:
+            self.load()
+
+    def load(self):
+        """Чтение файла и построение индексов (заменяет каталог целиком)"""
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+
+        lessons: Dict[int, Dict] = {}
+        by_category: Dict[str, Set[int]] = {}
+        by_level: Dict[str, Set[int]] = {}
+        by_topic: Dict[str, Set[int]] = {}
+        words: Dict[str, Set[int]] = {}
+        for category, items in data.items():
+            for lesson in items:
+                lesson_id = lesson["id"]
+                if lesson_id in lessons:
+                    raise ValueError(f"Повторный id урока: {lesson_id}")
+                lessons[lesson_id] = lesson
+                by_category.setdefault(category, set()).add(lesson_id)
+                by_level.setdefault(lesson.get("level"), set()).add(lesson_id)
+                for variant in [lesson, *lesson.get("translations", {}).values()]:
+                    for topic in variant.get("topics", []):
+                        by_topic.setdefault(topic.lower(), set()).add(lesson_id)
+                    for word in self._words(variant):
+                        words.setdefault(word, set()).add(lesson_id)
+
+        self._lessons = lessons
+        self._ids = sorted(lessons)
+        self._by_category = by_category
+        self._by_level = by_level
+        self._by_topic = by_topic
+        self._words_index = words
+        self._terms = sorted(words)
+        self._pages = OrderedDict()
+        self.version = make_etag(raw)
+
+    @staticmethod
+    def _words(lesson: Dict) -> Iterable[str]:
+        for field in SEARCH_FIELDS:
+            value = lesson.get(field)
+            for text in (value if isinstance(value, list) else [value or ""]):
+                yield from tokenize(text)
+
+    @property
+    def count(self) -> int:
+        self._ensure_loaded()
+        return len(self._lessons)
+
+    def _search(self, q: str) -> Set[int]:
+        """Уроки, где каждое слово запроса - начало какого-то слова урока"""
+        found: Optional[Set[int]] = None
+        for token in tokenize(q):
+            matched: Set[int] = set()
+            index = bisect.bisect_left(self._terms, token)
+            while index < len(self._terms) and self._terms[index].startswith(token):
+                matched |= self._words_index[self._terms[index]]
+                index += 1
+            found = matched if found is None else found & matched
+            if not found:
+                break
+        return found or set()
+
+    def _select(self, category: str, level: Optional[str], topic: Optional[str], q: Optional[str]) -> List[int]:
+        selected: Optional[Set[int]] = None
+        filters = []
+        if category != ALL_CATEGORIES:
+            filters.append(self._by_category.get(category, set()))
+        if level:
+            filters.append(self._by_level.get(level, set()))
+        if topic:
+            filters.append(self._by_topic.get(topic.lower(), set()))
+        if q and q.strip():
+            filters.append(self._search(q))
+        for ids in sorted(filters, key=len):
+            selected = set(ids) if selected is None else selected & ids
+        return self._ids if selected is None else sorted(selected)
+
+    def _localised(self, lesson_id: int, lang: Optional[str]) -> Dict:
+        lesson = {key: value for key, value in self._lessons[lesson_id].items() if key != "translations"}
+        if lang:
+            lesson.update(self._lessons[lesson_id].get("translations", {}).get(lang, {}))
+        return lesson
+
+    def _cached(self, key: Tuple, build) -> Tuple[bytes, str]:
+        page = self._pages.get(key)
+        if page is not None:
+            self.hits += 1
+            self._pages.move_to_end(key)
+            return page
+        self.misses += 1
+        body = dumps(build())
+        page = (body, make_etag(body))
+        self._pages[key] = page
+        while len(self._pages) > self.cache_size:
+            self._pages.popitem(last=False)
+        return page
+
+    def page(
+        self,
+        category: str = "agriculture",
+        level: Optional[str] = None,
+        topic: Optional[str] = None,
+        q: Optional[str] = None,
+        lang: Optional[str] = None,
+        offset: int = 0,
+        limit: int = 10,
+        cursor: Optional[str] = None,
+    ) -> Tuple[bytes, str]:
+        """Тело ответа /lessons и его ETag. cursor - id последнего урока предыдущей страницы"""
+        self._ensure_loaded()
+        limit = max(1, min(limit, self.max_limit))
+        offset = max(0, offset)
+        key = ("page", category, level, topic and topic.lower(), " ".join(tokenize(q or "")), lang, offset, limit, cursor)
+
+        def build() -> Dict:
+            ids = self._select(category, level, topic, q)
+            start = offset
+            if cursor is not None:
+                try:
+                    start = bisect.bisect_right(ids, int(cursor))
+                except ValueError:
+                    raise InvalidCursor(cursor)
+            page_ids = ids[start:start + limit]
+            has_more = start + limit < len(ids)
+            return {
+                "category": category,
+                "count": len(page_ids),
+                "total": len(ids),
+                "offset": start,
+                "limit": limit,
+                "next_cursor": str(page_ids[-1]) if has_more else None,
+                "next_offset": start + limit if has_more else None,
+                "lessons": [self._localised(lesson_id, lang) for lesson_id in page_ids],
+            }
+
+        return self._cached(key, build)
+
+    def lesson(self, lesson_id: int, lang: Optional[str] = None) -> Tuple[bytes, str]:
+        self._ensure_loaded()
+        if lesson_id not in self._lessons:
+            raise LessonNotFound(lesson_id)
+        return self._cached(("lesson", lesson_id, lang), lambda: self._localised(lesson_id, lang))
+
+    def facets(self) -> Tuple[bytes, str]:
+        """Категории, уровни и темы с числом уроков - для фильтров на фронтенде"""
+        self._ensure_loaded()
+        return self._cached(("facets",), lambda: {
+            "total": len(self._lessons),
+            "categories": {name: len(ids) for name, ids in sorted(self._by_category.items())},
+            "levels": {name: len(ids) for name, ids in sorted(self._by_level.items()) if name},
+            "topics": {name: len(ids) for name, ids in sorted(self._by_topic.items())},
+        })
+
+    def warm(self):
+        """Первые страницы каждой категории с параметрами по умолчанию - самые частые запросы"""
+        self._ensure_loaded()
+        for category in [ALL_CATEGORIES, *self._by_category]:
+            self.page(category)
+        self.facets()
+
+    def stats(self) -> Dict:
+        return {
+            "lessons": len(self._lessons) if self._lessons is not None else 0,
+            "cached_pages": len(self._pages),
+            "cache_size": self.cache_size,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -1,16 +1,22 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from datetime import datetime
-import psutil
+import asyncio
+import gc
 import json
 
+from app.health import SystemStatsSampler, memory_report
+from app.metrics import REGISTRY, MetricsMiddleware
+from app.api.responses import FastJSONResponse
+
 app = FastAPI(
     title="AgriEdu AI Suite v2.0",
     description="Powerful AI for Agriculture",
     version="2.0.0",
     docs_url="/api/docs",
     redoc_url="/api/redoc",
+    default_response_class=FastJSONResponse,
     openapi_tags=[
         {"name": "System", "description": "System health and status"},
         {"name": "Agriculture", "description": "AI plant analysis"},
@@ -18,7 +24,37 @@ app = FastAPI(
     ]
 )
 
-# CORS
+# Ограничение размера загрузок до разбора multipart
+from app import config
+from app.api.uploads import UploadSizeLimitMiddleware
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    limits={
+        "/api/analyze-plant": config.UPLOAD_MAX_BYTES + config.UPLOAD_FORM_OVERHEAD,
+        "/api/predict-yield/batch": config.YIELD_BATCH_MAX_BYTES,
+        "/api/analyze-plant/batch": config.ANALYZE_BATCH_MAX_BYTES,
+    },
+)
+
+# Сжатие ответов gzip/brotli (внутри метрик: время запроса включает сжатие)
+from app.api.compression import CompressionMiddleware
+app.add_middleware(CompressionMiddleware)
+
+# Лимиты частоты по клиентам (429) и допуск дорогих запросов (503) - до разбора тела
+from app.api.rate_limit import AdmissionController, RateLimiter, RateLimitMiddleware, default_limits, default_routes
+rate_limiter = RateLimiter(default_limits())
+admission = AdmissionController()
+app.add_middleware(
+    RateLimitMiddleware,
+    limiter=rate_limiter,
+    admission=admission,
+    routes=default_routes(),
+)
+
+# Метрики запросов (учитывают и отклонённые загрузки и лимиты)
+app.add_middleware(MetricsMiddleware)
+
+# CORS - самый внешний слой: заголовки получают и ответы 413/429/503 других middleware
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -28,11 +64,58 @@ app.add_middleware(
 )
 
 # ============ IMPORT API ENDPOINTS ============
-from app.api.endpoints import router as api_router
+from app.api.endpoints import (
+    router as api_router, model_registry, inference_pool, batcher, result_cache,
+    training_scheduler, analysis_store, analysis_jobs, lesson_catalogue,
+    reference_catalogue
+)
 app.include_router(api_router, prefix="/api")
 
+system_stats = SystemStatsSampler()
+
+if config.MODEL_LOADING == "preload":
+    # Загрузка в мастер-процессе до fork; gc.freeze убирает объекты модели из
+    # обхода сборщика, иначе он трогает их счётчики и копирует страницы в каждый воркер
+    model_registry.ensure_loaded()
+    gc.freeze()
+
+REGISTRY.register_stats("agriedu_inference_pool", "Inference pool", inference_pool.stats)
+REGISTRY.register_stats("agriedu_batching", "Micro-batching", batcher.stats)
+REGISTRY.register_stats("agriedu_result_cache", "Result cache", result_cache.stats)
+REGISTRY.register_stats("agriedu_model_registry", "Model registry", model_registry.stats)
+REGISTRY.register_stats("agriedu_training", "Training jobs", training_scheduler.stats)
+REGISTRY.register_stats("agriedu_analysis_store", "Analysis history", analysis_store.stats)
+REGISTRY.register_stats("agriedu_analysis_jobs", "Async analyses", analysis_jobs.stats)
+REGISTRY.register_stats("agriedu_lessons", "Lessons catalogue", lesson_catalogue.stats)
+REGISTRY.register_stats("agriedu_reference", "Reference data", reference_catalogue.stats)
+REGISTRY.register_stats("agriedu_rate_limit", "Per-client rate limits", rate_limiter.stats)
+REGISTRY.register_stats("agriedu_admission", "Admission control", admission.stats)
+
+@app.on_event("startup")
+async def start_system_stats():
+    system_stats.start()
+    if config.MODEL_LOADING == "background" and not model_registry.ready:
+        app.state.model_preload = asyncio.get_running_loop().create_task(model_registry.preload())
+    # Активная версия модели, переключённая другим воркером
+    app.state.model_watch = asyncio.get_running_loop().create_task(model_registry.watch())
+    training_scheduler.start()
+    analysis_store.start()
+    lesson_catalogue.warm()
+    reference_catalogue.warm()
+
+@app.on_event("shutdown")
+async def shutdown_services():
+    system_stats.stop()
+    app.state.model_watch.cancel()
+    await analysis_jobs.shutdown()
+    training_scheduler.shutdown()
+    batcher.shutdown()
+    inference_pool.shutdown()
+    result_cache.close()
+    await analysis_store.shutdown()
+    await rate_limiter.store.close()
+
 # ============ BEAUTIFUL HOMEPAGE ============
-@app.get("/", response_class=HTMLResponse)
 async def root():
     html = """
     <!DOCTYPE html>
@@ -227,13 +310,16 @@ async def root():
     """
     return HTMLResponse(content=html)
 
+# В режиме AGRIEDU_FRONTEND_DIR по адресу / отдаётся index.html фронтенда
+if not config.FRONTEND_DIR:
+    app.get("/", response_class=HTMLResponse)(root)
+
 # ============ BEAUTIFUL HEALTH ENDPOINT ============
 @app.get("/api/health", tags=["System"])
 async def health_check():
     try:
-        cpu = psutil.cpu_percent(interval=0.1)
-        memory = psutil.virtual_memory().percent
-        disk = psutil.disk_usage('C:/').percent if hasattr(psutil, 'disk_usage') else 0
+        # Снимок обновляется в фоне, обработчик не ждёт psutil
+        system = dict(system_stats.snapshot)
         
         health_data = {
             "status": "healthy",
@@ -241,13 +327,9 @@ async def health_check():
             "version": "2.0.0",
             "timestamp": datetime.now().isoformat(),
             "environment": "production",
-            "system": {
-                "cpu_percent": round(cpu, 2),
-                "memory_percent": round(memory, 2),
-                "disk_percent": round(disk, 2),
-                "python_version": "3.11",
-                "platform": "Windows"
-            },
+            "uptime_seconds": system_stats.uptime_seconds,
+            "model_version": model_registry.version,
+            "system": system,
             "features": {
                 "plant_disease_detection": True,
                 "yield_prediction": True,
@@ -269,7 +351,7 @@ async def health_check():
         }
         
         # Return as beautiful JSON
-        return JSONResponse(
+        return FastJSONResponse(
             content=health_data,
             headers={"X-Health-Check": "AgriEdu-AI-2.0"}
         )
@@ -280,6 +362,43 @@ async def health_check():
             detail={"status": "unhealthy", "error": str(e)}
         )
 
+@app.get("/api/health/live", tags=["System"])
+async def liveness_probe():
+    """Процесс жив и event loop отвечает"""
+    return {"status": "alive"}
+
+@app.get("/api/health/ready", tags=["System"])
+async def readiness_probe():
+    """Готовность принимать трафик: модель загружена и прогрета, очереди инференса не переполнены"""
+    load = {
+        "inference_pool": round(inference_pool.load(), 3),
+        "batch_queue": round(batcher.load(), 3)
+    }
+    checks = {
+        # В режиме lazy модель грузит первый запрос, поэтому она не блокирует готовность
+        "model": model_registry.ready or config.MODEL_LOADING == "lazy",
+        "inference_pool": load["inference_pool"] < config.READY_QUEUE_THRESHOLD,
+        "batch_queue": load["batch_queue"] < config.READY_QUEUE_THRESHOLD
+    }
+    ready = all(checks.values())
+    return FastJSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not_ready", "checks": checks, "load": load}
+    )
+
+@app.get("/api/health/memory", tags=["System"])
+async def memory_usage():
+    """Память воркеров: уникальная (USS) и общая часть RSS, страницы весов модели"""
+    report = await asyncio.to_thread(memory_report, config.MODEL_DIR)
+    report["model"] = model_registry.active.memory_info() if model_registry.ready else None
+    return report
+
+# ============ METRICS ============
+@app.get("/metrics", tags=["System"], response_class=PlainTextResponse)
+async def metrics():
+    """Метрики в текстовом формате Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 # ============ SIMPLE TEST ENDPOINT ============
 @app.get("/api/test", tags=["API"])
 async def test_endpoint():
@@ -299,4 +418,12 @@ async def info():
         "team": "AgriEdu AI Team",
         "contact": "support@agriedu.kg",
         "website": "https://kthi.mlg.expert"
-    }
\ No newline at end of file
+    }
+
+# ============ FRONTEND ============
+# Монтируется последним: маршруты API и документации имеют приоритет
+if config.FRONTEND_DIR:
+    from app.frontend import FrontendFiles
+    frontend_files = FrontendFiles(config.FRONTEND_DIR)
+    REGISTRY.register_stats("agriedu_frontend", "Frontend static files", frontend_files.stats)
+    app.mount("/", frontend_files, name="frontend")
@@ -0,0 +1,163 @@
+"""Динамический микро-батчинг для инференса модели болезней"""
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple
+
+from app import config
+from app.metrics import observe_stage
+from app.ml.inference import InferenceQueueFull, InferenceTimeout
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class MicroBatcher:
+    """Собирает изображения в батч и выполняет один прямой проход на весь батч.
+
+    Батч отправляется, когда набрано ``max_batch_size`` изображений или
+    с момента прихода первого прошло ``max_wait_ms`` миллисекунд.
+    Результаты раздаются ожидающим запросам по порядку. Запрос может передать
+    свою функцию прямого прохода (версию модели); изображения разных версий
+    из одного сбора выполняются отдельными проходами.
+    """
+
+    def __init__(
+        self,
+        forward: Callable[["np.ndarray"], "np.ndarray"],
+        input_shape: Tuple[int, ...] = (224, 224, 3),
+        max_batch_size: int = config.BATCH_MAX_SIZE,
+        max_wait_ms: float = config.BATCH_MAX_WAIT_MS,
+        queue_size: int = config.BATCH_QUEUE_SIZE,
+        timeout: float = config.INFERENCE_TIMEOUT,
+    ):
+        self.forward = forward
+        self.input_shape = tuple(input_shape)
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.queue_size = queue_size
+        self.timeout = timeout
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        # Метрики
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.failed_batches = 0
+        self.forward_seconds = 0.0
+        self.batch_sizes = Counter()
+
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            if self._executor is None:
+                # Прямой проход сам по себе многопоточный, поэтому один поток
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="batch-forward")
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = loop.create_task(self._run())
+
+    async def submit(self, tensor: "np.ndarray", forward: Optional[Callable] = None) -> "np.ndarray":
+        """Постановка одного изображения в очередь, возвращает выход модели для него"""
+        if tensor.shape != self.input_shape:
+            raise ValueError(
+                f"Неверная форма изображения {tensor.shape}, ожидается {self.input_shape}"
+            )
+        self._ensure_started()
+
+        future = self._loop.create_future()
+        try:
+            self._queue.put_nowait((tensor, forward or self.forward, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise InferenceQueueFull()
+
+        try:
+            return await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeout()
+
+    def load(self) -> float:
+        """Доля заполнения очереди батчинга (0..1)"""
+        if self._queue is None or self.queue_size <= 0:
+            return 0.0
+        return self._queue.qsize() / self.queue_size
+
+    async def _collect(self) -> List[Tuple["np.ndarray", Callable, asyncio.Future]]:
+        items = [await self._queue.get()]
+        deadline = self._loop.time() + self.max_wait
+        while len(items) < self.max_batch_size:
+            if not self._queue.empty():
+                items.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                items.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        # Запросы, которые уже отменены или истекли, в батч не попадают
+        return [item for item in items if not item[2].done()]
+
+    async def _run(self):
+        while True:
+            items = await self._collect()
+            groups: Dict[Callable, List[Tuple["np.ndarray", asyncio.Future]]] = {}
+            for tensor, forward, future in items:
+                groups.setdefault(forward, []).append((tensor, future))
+            for forward, group in groups.items():
+                await self._run_batch(forward, group)
+
+    async def _run_batch(self, forward: Callable, items: List[Tuple["np.ndarray", asyncio.Future]]):
+        import numpy as np
+
+        batch = np.stack([tensor for tensor, _ in items]).astype(np.float32, copy=False)
+        started = time.perf_counter()
+        try:
+            outputs = await self._loop.run_in_executor(self._executor, forward, batch)
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        elapsed = time.perf_counter() - started
+        observe_stage("inference", elapsed)
+        self.forward_seconds += elapsed
+        self.batches += 1
+        self.items += len(items)
+        self.batch_sizes[len(items)] += 1
+
+        for (_, future), output in zip(items, outputs):
+            if not future.done():
+                future.set_result(output)
+
+    def stats(self) -> Dict:
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_size": self.queue_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "items": self.items,
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "avg_forward_ms": round(self.forward_seconds / self.batches * 1000, 3) if self.batches else 0,
+            "batch_size_histogram": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+        }
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,213 @@
+"""Кэш результатов анализа по содержимому изображения"""
+import asyncio
+import base64
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import BinaryIO, Dict, Optional, Tuple, Union
+
+from app import config
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_image(image: Union[bytes, BinaryIO]) -> str:
+    """SHA-256 содержимого изображения; файл читается чанками и перематывается в начало"""
+    if isinstance(image, bytes):
+        return hashlib.sha256(image).hexdigest()
+    digest = hashlib.sha256()
+    image.seek(0)
+    for chunk in iter(lambda: image.read(HASH_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    image.seek(0)
+    return digest.hexdigest()
+
+
+def _json_default(value):
+    # heatmap и другие массивы NumPy хранятся как base64 с формой и типом
+    import numpy as np
+
+    if isinstance(value, np.ndarray):
+        return {
+            "__ndarray__": base64.b64encode(np.ascontiguousarray(value).tobytes()).decode(),
+            "dtype": str(value.dtype),
+            "shape": list(value.shape),
+        }
+    raise TypeError(f"Не сериализуется: {type(value).__name__}")
+
+
+def _json_object_hook(obj: Dict):
+    if "__ndarray__" in obj:
+        import numpy as np
+
+        data = base64.b64decode(obj["__ndarray__"])
+        return np.frombuffer(data, dtype=obj["dtype"]).reshape(obj["shape"])
+    return obj
+
+
+class _DiskTier:
+    """Дисковый уровень кэша в SQLite (WAL), общий для воркеров на одной машине"""
+
+    PRUNE_EVERY = 256
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS results_expires ON results (expires)")
+
+    def get(self, key: str) -> Optional[Tuple[Dict, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires FROM results WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0], object_hook=_json_object_hook), row[1]
+
+    def set(self, key: str, value: Dict, expires: float) -> int:
+        """Запись значения, возвращает число удалённых при очистке записей"""
+        payload = json.dumps(value, ensure_ascii=False, default=_json_default)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                (key, payload, expires)
+            )
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY:
+                return 0
+            return self._prune()
+
+    def _prune(self) -> int:
+        removed = self._conn.execute(
+            "DELETE FROM results WHERE expires < ?", (time.time(),)
+        ).rowcount
+        overflow = self._conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            removed += self._conn.execute(
+                "DELETE FROM results WHERE key IN "
+                "(SELECT key FROM results ORDER BY expires LIMIT ?)", (overflow,)
+            ).rowcount
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResultCache:
+    """Двухуровневый кэш: LRU в памяти (размер + TTL) и необязательный SQLite на диске.
+
+    Ключ - хэш байтов изображения, тип растения и версия модели, поэтому
+    повторная загрузка того же фото не доходит до декодирования и инференса.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = config.CACHE_MAX_ENTRIES,
+        ttl: float = config.CACHE_TTL,
+        disk_path: str = config.CACHE_DISK_PATH,
+        disk_max_entries: int = config.CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self._disk: Optional[_DiskTier] = None
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @property
+    def disk(self) -> Optional[_DiskTier]:
+        """Дисковый уровень открывается при первом обращении"""
+        if self._disk is None and self.disk_path:
+            self._disk = _DiskTier(self.disk_path, self.disk_max_entries)
+        return self._disk
+
+    @staticmethod
+    def make_key(image_digest: str, plant_type: str, model_version: str) -> str:
+        return f"{model_version}:{plant_type}:{image_digest}"
+
+    async def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires >= time.time():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(value)
+            del self._entries[key]
+            self.expirations += 1
+
+        if self.disk is not None:
+            entry = await asyncio.to_thread(self.disk.get, key)
+            if entry is not None:
+                self._remember(key, *entry)
+                self.disk_hits += 1
+                return dict(entry[0])
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: Dict):
+        if not self.enabled:
+            return
+        expires = time.time() + self.ttl
+        self._remember(key, value, expires)
+        if self.disk is not None:
+            self.disk_evictions += await asyncio.to_thread(self.disk.set, key, value, expires)
+
+    def _remember(self, key: str, value: Dict, expires: float):
+        self._entries[key] = (dict(value), expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "disk": bool(self.disk_path),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "disk_evictions": self.disk_evictions,
+        }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
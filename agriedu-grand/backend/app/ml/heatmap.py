@@ -0,0 +1,138 @@
+"""Кодирование heatmap и хранение последних heatmap для отдельной выдачи"""
+import base64
+import io
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional
+
+from app import config
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# json - base64(JSON-список 0..100), старый формат
+# raw  - base64 сырых uint8 построчно
+# png  - base64 PNG в оттенках серого
+# url  - без данных в ответе, только ссылка на /api/analysis/{id}/heatmap
+#        (только с общим для воркеров каталогом HeatmapStore)
+HEATMAP_ENCODINGS = ("json", "raw", "png", "url")
+
+
+def heatmap_to_png(heatmap: "np.ndarray") -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(heatmap, "L").save(buffer, "PNG", optimize=False)
+    return buffer.getvalue()
+
+
+def encode_heatmap(heatmap: "np.ndarray", encoding: str) -> Dict:
+    """Поля ответа с heatmap в выбранном представлении"""
+    import numpy as np
+
+    if encoding not in HEATMAP_ENCODINGS:
+        raise ValueError(f"Неизвестный формат heatmap: {encoding}")
+
+    height, width = heatmap.shape
+    if encoding == "json":
+        percent = np.rint(heatmap.astype(np.float32) * (100 / 255)).astype(int)
+        data = base64.b64encode(json.dumps(percent.tolist()).encode()).decode()
+    elif encoding == "raw":
+        data = base64.b64encode(np.ascontiguousarray(heatmap).tobytes()).decode()
+    elif encoding == "png":
+        data = base64.b64encode(heatmap_to_png(heatmap)).decode()
+    else:
+        data = None
+
+    return {
+        "heatmap": data,
+        "heatmap_format": {"encoding": encoding, "width": width, "height": height, "dtype": "uint8"}
+    }
+
+
+_SAFE_ID = re.compile(r"[A-Za-z0-9_\-]+")
+
+
+class HeatmapStore:
+    """Последние heatmap по analysis_id, чтобы UI забирал их отдельным запросом.
+
+    Heatmap хранятся в каталоге directory (по файлу .npy на анализ), общем для
+    всех воркеров, плюс LRU в памяти процесса. Без каталога хранилище выключено:
+    запрос за heatmap может попасть на воркер, который её не видел.
+    Методы работают с диском и вызываются из потоков (asyncio.to_thread).
+    """
+
+    def __init__(self, directory: str = config.HEATMAP_STORE_DIR, max_entries: int = config.HEATMAP_STORE_SIZE):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._heatmaps: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._puts = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def shared(self) -> bool:
+        return bool(self.directory)
+
+    def _path(self, analysis_id: str) -> Optional[str]:
+        if not _SAFE_ID.fullmatch(analysis_id):
+            return None
+        return os.path.join(self.directory, analysis_id + ".npy")
+
+    def put(self, analysis_id: str, heatmap: "np.ndarray"):
+        import numpy as np
+
+        if not self.shared:
+            return
+        path = self._path(analysis_id)
+        if path is None:
+            return
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, "wb") as f:
+            np.save(f, heatmap, allow_pickle=False)
+        os.replace(temporary, path)
+
+        with self._lock:
+            self._heatmaps[analysis_id] = heatmap
+            self._heatmaps.move_to_end(analysis_id)
+            while len(self._heatmaps) > self.max_entries:
+                self._heatmaps.popitem(last=False)
+            self._puts += 1
+            prune = self._puts % max(1, self.max_entries // 4) == 0
+        if prune:
+            self._prune()
+
+    def _prune(self):
+        """Удаление самых старых файлов сверх max_entries (их пишут все воркеры)"""
+        try:
+            entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".npy")]
+            entries.sort(key=lambda entry: entry.stat().st_mtime)
+            for entry in entries[:max(0, len(entries) - self.max_entries)]:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+    def exists(self, analysis_id: str) -> bool:
+        """Есть ли heatmap, без чтения файла"""
+        if analysis_id in self._heatmaps:
+            return True
+        path = self._path(analysis_id) if self.shared else None
+        return path is not None and os.path.exists(path)
+
+    def get(self, analysis_id: str) -> Optional["np.ndarray"]:
+        import numpy as np
+
+        heatmap = self._heatmaps.get(analysis_id)
+        if heatmap is not None or not self.shared:
+            return heatmap
+        path = self._path(analysis_id)
+        if path is None:
+            return None
+        try:
+            return np.load(path, allow_pickle=False)
+        except (OSError, ValueError):
+            return None
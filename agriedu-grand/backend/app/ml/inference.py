@@ -0,0 +1,131 @@
+"""Пул воркеров для инференса вне event loop"""
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+from app import config
+
+if TYPE_CHECKING:
+    from app.ml.plant_disease import PlantDiseaseModel
+
+
+class InferenceQueueFull(Exception):
+    """Очередь инференса заполнена"""
+
+
+class InferenceTimeout(Exception):
+    """Анализ не уложился в таймаут"""
+
+
+# Модель внутри процесса-воркера (только для режима "process")
+_worker_model: Optional["PlantDiseaseModel"] = None
+
+
+def _init_process_worker():
+    global _worker_model
+    from app.ml.plant_disease import PlantDiseaseModel
+
+    _worker_model = PlantDiseaseModel()
+
+
+def _call_in_process(method: str, *args):
+    return getattr(_worker_model, method)(*args)
+
+
+class InferencePool:
+    """Ограниченный пул потоков/процессов для тяжёлых вычислений модели.
+
+    Вместимость пула - ``workers + queue_size`` задач. Если она исчерпана,
+    ``submit`` сразу бросает ``InferenceQueueFull``, не ставя задачу в очередь.
+    """
+
+    def __init__(
+        self,
+        model: Optional["PlantDiseaseModel"] = None,
+        workers: int = config.INFERENCE_WORKERS,
+        queue_size: int = config.INFERENCE_QUEUE_SIZE,
+        timeout: float = config.INFERENCE_TIMEOUT,
+        kind: str = config.INFERENCE_EXECUTOR,
+    ):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Неизвестный тип пула: {kind}")
+        self.model = model
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, queue_size)
+        self.timeout = timeout
+        self.kind = kind
+        self.pending = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, initializer=_init_process_worker
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="inference"
+                )
+        return self._executor
+
+    def is_full(self) -> bool:
+        return self.pending >= self.capacity
+
+    def load(self) -> float:
+        """Доля занятых слотов пула (0..1)"""
+        return self.pending / self.capacity
+
+    def _release(self, _future):
+        self.pending -= 1
+
+    async def submit(self, fn: Callable, *args, timeout: Optional[float] = None):
+        """Выполнение fn(*args) в пуле с учётом вместимости и таймаута"""
+        if self.is_full():
+            raise InferenceQueueFull()
+
+        future = self.executor.submit(fn, *args)
+        self.pending += 1
+        # Слот освобождается, только когда воркер действительно закончил
+        # (или задача отменена до старта), а не когда клиент перестал ждать
+        loop = asyncio.get_running_loop()
+
+        def on_done(f):
+            try:
+                loop.call_soon_threadsafe(self._release, f)
+            except RuntimeError:  # event loop уже закрыт
+                pass
+
+        future.add_done_callback(on_done)
+
+        try:
+            return await asyncio.wait_for(
+                asyncio.wrap_future(future), timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            future.cancel()
+            raise InferenceTimeout()
+
+    async def call(self, method: str, *args, model: Optional["PlantDiseaseModel"] = None):
+        """Вызов метода модели в пуле (в режиме "process" - у копии модели воркера).
+
+        ``model`` - версия, взятая запросом из реестра; копия в процессе-воркере
+        подходит только для методов, не зависящих от весов (предобработка).
+        """
+        if self.kind == "process":
+            return await self.submit(_call_in_process, method, *args)
+        return await self.submit(getattr(model or self.model, method), *args)
+
+    def stats(self) -> Dict:
+        return {
+            "executor": self.kind,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
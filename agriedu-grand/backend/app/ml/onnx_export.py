@@ -0,0 +1,106 @@
+"""Экспорт эталонного классификатора (weights/*.npy) в ONNX для OnnxBackend.
+
+    python -m app.ml.onnx_export models/2.2.0 [--layout nhwc|nchw] [--int8]
+
+Нужны пакеты onnx и onnxruntime (для --int8). Граф повторяет NumpyBackend:
+средний пулинг -> MatMul + Relu -> MatMul -> Softmax. Манифест артефакта
+получает "backend": "onnx" и секцию "onnx".
+"""
+import argparse
+import json
+import os
+from typing import Dict
+
+import numpy as np
+
+from app.ml.weights import load_weights
+
+INPUT_SIZE = 224
+# IR 8 - минимальная версия для opset 17
+IR_VERSION = 8
+
+
+def build_graph(weights: Dict[str, np.ndarray], layout: str = "nhwc", opset: int = 17):
+    """ONNX-модель с входом (N, 224, 224, 3) или (N, 3, 224, 224) и вероятностями на выходе"""
+    import onnx
+    from onnx import TensorProto, helper, numpy_helper
+
+    pool = round((weights["dense_1"].shape[0] / 3) ** 0.5)
+    stride = INPUT_SIZE // pool
+    classes = weights["dense_2"].shape[1]
+    input_shape = ["N", INPUT_SIZE, INPUT_SIZE, 3] if layout == "nhwc" else ["N", 3, INPUT_SIZE, INPUT_SIZE]
+
+    nodes = []
+    current = "image"
+    if layout == "nhwc":
+        nodes.append(helper.make_node("Transpose", [current], ["image_nchw"], perm=[0, 3, 1, 2]))
+        current = "image_nchw"
+    nodes += [
+        helper.make_node("AveragePool", [current], ["pooled"], kernel_shape=[stride, stride], strides=[stride, stride]),
+        # Порядок признаков как в NumpyBackend: (строка, столбец, канал)
+        helper.make_node("Transpose", ["pooled"], ["pooled_nhwc"], perm=[0, 2, 3, 1]),
+        helper.make_node("Flatten", ["pooled_nhwc"], ["features"], axis=1),
+        helper.make_node("MatMul", ["features", "dense_1"], ["dense_1_out"]),
+        helper.make_node("Add", ["dense_1_out", "dense_1_bias"], ["dense_1_biased"]),
+        helper.make_node("Relu", ["dense_1_biased"], ["hidden"]),
+        helper.make_node("MatMul", ["hidden", "dense_2"], ["dense_2_out"]),
+        helper.make_node("Add", ["dense_2_out", "dense_2_bias"], ["logits"]),
+        helper.make_node("Softmax", ["logits"], ["probabilities"], axis=1),
+    ]
+    initializers = [
+        numpy_helper.from_array(np.asarray(weights[name], dtype=np.float32), name)
+        for name in ("dense_1", "dense_1_bias", "dense_2", "dense_2_bias")
+    ]
+    graph = helper.make_graph(
+        nodes, "plant_disease_classifier",
+        [helper.make_tensor_value_info("image", TensorProto.FLOAT, input_shape)],
+        [helper.make_tensor_value_info("probabilities", TensorProto.FLOAT, ["N", classes])],
+        initializers,
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", opset)])
+    # Свежий пакет onnx ставит IR новее, чем понимают распространённые сборки onnxruntime
+    model.ir_version = IR_VERSION
+    onnx.checker.check_model(model)
+    return model
+
+
+def export(directory: str, layout: str = "nhwc", int8: bool = False) -> Dict:
+    import onnx
+
+    weights = load_weights(directory, mmap=True)
+    if not weights:
+        raise SystemExit(f"В {directory} нет weights/*.npy (см. python -m app.ml.weights)")
+
+    settings = {"model": "model.onnx", "output": "probabilities"}
+    onnx.save(build_graph(weights, layout), os.path.join(directory, settings["model"]))
+    if int8:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        settings["model_int8"] = "model.int8.onnx"
+        quantize_dynamic(
+            os.path.join(directory, settings["model"]), os.path.join(directory, settings["model_int8"]),
+            weight_type=QuantType.QInt8
+        )
+
+    manifest_path = os.path.join(directory, "model.json")
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            manifest = json.load(f)
+    manifest.update({"backend": "onnx", "onnx": settings})
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="каталог версии с weights/*.npy")
+    parser.add_argument("--layout", choices=("nhwc", "nchw"), default="nhwc")
+    parser.add_argument("--int8", action="store_true", help="дополнительно INT8 (динамическая квантизация весов)")
+    args = parser.parse_args()
+    print(json.dumps(export(args.directory, args.layout, args.int8), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
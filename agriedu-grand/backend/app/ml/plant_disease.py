@@ -1,15 +1,221 @@
 ﻿import numpy as np
-from PIL import Image
+from PIL import Image, ImageOps
 import json
 import random
-from typing import Dict, List
-import base64
+from typing import BinaryIO, Dict, List, Optional, Sequence, Union
 import io
+import os
+import time
+
+from app import config
+from app.metrics import observe_stage, time_stage
+from app.ml.heatmap import encode_heatmap
+from app.ml.weights import load_weights, weights_info
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    probabilities = np.exp(logits)
+    probabilities /= probabilities.sum(axis=1, keepdims=True)
+    return probabilities.astype(np.float32, copy=False)
+
+
+class InferenceBackend:
+    """Бэкенд прямого прохода: батч float32 (B, H, W, 3) в [0, 1] -> вероятности (B, классы)"""
+    
+    name = "base"
+    
+    def validate(self, input_size, num_classes: int):
+        """Проверка совместимости с входом и числом классов модели (ValueError)"""
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+    
+    def info(self) -> Dict:
+        return {"name": self.name}
+
+
+class StubBackend(InferenceBackend):
+    """Имитация нейросети для демо: один класс получает уверенность 0.75-0.98"""
+    
+    name = "stub"
+    
+    def __init__(self, num_classes: int):
+        self.num_classes = num_classes
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        n = batch.shape[0]
+        if self.num_classes == 1:
+            return np.ones((n, 1), dtype=np.float32)
+        top = np.random.randint(0, self.num_classes, size=n)
+        confidence = np.random.uniform(0.75, 0.98, size=n)
+        rest = (1.0 - confidence) / (self.num_classes - 1)
+        probabilities = np.repeat(rest[:, None], self.num_classes, axis=1)
+        probabilities[np.arange(n), top] = confidence
+        return probabilities.astype(np.float32)
+
+
+class NumpyBackend(InferenceBackend):
+    """Эталонный классификатор на NumPy: средний пулинг -> dense + ReLU -> dense -> softmax"""
+    
+    name = "numpy"
+    
+    def __init__(self, weights: Dict[str, np.ndarray]):
+        self.weights = weights
+        self.pool = round((weights["dense_1"].shape[0] / 3) ** 0.5) if "dense_1" in weights else 0
+    
+    def validate(self, input_size, num_classes: int):
+        missing = {"dense_1", "dense_1_bias", "dense_2", "dense_2_bias"} - set(self.weights)
+        if missing:
+            raise ValueError(f"В артефакте нет тензоров: {', '.join(sorted(missing))}")
+        if self.pool * self.pool * 3 != self.weights["dense_1"].shape[0] or input_size[0] % self.pool:
+            raise ValueError(f"Вход dense_1 не соответствует пулингу {input_size} -> (p, p, 3)")
+        if self.weights["dense_2"].shape[1] < num_classes:
+            raise ValueError(f"dense_2 должен иметь не меньше {num_classes} выходов")
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        w = self.weights
+        n, height, width, channels = batch.shape
+        pool = self.pool
+        x = batch.reshape(n, pool, height // pool, pool, width // pool, channels).mean(axis=(2, 4)).reshape(n, -1)
+        hidden = np.maximum(x @ w["dense_1"] + w["dense_1_bias"], 0)
+        return _softmax(hidden @ w["dense_2"] + w["dense_2_bias"])
+    
+    def info(self) -> Dict:
+        return {"name": self.name, "pool": self.pool}
+
+
+class OnnxBackend(InferenceBackend):
+    """ONNX Runtime на CPU (pip install onnxruntime).
+    
+    Раскладка входа (NHWC или NCHW) определяется по форме входа графа;
+    если граф выдаёт логиты (``output="logits"``), softmax считается здесь.
+    """
+    
+    name = "onnx"
+    OPTIMIZATION_LEVELS = ("disable", "basic", "extended", "all")
+    
+    def __init__(
+        self,
+        path: str,
+        output: str = "probabilities",
+        intra_op_threads: int = config.ONNX_INTRA_OP_THREADS,
+        inter_op_threads: int = config.ONNX_INTER_OP_THREADS,
+        optimization_level: str = config.ONNX_GRAPH_OPTIMIZATION,
+    ):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise RuntimeError("Для бэкенда onnx нужен пакет onnxruntime")
+        if optimization_level not in self.OPTIMIZATION_LEVELS:
+            raise ValueError(f"Уровень оптимизации должен быть одним из: {', '.join(self.OPTIMIZATION_LEVELS)}")
+        if output not in ("probabilities", "logits"):
+            raise ValueError("output должен быть probabilities или logits")
+        
+        options = ort.SessionOptions()
+        # 0 - выбор onnxruntime (по числу ядер)
+        options.intra_op_num_threads = max(0, intra_op_threads)
+        options.inter_op_num_threads = max(0, inter_op_threads)
+        options.execution_mode = (
+            ort.ExecutionMode.ORT_PARALLEL if inter_op_threads > 1 else ort.ExecutionMode.ORT_SEQUENTIAL
+        )
+        options.graph_optimization_level = {
+            "disable": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+            "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+            "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+            "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+        }[optimization_level]
+        
+        self.path = path
+        self.output = output
+        self.optimization_level = optimization_level
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        graph_input = self.session.get_inputs()[0]
+        self.input_name = graph_input.name
+        self.input_shape = graph_input.shape
+        self.layout = "NCHW" if self.input_shape[1] == 3 else "NHWC"
+        self.output_name = self.session.get_outputs()[0].name
+        self.output_shape = self.session.get_outputs()[0].shape
+        self.threads = (intra_op_threads, inter_op_threads)
+    
+    def validate(self, input_size, num_classes: int):
+        spatial = self.input_shape[2:] if self.layout == "NCHW" else self.input_shape[1:3]
+        if all(isinstance(d, int) for d in spatial) and tuple(spatial) != tuple(input_size):
+            raise ValueError(f"Вход графа {self.input_shape} не соответствует {input_size}")
+        classes = self.output_shape[-1]
+        if isinstance(classes, int) and classes < num_classes:
+            raise ValueError(f"Граф должен иметь не меньше {num_classes} выходов")
+    
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        if self.layout == "NCHW":
+            batch = np.ascontiguousarray(batch.transpose(0, 3, 1, 2))
+        outputs = self.session.run([self.output_name], {self.input_name: batch})[0]
+        if self.output == "logits":
+            return _softmax(outputs)
+        return outputs.astype(np.float32, copy=False)
+    
+    def info(self) -> Dict:
+        return {
+            "name": self.name,
+            "model": os.path.basename(self.path),
+            "layout": self.layout,
+            "output": self.output,
+            "intra_op_threads": self.threads[0],
+            "inter_op_threads": self.threads[1],
+            "optimization_level": self.optimization_level,
+        }
+    
+    @classmethod
+    def from_manifest(cls, directory: str, settings: Dict) -> "OnnxBackend":
+        """Секция "onnx" манифеста: model, model_int8 (необязательно), output"""
+        path = os.path.join(directory, settings.get("model", "model.onnx"))
+        quantized = settings.get("model_int8")
+        if config.ONNX_QUANTIZED and quantized and os.path.exists(os.path.join(directory, quantized)):
+            path = os.path.join(directory, quantized)
+        return cls(path, output=settings.get("output", "probabilities"))
+
+
+# Меры профилактики по болезням (неизменный справочник, строится один раз при импорте)
+PREVENTIONS = {
+    'Фитофтороз': [
+        'Использование устойчивых сортов',
+        'Соблюдение севооборота',
+        'Оптимальная густота посадки',
+        'Своевременное удаление пораженных растений'
+    ],
+    'Мучнистая роса': [
+        'Контроль влажности',
+        'Хорошая циркуляция воздуха',
+        'Регулярная обрезка',
+        'Профилактические обработки серой'
+    ],
+    'Серая гниль': [
+        'Избегание переувлажнения',
+        'Своевременный сбор урожая',
+        'Дезинфекция инструментов',
+        'Умеренное азотное питание'
+    ]
+}
+DEFAULT_PREVENTION = [
+    'Соблюдение агротехники',
+    'Регулярный осмотр растений',
+    'Профилактические обработки',
+    'Баланс питательных веществ'
+]
+DEFAULT_TREATMENT = "Консультация специалиста"
+
 
 class PlantDiseaseModel:
     """ИИ модель для анализа болезней растений"""
     
-    def __init__(self):
+    # Во сколько раз промежуточное изображение больше входа модели
+    DRAFT_GAP = 2
+    # Версия встроенной демо-модели и имя манифеста артефакта
+    BUILTIN_VERSION = "2.0.0-demo"
+    MANIFEST = "model.json"
+    
+    def __init__(self, version: str = BUILTIN_VERSION, params: Optional[Dict] = None,
+                 weights: Optional[Dict[str, np.ndarray]] = None, backend: Optional[InferenceBackend] = None):
         self.plant_types = {
             'tomato': 'Помидор',
             'potato': 'Картофель',
@@ -38,46 +244,152 @@ class PlantDiseaseModel:
             'Здоровое растение': 'Продолжайте правильный уход. Профилактические обработки.'
         }
         
+        # Базовая урожайность (т/га)
+        self.base_yields = {
+            'wheat': 3.5, 'tomato': 25.0, 'potato': 18.0,
+            'corn': 6.0, 'apple': 15.0, 'grape': 10.0
+        }
+        
+        # Влияние региона
+        self.region_factors = {
+            'Чуйская область': 1.1,
+            'Иссык-Кульская область': 0.9,
+            'Ошская область': 1.2,
+            'Нарынская область': 0.8
+        }
+        
+        # Число выходов классификатора (по самому длинному списку болезней)
+        self.num_classes = max(len(d) for d in self.diseases.values())
+        self.input_size = (224, 224)
+        # Версия весов: входит в ответы и в ключ кэша результатов
+        self.version = version
+        
+        # Параметры артефакта переопределяют встроенные справочники
+        for name in ("base_yields", "region_factors", "treatments"):
+            if params and name in params:
+                getattr(self, name).update(params[name])
+        
+        # Тензоры классификатора (обычно np.memmap, общие для всех воркеров);
+        # без них и без явного бэкенда работает демо-имитация
+        self.weights = weights or {}
+        if backend is None:
+            backend = NumpyBackend(self.weights) if self.weights else StubBackend(self.num_classes)
+        backend.validate(self.input_size, self.num_classes)
+        self.backend = backend
+        
         self.is_initialized = True
+    
+    @classmethod
+    def load(cls, directory: str) -> "PlantDiseaseModel":
+        """Загрузка артефакта модели из каталога с манифестом model.json"""
+        with open(os.path.join(directory, cls.MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        version = manifest.get("version") or os.path.basename(os.path.normpath(directory))
+        weights = load_weights(directory, mmap=config.MODEL_WEIGHTS_MMAP)
+        
+        # "backend": stub, numpy (по весам из weights/) или onnx (секция "onnx")
+        backend_name = manifest.get("backend") or ("numpy" if weights else "stub")
+        if backend_name == "onnx":
+            backend = OnnxBackend.from_manifest(directory, manifest.get("onnx", {}))
+        elif backend_name in ("numpy", "stub"):
+            backend = None
+            if backend_name == "stub":
+                weights = {}
+        else:
+            raise ValueError(f"Неизвестный бэкенд: {backend_name}")
+        return cls(version=version, params=manifest, weights=weights, backend=backend)
+    
+    def memory_info(self) -> Dict:
+        """Бэкенд, размер весов и признак отображения в память"""
+        return {"version": self.version, "backend": self.backend.info(), **weights_info(self.weights)}
+    
+    def warmup(self):
+        """Прогрев: пробный батч и прогноз, чтобы первый запрос не платил за инициализацию"""
+        dummy = np.zeros((1,) + self.input_size + (3,), dtype=np.float32)
+        self.build_disease_result(self.predict_batch(dummy)[0])
+        self.predict_yield("wheat", 1.0)
         
     def is_ready(self) -> bool:
         """Проверка готовности модели"""
         return self.is_initialized
     
-    def preprocess_image(self, image_bytes: bytes) -> np.ndarray:
-        """Предобработка изображения"""
-        image = Image.open(io.BytesIO(image_bytes))
-        image = image.resize((224, 224))
-        image_array = np.array(image) / 255.0
+    def preprocess_image(self, image_bytes: Union[bytes, BinaryIO]) -> np.ndarray:
+        """Предобработка изображения (bytes или открытый файл) -> float32 (224, 224, 3)"""
+        started = time.perf_counter()
+        source = io.BytesIO(image_bytes) if isinstance(image_bytes, bytes) else image_bytes
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8) в DCT-области,
+        # с запасом в DRAFT_GAP раз для качественного финального ресемплинга
+        width, height = self.input_size
+        try:
+            image = Image.open(source)
+            image.draft("RGB", (width * self.DRAFT_GAP, height * self.DRAFT_GAP))
+            image.load()
+        except OSError:
+            # Текст ошибки PIL содержит repr временного файла - клиенту он не нужен
+            raise ValueError("Не удалось декодировать изображение") from None
+        
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        decoded = time.perf_counter()
+        observe_stage("decode", decoded - started)
+        
+        # reducing_gap: сначала целочисленный reduce(), затем точный ресемплинг
+        image = image.resize(self.input_size, Image.BICUBIC, reducing_gap=self.DRAFT_GAP)
+        resized = time.perf_counter()
+        observe_stage("resize", resized - decoded)
+        
+        image_array = np.asarray(image, dtype=np.float32)
+        image_array *= 1.0 / 255.0
+        observe_stage("normalise", time.perf_counter() - resized)
         return image_array
     
-    def predict_disease(self, image_bytes: bytes, plant_type: str = 'tomato') -> Dict:
+    def predict_batch(self, batch: np.ndarray) -> np.ndarray:
+        """Прямой проход по батчу (B, 224, 224, 3) -> вероятности классов (B, num_classes)"""
+        return self.backend.predict(batch)
+    
+    def build_disease_result(self, probabilities: np.ndarray, plant_type: str = 'tomato') -> Dict:
+        """Формирование ответа по вероятностям классов одного изображения"""
+        known_plant = plant_type in self.diseases
+        possible_diseases = self.diseases.get(plant_type, ['Здоровое растение'])
+        scores = probabilities[:len(possible_diseases)]
+        index = int(np.argmax(scores))
+        predicted_disease = possible_diseases[index]
+        if known_plant:
+            # Вероятность среди классов этого растения: выходы сверх его списка болезней не в счёт
+            total = float(scores.sum())
+            confidence = round(float(scores[index]) / total, 2) if total > 0 else 0.0
+        else:
+            # Для неизвестного растения у классификатора нет классов - диагноз без уверенности
+            confidence = 0.0
+        
+        # Создание heatmap для визуализации (демо), кодируется при выдаче
+        with time_stage("heatmap"):
+            heatmap = self.generate_heatmap()
+        
+        return {
+            "success": True,
+            "model_version": self.version,
+            "plant_type": self.plant_types.get(plant_type, plant_type),
+            "plant_type_known": known_plant,
+            "disease": predicted_disease,
+            "confidence": confidence,
+            "treatment": self.treatments.get(predicted_disease, DEFAULT_TREATMENT),
+            "prevention": self._get_prevention(predicted_disease),
+            "heatmap": heatmap,
+            "severity": random.choice(["Низкая", "Средняя", "Высокая"]),
+            "affected_area": f"{random.randint(5, 80)}%"
+        }
+    
+    def predict_disease(self, image_bytes: Union[bytes, BinaryIO], plant_type: str = 'tomato',
+                        heatmap_encoding: str = "png") -> Dict:
         """Предсказание болезни растения"""
         try:
-            # Имитация обработки ИИ
             processed_image = self.preprocess_image(image_bytes)
-            
-            # Генерация "предсказания" для демо
-            possible_diseases = self.diseases.get(plant_type, ['Здоровое растение'])
-            predicted_disease = random.choice(possible_diseases)
-            
-            # Генерация уверенности
-            confidence = round(random.uniform(0.75, 0.98), 2)
-            
-            # Создание heatmap для визуализации (демо)
-            heatmap = self._generate_heatmap(224, 224)
-            
-            return {
-                "success": True,
-                "plant_type": self.plant_types.get(plant_type, plant_type),
-                "disease": predicted_disease,
-                "confidence": confidence,
-                "treatment": self.treatments.get(predicted_disease, "Консультация специалиста"),
-                "prevention": self._get_prevention(predicted_disease),
-                "heatmap": heatmap,
-                "severity": random.choice(["Низкая", "Средняя", "Высокая"]),
-                "affected_area": f"{random.randint(5, 80)}%"
-            }
+            probabilities = self.predict_batch(processed_image[np.newaxis])[0]
+            result = self.build_disease_result(probabilities, plant_type)
+            result.update(encode_heatmap(result.pop("heatmap"), heatmap_encoding))
+            return result
             
         except Exception as e:
             return {
@@ -87,23 +399,9 @@ class PlantDiseaseModel:
     
     def predict_yield(self, crop: str, area: float, region: str = None) -> Dict:
         """Прогноз урожайности"""
-        # Базовая урожайность (т/га)
-        base_yields = {
-            'wheat': 3.5, 'tomato': 25.0, 'potato': 18.0,
-            'corn': 6.0, 'apple': 15.0, 'grape': 10.0
-        }
-        
-        base = base_yields.get(crop, 5.0)
-        
-        # Влияние региона
-        region_factors = {
-            'Чуйская область': 1.1,
-            'Иссык-Кульская область': 0.9,
-            'Ошская область': 1.2,
-            'Нарынская область': 0.8
-        }
+        base = self.base_yields.get(crop, 5.0)
         
-        factor = region_factors.get(region, 1.0) * (0.85 + random.random() * 0.3)
+        factor = self.region_factors.get(region, 1.0) * (0.85 + random.random() * 0.3)
         predicted_yield = round(base * area * factor, 2)
         
         return {
@@ -112,54 +410,91 @@ class PlantDiseaseModel:
             "region": region or "Не указан",
             "predicted_yield_tons": predicted_yield,
             "confidence": round(0.7 + random.random() * 0.25, 2),
-            "recommendations": self._get_yield_recommendations(crop, predicted_yield / area)
+            "recommendations": self._get_yield_recommendations(crop, predicted_yield / area),
+            "model_version": self.version
         }
     
-    def _generate_heatmap(self, width: int, height: int) -> str:
-        """Генерация демо heatmap"""
-        # Создаем простую heatmap для визуализации
-        heatmap_data = []
-        for y in range(height // 10):
-            row = []
-            for x in range(width // 10):
-                # Случайные значения для демо
-                value = random.randint(30, 100)
-                row.append(value)
-            heatmap_data.append(row)
-        
-        # Конвертируем в base64 для простоты
-        import json
-        return base64.b64encode(json.dumps(heatmap_data).encode()).decode()
+    def predict_yield_batch(self, crops: Sequence[str], areas: Sequence[float],
+                            regions: Sequence[Optional[str]]) -> List[Dict]:
+        """Прогноз урожайности для многих полей за один векторный проход"""
+        areas = np.asarray(areas, dtype=np.float64)
+        n = areas.shape[0]
+        if n == 0:
+            return []
+        
+        # Справочники превращаются в выборку по индексам: по одному поиску на уникальное значение
+        crop_keys, crop_index = np.unique(np.asarray(crops, dtype=object).astype(str), return_inverse=True)
+        crop_keys = crop_keys.tolist()
+        base = np.array([self.base_yields.get(c, 5.0) for c in crop_keys])[crop_index]
+        
+        region_values = np.asarray([r or "" for r in regions], dtype=object).astype(str)
+        region_keys, region_index = np.unique(region_values, return_inverse=True)
+        region_factor = np.array([self.region_factors.get(r, 1.0) for r in region_keys.tolist()])[region_index]
+        
+        factor = region_factor * (0.85 + np.random.random(n) * 0.3)
+        predicted = np.round(base * areas * factor, 2)
+        confidence = np.round(0.7 + np.random.random(n) * 0.25, 2)
+        
+        # Категории рекомендаций по тем же порогам, что и _get_yield_recommendations
+        category = np.digitize(predicted / areas, (5, 10))
+        recommendations = [self._get_yield_recommendations(None, v) for v in (0, 5, 10)]
+        crop_names = [self.plant_types.get(c, c) for c in crop_keys]
+        
+        return [
+            {
+                "crop": crop_names[ci],
+                "area_hectares": area,
+                "region": region or "Не указан",
+                "predicted_yield_tons": yield_tons,
+                "confidence": conf,
+                "recommendations": recommendations[cat],
+                "model_version": self.version
+            }
+            for ci, area, region, yield_tons, conf, cat in zip(
+                crop_index.tolist(), areas.tolist(), regions, predicted.tolist(),
+                confidence.tolist(), category.tolist()
+            )
+        ]
+    
+    def generate_heatmap(self, resolution: int = config.HEATMAP_RESOLUTION) -> np.ndarray:
+        """Генерация демо heatmap (resolution x resolution, uint8)"""
+        # Несколько гауссовых пятен поражения, как в выходе Grad-CAM
+        spots = np.random.randint(1, 4)
+        centers = np.random.uniform(0.15, 0.85, size=(spots, 2))
+        sigmas = np.random.uniform(0.05, 0.2, size=spots)
+        
+        coords = np.linspace(0.0, 1.0, resolution, dtype=np.float32)
+        dy = coords[:, None, None] - centers[:, 0]
+        dx = coords[None, :, None] - centers[:, 1]
+        intensity = np.exp(-(dx ** 2 + dy ** 2) / (2 * sigmas ** 2)).max(axis=-1)
+        
+        # Фон 30%, пики до 100% - как в прежнем демо
+        return ((0.3 + 0.7 * intensity) * 255).astype(np.uint8)
     
     def _get_prevention(self, disease: str) -> List[str]:
         """Получение мер профилактики"""
-        preventions = {
-            'Фитофтороз': [
-                'Использование устойчивых сортов',
-                'Соблюдение севооборота',
-                'Оптимальная густота посадки',
-                'Своевременное удаление пораженных растений'
-            ],
-            'Мучнистая роса': [
-                'Контроль влажности',
-                'Хорошая циркуляция воздуха',
-                'Регулярная обрезка',
-                'Профилактические обработки серой'
-            ],
-            'Серая гниль': [
-                'Избегание переувлажнения',
-                'Своевременный сбор урожая',
-                'Дезинфекция инструментов',
-                'Умеренное азотное питание'
+        return list(PREVENTIONS.get(disease, DEFAULT_PREVENTION))
+    
+    def reference(self) -> Dict:
+        """Справочник модели: культуры и их болезни с лечением и профилактикой"""
+        return {
+            "model_version": self.version,
+            "plants": [
+                {
+                    "id": plant,
+                    "name": self.plant_types.get(plant, plant),
+                    "diseases": [
+                        {
+                            "name": disease,
+                            "treatment": self.treatments.get(disease, DEFAULT_TREATMENT),
+                            "prevention": self._get_prevention(disease)
+                        }
+                        for disease in diseases
+                    ]
+                }
+                for plant, diseases in self.diseases.items()
             ]
         }
-        
-        return preventions.get(disease, [
-            'Соблюдение агротехники',
-            'Регулярный осмотр растений',
-            'Профилактические обработки',
-            'Баланс питательных веществ'
-        ])
     
     def _get_yield_recommendations(self, crop: str, yield_per_ha: float) -> List[str]:
         """Рекомендации по увеличению урожайности"""
@@ -0,0 +1,218 @@
+"""Реестр версий модели с горячей заменой"""
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from app import config
+
+if TYPE_CHECKING:
+    from app.ml.plant_disease import PlantDiseaseModel
+
+
+class ModelVersionNotFound(Exception):
+    """В каталоге моделей нет такой версии"""
+
+
+def _model_class():
+    # Модуль модели (NumPy, PIL, а в будущем TensorFlow/ONNX) импортируется при первой загрузке
+    from app.ml.plant_disease import PlantDiseaseModel
+
+    return PlantDiseaseModel
+
+
+class ModelRegistry:
+    """Версии модели из каталога ``<directory>/<версия>/model.json``.
+
+    Новая версия загружается и прогревается в отдельном потоке, затем ссылка
+    на активную модель заменяется одним присваиванием. Запрос берёт модель
+    через ``active`` один раз и использует её до конца, поэтому запросы,
+    начатые до замены, завершаются на старой версии.
+
+    Стартовая версия загружается отложенно: в фоне после старта сервера
+    (``preload``) или при первом обращении (``ensure_loaded``). До конца
+    прогрева ``ready`` ложно, и readiness-проба отвечает 503.
+
+    Активная версия общая для воркеров: activate() записывает её в
+    ``state_path``, а ``watch`` в каждом воркере раз в ``sync_interval`` секунд
+    читает файл и переключается на записанную там версию.
+    """
+
+    def __init__(
+        self,
+        directory: str = config.MODEL_DIR,
+        version: str = config.MODEL_VERSION,
+        state_path: str = config.MODEL_ACTIVE_FILE,
+        sync_interval: float = config.MODEL_SYNC_INTERVAL,
+    ):
+        self.directory = directory
+        self.initial_version = version
+        self.state_path = state_path
+        self.sync_interval = sync_interval
+        # Версия из файла, которую не удалось загрузить: повторяем, только когда файл изменится
+        self._failed_version: Optional[str] = None
+        self._active: Optional["PlantDiseaseModel"] = None
+        self._load_lock = threading.Lock()
+        self._lock: Optional[asyncio.Lock] = None
+        self.activated_at: Optional[str] = None
+        self.previous_version: Optional[str] = None
+        self.swaps = 0
+        self.last_load_seconds = 0.0
+        self.load_error: Optional[str] = None
+
+    @property
+    def ready(self) -> bool:
+        """Модель загружена и прогрета"""
+        return self._active is not None
+
+    @property
+    def version(self) -> Optional[str]:
+        return self._active.version if self._active is not None else None
+
+    @property
+    def active(self) -> "PlantDiseaseModel":
+        """Активная модель; при первом обращении загружается в текущем потоке"""
+        model = self._active
+        if model is None:
+            model = self.ensure_loaded()
+        return model
+
+    async def get_active(self) -> "PlantDiseaseModel":
+        """Активная модель без блокировки event loop, если она ещё не загружена"""
+        model = self._active
+        if model is None:
+            model = await asyncio.to_thread(self.ensure_loaded)
+        return model
+
+    def ensure_loaded(self) -> "PlantDiseaseModel":
+        """Потокобезопасная однократная загрузка и прогрев стартовой версии"""
+        if self._active is None:
+            with self._load_lock:
+                if self._active is None:
+                    started = time.perf_counter()
+                    version = self.shared_version() or self.initial_version or _model_class().BUILTIN_VERSION
+                    try:
+                        model = self._load_and_warmup(version)
+                    except Exception as e:
+                        self.load_error = str(e)
+                        raise
+                    self.last_load_seconds = round(time.perf_counter() - started, 3)
+                    self.activated_at = datetime.now().isoformat()
+                    self.load_error = None
+                    # activate() мог уже установить другую версию, пока шла загрузка
+                    if self._active is None:
+                        self._active = model
+        return self._active
+
+    async def preload(self):
+        """Фоновая загрузка при старте; ошибка остаётся в load_error и повторяется при запросе"""
+        try:
+            await asyncio.to_thread(self.ensure_loaded)
+        except Exception:
+            pass
+
+    def available(self) -> List[str]:
+        """Встроенная версия и каталоги с манифестом"""
+        PlantDiseaseModel = _model_class()
+        versions = [PlantDiseaseModel.BUILTIN_VERSION]
+        if os.path.isdir(self.directory):
+            versions += sorted(
+                name for name in os.listdir(self.directory)
+                if os.path.isfile(os.path.join(self.directory, name, PlantDiseaseModel.MANIFEST))
+            )
+        return versions
+
+    def _load(self, version: str) -> "PlantDiseaseModel":
+        PlantDiseaseModel = _model_class()
+        if version == PlantDiseaseModel.BUILTIN_VERSION:
+            return PlantDiseaseModel()
+        path = os.path.join(self.directory, version)
+        # Версия - имя каталога, выход за пределы каталога моделей не допускается
+        if version.startswith(".") or os.path.basename(version) != version or \
+                not os.path.isfile(os.path.join(path, PlantDiseaseModel.MANIFEST)):
+            raise ModelVersionNotFound(version)
+        return PlantDiseaseModel.load(path)
+
+    def _load_and_warmup(self, version: str) -> "PlantDiseaseModel":
+        model = self._load(version)
+        model.warmup()
+        return model
+
+    async def activate(self, version: str, publish: bool = True) -> Dict:
+        """Загрузка, прогрев и атомарная замена активной модели; publish - записать версию для остальных воркеров"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            started = time.perf_counter()
+            model = await asyncio.to_thread(self._load_and_warmup, version)
+            self.last_load_seconds = round(time.perf_counter() - started, 3)
+            if publish:
+                await asyncio.to_thread(self._publish, version)
+
+            self.previous_version = self.version
+            self._active = model
+            self.activated_at = datetime.now().isoformat()
+            self.swaps += 1
+        return self.info()
+
+    # ---- общая активная версия ----
+
+    def shared_version(self) -> Optional[str]:
+        """Версия, записанная последней активацией в любом воркере"""
+        if not self.state_path:
+            return None
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f).get("version")
+        except (OSError, ValueError):
+            return None
+
+    def _publish(self, version: str):
+        if not self.state_path:
+            return
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Запись во временный файл и os.replace: читатель видит старую или новую версию целиком
+        temporary = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "activated_at": datetime.now().isoformat()}, f)
+        os.replace(temporary, self.state_path)
+
+    async def sync(self):
+        """Переключение на общую версию, если её активировал другой воркер"""
+        version = await asyncio.to_thread(self.shared_version)
+        if version is None or not self.ready or version == self.version:
+            self._failed_version = None
+            return
+        if version == self._failed_version:
+            return
+        try:
+            await self.activate(version, publish=False)
+            self.load_error = None
+        except Exception as e:
+            self._failed_version = version
+            self.load_error = f"{version}: {e}"
+
+    async def watch(self):
+        """Фоновая проверка общей версии (в startup-событии каждого воркера)"""
+        while self.state_path and self.sync_interval > 0:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def info(self) -> Dict:
+        return {
+            "active_version": self.version,
+            "ready": self.ready,
+            "load_error": self.load_error,
+            "previous_version": self.previous_version,
+            "activated_at": self.activated_at,
+            "last_load_seconds": self.last_load_seconds,
+            "swaps": self.swaps,
+        }
+
+    def stats(self) -> Dict:
+        return {"ready": int(self.ready), "swaps": self.swaps, "last_load_seconds": self.last_load_seconds}
@@ -0,0 +1,454 @@
+"""Очередь задач обучения: SQLite + отдельные процессы-воркеры"""
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app import config
+from app.ids import new_id
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+FINAL_STATUSES = ("completed", "failed", "cancelled")
+
+# Как часто воркер проверяет флаг отмены внутри эпохи, секунды
+CANCEL_CHECK_INTERVAL = 0.1
+
+
+class TrainingQueueFull(Exception):
+    """Очередь обучения заполнена"""
+
+
+class TrainingJobNotFound(Exception):
+    """Задача обучения не найдена"""
+
+
+def new_training_id() -> str:
+    return new_id("TRAIN")
+
+
+class TrainingJobStore:
+    """Задачи обучения в SQLite (WAL): пишут и сервер, и процессы обучения"""
+
+    COLUMNS = (
+        "id", "status", "params", "epoch", "epochs", "progress", "metrics", "result", "error",
+        "cancel_requested_at", "pid", "created_at", "started_at", "finished_at",
+    )
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS training_jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, params TEXT NOT NULL, "
+            "epoch INTEGER NOT NULL DEFAULT 0, epochs INTEGER NOT NULL, progress REAL NOT NULL DEFAULT 0, "
+            "metrics TEXT, result TEXT, error TEXT, cancel_requested_at REAL, pid INTEGER, "
+            "created_at TEXT NOT NULL, started_at TEXT, finished_at TEXT, "
+            "claimed_by TEXT, heartbeat_at REAL)"
+        )
+        # Базы прежней схемы: владелец и продление аренды выполняющейся задачи
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(training_jobs)")}
+        for name, kind in (("claimed_by", "TEXT"), ("heartbeat_at", "REAL")):
+            if name not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE training_jobs ADD COLUMN {name} {kind}")
+                except sqlite3.OperationalError:
+                    # Колонку одновременно добавил другой воркер
+                    pass
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS training_jobs_status ON training_jobs (status, created_at)"
+        )
+
+    def _row_to_job(self, row) -> Dict:
+        job = dict(zip(self.COLUMNS, row))
+        for key in ("params", "metrics", "result"):
+            job[key] = json.loads(job[key]) if job[key] else None
+        job["cancel_requested"] = job.pop("cancel_requested_at") is not None
+        job["progress"] = round(job["progress"], 4)
+        return job
+
+    def create(self, params: Dict, max_queued: int) -> Dict:
+        """Новая задача в статусе queued; TrainingQueueFull, если очередь заполнена"""
+        job_id = new_training_id()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                queued = self._conn.execute(
+                    "SELECT COUNT(*) FROM training_jobs WHERE status = 'queued'"
+                ).fetchone()[0]
+                if queued >= max_queued:
+                    raise TrainingQueueFull()
+                self._conn.execute(
+                    "INSERT INTO training_jobs (id, status, params, epochs, created_at) "
+                    "VALUES (?, 'queued', ?, ?, ?)",
+                    (job_id, json.dumps(params), params["epochs"], datetime.now().isoformat())
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM training_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        query = f"SELECT {', '.join(self.COLUMNS)} FROM training_jobs"
+        args: tuple = ()
+        if status:
+            query += " WHERE status = ?"
+            args = (status,)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        with self._lock:
+            rows = self._conn.execute(query, args + (limit,)).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM training_jobs GROUP BY status"
+            ).fetchall()
+        counts = dict.fromkeys(JOB_STATUSES, 0)
+        counts.update(rows)
+        return counts
+
+    def claim_next(self, max_running: int, owner: str) -> Optional[Dict]:
+        """Перевод самой старой задачи из queued в running с арендой owner, если не превышен лимит"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                running = self._conn.execute(
+                    "SELECT COUNT(*) FROM training_jobs WHERE status = 'running'"
+                ).fetchone()[0]
+                row = None
+                if running < max_running:
+                    row = self._conn.execute(
+                        "SELECT id FROM training_jobs WHERE status = 'queued' "
+                        "ORDER BY created_at LIMIT 1"
+                    ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE training_jobs SET status = 'running', started_at = ?, "
+                        "claimed_by = ?, heartbeat_at = ? WHERE id = ?",
+                        (datetime.now().isoformat(), owner, time.time(), row[0])
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self.get(row[0]) if row else None
+
+    def heartbeat(self, owner: str):
+        """Продление аренды всех выполняющихся задач владельца"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE training_jobs SET heartbeat_at = ? WHERE claimed_by = ? AND status = 'running'",
+                (time.time(), owner)
+            )
+
+    def requeue_expired(self, lease_seconds: float) -> int:
+        """Возврат в очередь задач, чья аренда не продлевалась lease_seconds секунд"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE training_jobs SET status = 'queued', pid = NULL, started_at = NULL, "
+                "claimed_by = NULL, heartbeat_at = NULL, epoch = 0, progress = 0, metrics = NULL "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (time.time() - lease_seconds,)
+            )
+        return cursor.rowcount
+
+    def set_pid(self, job_id: str, pid: Optional[int]):
+        with self._lock:
+            self._conn.execute("UPDATE training_jobs SET pid = ? WHERE id = ?", (pid, job_id))
+
+    def update_progress(self, job_id: str, epoch: int, epochs: int, metrics: Dict):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE training_jobs SET epoch = ?, progress = ?, metrics = ? "
+                "WHERE id = ? AND status = 'running'",
+                (epoch, epoch / epochs, json.dumps(metrics), job_id)
+            )
+
+    def request_cancel(self, job_id: str) -> Optional[str]:
+        """Отмена: queued сразу становится cancelled, running получает флаг. Возвращает статус"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE training_jobs SET status = 'cancelled', finished_at = ?, cancel_requested_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (datetime.now().isoformat(), time.time(), job_id)
+            )
+            self._conn.execute(
+                "UPDATE training_jobs SET cancel_requested_at = ? "
+                "WHERE id = ? AND status = 'running' AND cancel_requested_at IS NULL",
+                (time.time(), job_id)
+            )
+            row = self._conn.execute(
+                "SELECT status FROM training_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def cancel_requested_at(self, job_id: str) -> Optional[float]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT cancel_requested_at FROM training_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        """Финальный статус; уже завершённая задача не перезаписывается"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE training_jobs SET status = ?, result = ?, error = ?, finished_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (status, json.dumps(result) if result is not None else None, error,
+                 datetime.now().isoformat(), job_id)
+            )
+
+    def requeue(self, job_id: str):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE training_jobs SET status = 'queued', pid = NULL, started_at = NULL, "
+                "claimed_by = NULL, heartbeat_at = NULL, epoch = 0, progress = 0, metrics = NULL "
+                "WHERE id = ? AND status = 'running'",
+                (job_id,)
+            )
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def run_training_job(db_path: str, job_id: str, params: Dict, nice: int = 0):
+    """Тело процесса обучения: эпохи с прогрессом в базе и проверкой флага отмены"""
+    if nice:
+        try:
+            os.nice(nice)
+        except (AttributeError, OSError):  # Windows или нет прав
+            pass
+
+    import numpy as np
+
+    store = TrainingJobStore(db_path)
+    try:
+        epochs = params["epochs"]
+        rng = np.random.default_rng()
+        weights = rng.standard_normal((128, 128)).astype(np.float32) * 0.1
+        loss = 1.0
+        for epoch in range(1, epochs + 1):
+            # Имитация эпохи: реальные вычисления на CPU в течение epoch_seconds
+            deadline = time.monotonic() + params["epoch_seconds"]
+            next_check = 0.0
+            while time.monotonic() < deadline:
+                if time.monotonic() >= next_check:
+                    if store.cancel_requested_at(job_id) is not None:
+                        store.finish(job_id, "cancelled")
+                        return
+                    next_check = time.monotonic() + CANCEL_CHECK_INTERVAL
+                weights = np.tanh(weights @ weights.T)
+            loss *= float(rng.uniform(0.75, 0.9))
+            store.update_progress(job_id, epoch, epochs, {
+                "loss": round(loss, 4),
+                "accuracy": round(1 - loss * 0.5, 4),
+            })
+        store.finish(job_id, "completed", result={
+            "final_loss": round(loss, 4),
+            "final_accuracy": round(1 - loss * 0.5, 4),
+            "dataset": params.get("dataset"),
+        })
+    except Exception as e:
+        store.finish(job_id, "failed", error=str(e))
+    finally:
+        store.close()
+
+
+class TrainingScheduler:
+    """Планировщик обучения: очередь в SQLite, каждая задача - отдельный процесс.
+
+    Процессы запускаются через "spawn" с пониженным приоритетом, поэтому обучение
+    не делит event loop и GIL с сервером. Одновременно выполняется не больше
+    ``max_concurrent`` задач (лимит проверяется по базе, то есть общий для всех
+    воркеров uvicorn). Отмена кооперативная; если процесс не остановился за
+    ``cancel_grace`` секунд, он завершается принудительно.
+
+    Захваченная задача арендована воркером (``owner``) в той же транзакции;
+    пока он жив, диспетчер продлевает аренду. Задачи с истёкшей за
+    ``lease_seconds`` арендой - упавшего воркера - возвращаются в очередь.
+    """
+
+    def __init__(
+        self,
+        db_path: str = config.TRAINING_DB_PATH,
+        max_concurrent: int = config.TRAINING_MAX_CONCURRENT,
+        max_queued: int = config.TRAINING_MAX_QUEUED,
+        nice: int = config.TRAINING_NICE,
+        poll_interval: float = config.TRAINING_POLL_INTERVAL,
+        cancel_grace: float = config.TRAINING_CANCEL_GRACE,
+        lease_seconds: float = config.TRAINING_LEASE_SECONDS,
+    ):
+        self.db_path = db_path
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max(0, max_queued)
+        self.nice = nice
+        self.poll_interval = poll_interval
+        self.cancel_grace = cancel_grace
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{secrets.token_hex(4)}"
+        self._next_recovery = 0.0
+        # Проход диспетчера и остановка не пересекаются: shutdown ждёт текущий _tick
+        self._dispatch_lock = threading.Lock()
+        self._stopping = False
+        self._store: Optional[TrainingJobStore] = None
+        self._processes: Dict[str, multiprocessing.Process] = {}
+        self._context = multiprocessing.get_context("spawn")
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        # Число задач по статусам на момент последнего прохода диспетчера (для stats)
+        self._counts: Dict[str, int] = dict.fromkeys(JOB_STATUSES, 0)
+
+    @property
+    def store(self) -> TrainingJobStore:
+        """База открывается при первом обращении"""
+        if self._store is None:
+            self._store = TrainingJobStore(self.db_path)
+        return self._store
+
+    def start(self):
+        """Восстановление прерванных задач и запуск диспетчера (в startup-событии)"""
+        if self._task is not None:
+            return
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self._tick)
+            except Exception:
+                pass
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def _tick(self):
+        with self._dispatch_lock:
+            if not self._stopping:
+                self._dispatch()
+
+    def _dispatch(self):
+        self._reap()
+        self._enforce_cancel()
+        if self._processes:
+            self.store.heartbeat(self.owner)
+        now = time.monotonic()
+        if now >= self._next_recovery:
+            # Задачи упавших воркеров (аренда не продлевалась) возвращаются в очередь
+            self.store.requeue_expired(self.lease_seconds)
+            self._next_recovery = now + self.lease_seconds / 3
+        while len(self._processes) < self.max_concurrent:
+            job = self.store.claim_next(self.max_concurrent, self.owner)
+            if job is None:
+                break
+            process = self._context.Process(
+                target=run_training_job,
+                args=(self.db_path, job["id"], job["params"], self.nice),
+                name=f"training-{job['id']}",
+                daemon=True,
+            )
+            process.start()
+            self._processes[job["id"]] = process
+            self.store.set_pid(job["id"], process.pid)
+        self._counts = self.store.counts()
+
+    def _reap(self):
+        for job_id, process in list(self._processes.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self._processes[job_id]
+            # Процесс сам пишет финальный статус; сюда попадают только аварийные выходы
+            if self.store.cancel_requested_at(job_id) is not None:
+                self.store.finish(job_id, "cancelled")
+            else:
+                self.store.finish(job_id, "failed", error=f"Процесс обучения завершился с кодом {process.exitcode}")
+
+    def _enforce_cancel(self):
+        now = time.time()
+        for job_id, process in list(self._processes.items()):
+            requested = self.store.cancel_requested_at(job_id)
+            if requested is not None and now - requested > self.cancel_grace:
+                process.terminate()
+
+    async def submit(self, params: Dict) -> Dict:
+        job = await asyncio.to_thread(self.store.create, params, self.max_queued)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job
+
+    async def get(self, job_id: str) -> Dict:
+        job = await asyncio.to_thread(self.store.get, job_id)
+        if job is None:
+            raise TrainingJobNotFound(job_id)
+        return job
+
+    async def list(self, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        return await asyncio.to_thread(self.store.list, status, limit)
+
+    async def cancel(self, job_id: str) -> Dict:
+        status = await asyncio.to_thread(self.store.request_cancel, job_id)
+        if status is None:
+            raise TrainingJobNotFound(job_id)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return await self.get(job_id)
+
+    def stats(self) -> Dict:
+        """Без обращения к базе: вызывается из event loop (/metrics, список задач).
+
+        Счётчики обновляет диспетчер в своём потоке, они отстают не больше чем на poll_interval.
+        """
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "local_processes": len(self._processes),
+            **self._counts,
+        }
+
+    def shutdown(self):
+        """Остановка диспетчера; выполняющиеся задачи прерываются и возвращаются в очередь"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        # Отмена задачи не прерывает _tick, уже идущий в потоке: дожидаемся его,
+        # иначе он запустит процесс, пока словарь процессов обходится ниже
+        with self._dispatch_lock:
+            self._stopping = True
+        for job_id, process in list(self._processes.items()):
+            process.terminate()
+            process.join(timeout=self.cancel_grace)
+            if self.store.cancel_requested_at(job_id) is not None:
+                self.store.finish(job_id, "cancelled")
+            else:
+                self.store.requeue(job_id)
+        self._processes.clear()
+        if self._store is not None:
+            self._store.close()
+            self._store = None
@@ -0,0 +1,89 @@
+"""Веса модели в .npy-файлах, отображаемых в память (общие страницы для всех воркеров).
+
+Каталог артефакта: ``<версия>/weights/<имя>.npy``. ``np.load(mmap_mode="r")``
+не копирует данные в память процесса: все воркеры uvicorn отображают один и тот
+же файл и делят физические страницы через page cache.
+
+Демо-артефакт со случайными весами:
+
+    python -m app.ml.weights models/2.1.0 [--pool 32] [--hidden 1024]
+"""
+import argparse
+import json
+import os
+from typing import Dict
+
+import numpy as np
+
+WEIGHTS_DIR = "weights"
+
+
+def load_weights(directory: str, mmap: bool = True) -> Dict[str, np.ndarray]:
+    """Все .npy из <directory>/weights; пустой словарь, если весов нет"""
+    path = os.path.join(directory, WEIGHTS_DIR)
+    if not os.path.isdir(path):
+        return {}
+    return {
+        name[:-len(".npy")]: np.load(os.path.join(path, name), mmap_mode="r" if mmap else None)
+        for name in sorted(os.listdir(path))
+        if name.endswith(".npy")
+    }
+
+
+def save_weights(directory: str, tensors: Dict[str, np.ndarray]):
+    """Запись тензоров; файл заменяется атомарно, поэтому уже отображённые копии не портятся"""
+    path = os.path.join(directory, WEIGHTS_DIR)
+    os.makedirs(path, exist_ok=True)
+    for name, tensor in tensors.items():
+        target = os.path.join(path, f"{name}.npy")
+        tmp = f"{target}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.save(f, np.ascontiguousarray(tensor), allow_pickle=False)
+        os.replace(tmp, target)
+
+
+def weights_info(weights: Dict[str, np.ndarray]) -> Dict:
+    tensors = {
+        name: {
+            "shape": list(tensor.shape),
+            "dtype": str(tensor.dtype),
+            "bytes": int(tensor.nbytes),
+            "mmap": isinstance(tensor, np.memmap),
+        }
+        for name, tensor in weights.items()
+    }
+    return {"tensors": tensors, "total_bytes": sum(t["bytes"] for t in tensors.values())}
+
+
+def make_demo_weights(num_classes: int, pool: int = 32, hidden: int = 1024, seed: int = 0) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    features = pool * pool * 3
+    return {
+        "dense_1": (rng.standard_normal((features, hidden)) / np.sqrt(features)).astype(np.float32),
+        "dense_1_bias": np.zeros(hidden, dtype=np.float32),
+        "dense_2": (rng.standard_normal((hidden, num_classes)) / np.sqrt(hidden)).astype(np.float32),
+        "dense_2_bias": np.zeros(num_classes, dtype=np.float32),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory", help="каталог версии, например models/2.1.0")
+    parser.add_argument("--pool", type=int, default=32, help="сторона входа после пулинга (делитель 224)")
+    parser.add_argument("--hidden", type=int, default=1024)
+    parser.add_argument("--classes", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if 224 % args.pool:
+        raise SystemExit("--pool должен делить 224")
+    save_weights(args.directory, make_demo_weights(args.classes, args.pool, args.hidden, args.seed))
+    manifest_path = os.path.join(args.directory, "model.json")
+    if not os.path.exists(manifest_path):
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({"version": os.path.basename(os.path.normpath(args.directory))}, f, ensure_ascii=False)
+    print(json.dumps(weights_info(load_weights(args.directory)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
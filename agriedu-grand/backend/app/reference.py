@@ -0,0 +1,134 @@
+"""Справочные данные из JSON-файла: регионы, почвы и советы по ним.
+
+Файл читается один раз; регионы и почвы ищутся по id (``chuy``), полному
+названию (``Чуйская область``), короткому названию (``Чуйская``) и
+псевдонимам без учёта регистра, ``ё`` и разделителей. Тела ответов
+/api/regions и /api/reference/bundle сериализуются один раз вместе с ETag;
+пакет включает справочник активной модели и кэшируется по её версии.
+"""
+import json
+import re
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app import config
+from app.api.http_cache import make_etag
+from app.api.responses import dumps
+
+REGION_SUFFIX = " область"
+# Сколько версий модели держать готовый пакет справочников
+BUNDLE_VERSIONS = 4
+
+_SEPARATORS = re.compile(r"[\s_\-]+")
+
+
+def normalize_key(text: str) -> str:
+    return _SEPARATORS.sub(" ", text.lower().replace("ё", "е")).strip()
+
+
+class ReferenceCatalogue:
+    """Неизменяемый справочник регионов и почв; загрузка при первом обращении"""
+
+    def __init__(self, path: str = config.REFERENCE_PATH):
+        self.path = path
+        self._data: Optional[Dict] = None
+        self._bundles: "OrderedDict[str, Tuple[bytes, str]]" = OrderedDict()
+        self.version = None
+
+    def _ensure_loaded(self):
+        if self._data is None:
+            self.load()
+
+    def load(self):
+        """Чтение файла, индексы и готовые тела ответов (заменяет справочник целиком)"""
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        data = json.loads(raw)
+
+        regions: Dict[str, Dict] = {}
+        for region in data["regions"]:
+            names = [region["id"], region["name"], *region.get("aliases", [])]
+            if region["name"].endswith(REGION_SUFFIX):
+                names.append(region["name"][:-len(REGION_SUFFIX)])
+            for name in names:
+                key = normalize_key(name)
+                if regions.get(key, region) is not region:
+                    raise ValueError(f"Неоднозначное название региона: {name}")
+                regions[key] = region
+        soils = {}
+        for soil in data["soils"]:
+            for name in (soil["id"], soil["name"], *soil.get("aliases", [])):
+                soils[normalize_key(name)] = soil
+
+        self._data = data
+        self._regions = regions
+        self._soils = soils
+        self.version = make_etag(raw)
+        regions_body = dumps({"regions": [
+            {key: region[key] for key in ("id", "name", "climate")} for region in data["regions"]
+        ]})
+        self._regions_page = (regions_body, make_etag(regions_body))
+        self._bundles = OrderedDict()
+
+    def region(self, name: Optional[str]) -> Optional[Dict]:
+        """Регион по id, названию или псевдониму"""
+        if not name:
+            return None
+        self._ensure_loaded()
+        return self._regions.get(normalize_key(name))
+
+    def region_name(self, name: Optional[str]) -> Optional[str]:
+        """Каноническое название региона (ключ модели и истории анализов); неизвестное - как есть"""
+        region = self.region(name)
+        return region["name"] if region is not None else name
+
+    def regional_advice(self, name: Optional[str]) -> List[str]:
+        self._ensure_loaded()
+        region = self.region(name)
+        if region is not None and region.get("advice"):
+            return list(region["advice"])
+        return list(self._data["default_regional_advice"])
+
+    def soil_recommendations(self, soil_type: Optional[str]) -> List[str]:
+        self._ensure_loaded()
+        soil = self._soils.get(normalize_key(soil_type or ""))
+        if soil is not None:
+            return list(soil["recommendations"])
+        return list(self._data["default_soil_recommendations"])
+
+    def regions(self) -> Tuple[bytes, str]:
+        """Тело ответа /regions и его ETag"""
+        self._ensure_loaded()
+        return self._regions_page
+
+    def bundle(self, model) -> Tuple[bytes, str]:
+        """Все справочники одним телом: регионы, почвы и справочник модели model"""
+        self._ensure_loaded()
+        page = self._bundles.get(model.version)
+        if page is not None:
+            self._bundles.move_to_end(model.version)
+            return page
+        body = dumps({
+            "version": self.version.strip('"'),
+            **model.reference(),
+            "regions": self._data["regions"],
+            "default_regional_advice": self._data["default_regional_advice"],
+            "soils": self._data["soils"],
+            "default_soil_recommendations": self._data["default_soil_recommendations"],
+        })
+        page = (body, make_etag(body))
+        self._bundles[model.version] = page
+        while len(self._bundles) > BUNDLE_VERSIONS:
+            self._bundles.popitem(last=False)
+        return page
+
+    def warm(self):
+        self._ensure_loaded()
+
+    def stats(self) -> Dict:
+        loaded = self._data is not None
+        return {
+            "regions": len(self._data["regions"]) if loaded else 0,
+            "soils": len(self._data["soils"]) if loaded else 0,
+            "cached_bundles": len(self._bundles),
+        }
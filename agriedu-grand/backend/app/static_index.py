@@ -0,0 +1,69 @@
+"""Общая часть раздачи статики фронтенда: обход каталога и версии ассетов.
+
+Используется и backend (app.frontend), и отдельным сервером
+frontend/server_fixed.py, поэтому зависит только от стандартной библиотеки.
+"""
+import os
+import re
+from typing import Dict, Iterator, Optional, Tuple
+
+INDEX = "index.html"
+# Файлы, которые не отдаются клиентам
+EXCLUDED = (".py", ".pyc", ".bat", ".md")
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Файлы до этого размера держатся в памяти, крупнее - отдаются с диска
+MEMORY_LIMIT = 256 * 1024
+# Сжатие меньших файлов не окупается
+COMPRESS_MIN_SIZE = 512
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Ссылки на локальные ассеты в index.html: href="style.css", src="script.js"
+ASSET_LINK = re.compile(r'(?P<attr>href|src)="(?P<path>[^"?#:]+)"')
+
+
+def walk(root: str, excluded: Tuple[str, ...] = EXCLUDED) -> Iterator[Tuple[str, str]]:
+    """(URL-путь, путь на диске) для файлов каталога, кроме скрытых и служебных"""
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith((".", "__", "node_modules"))]
+        for name in filenames:
+            if name.startswith(".") or name.endswith(excluded):
+                continue
+            full = os.path.join(directory, name)
+            yield "/" + os.path.relpath(full, root).replace(os.sep, "/"), full
+
+
+def asset_url(link: str, base: str = "/") -> Optional[str]:
+    """URL-путь ссылки из HTML относительно каталога base; None, если ссылка выходит за корень"""
+    if link.startswith("//"):
+        # Протокол-относительная ссылка на другой хост
+        return None
+    parts = []
+    for part in (link if link.startswith("/") else base + "/" + link).split("/"):
+        if part in ("", "."):
+            continue
+        if part == "..":
+            if not parts:
+                return None
+            parts.pop()
+        else:
+            parts.append(part)
+    return "/" + "/".join(parts)
+
+
+def version_assets(html: bytes, files: Dict) -> bytes:
+    """Добавление ?v=<хэш> к локальным ассетам index.html: после изменения файла меняется и ссылка.
+
+    files - URL-путь -> объект с атрибутом digest.
+    """
+    bom = b"\xef\xbb\xbf" if html.startswith(b"\xef\xbb\xbf") else b""
+    text = html.decode("utf-8-sig")
+
+    def replace(match):
+        url = asset_url(match.group("path"))
+        asset = files.get(url) if url is not None else None
+        if asset is None:
+            return match.group(0)
+        return f'{match.group("attr")}="{match.group("path")}?v={asset.digest}"'
+
+    return bom + ASSET_LINK.sub(replace, text).encode("utf-8")
@@ -0,0 +1 @@
+"""Бенчмарки backend (запуск из папки backend: python -m benchmarks.<имя>)"""
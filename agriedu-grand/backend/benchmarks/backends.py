@@ -0,0 +1,95 @@
+"""Бэкенды инференса: демо-заглушка, эталон на NumPy и ONNX Runtime (FP32 NHWC/NCHW, INT8).
+
+    python -m benchmarks.backends [--hidden 1024] [--batch-sizes 1,8,16,32]
+                                  [--intra-op-threads 0] [--repeat 20] [--json out.json]
+
+Артефакт со случайными весами создаётся во временном каталоге; ONNX-графы
+экспортируются из тех же весов (app.ml.onnx_export), поэтому выходы ONNX
+сверяются с NumPy. Без пакетов onnx/onnxruntime ONNX-варианты пропускаются.
+"""
+import argparse
+import tempfile
+
+import numpy as np
+
+from app.ml.plant_disease import NumpyBackend, OnnxBackend, StubBackend
+from app.ml.weights import load_weights, make_demo_weights, save_weights
+from benchmarks.common import measure, write_json
+
+NUM_CLASSES = 5
+
+
+def build_backends(directory: str, hidden: int, intra_op_threads: int, optimization_level: str) -> dict:
+    save_weights(directory, make_demo_weights(NUM_CLASSES, hidden=hidden))
+    backends = {
+        "stub": StubBackend(NUM_CLASSES),
+        "numpy": NumpyBackend(load_weights(directory)),
+    }
+    try:
+        import onnx  # noqa: F401
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        print("onnx/onnxruntime не установлены - ONNX-варианты пропущены")
+        return backends
+
+    from app.ml.onnx_export import build_graph
+
+    weights = load_weights(directory)
+    for name, layout in (("onnx", "nhwc"), ("onnx_nchw", "nchw")):
+        path = f"{directory}/{name}.onnx"
+        onnx.save(build_graph(weights, layout), path)
+        backends[name] = OnnxBackend(path, intra_op_threads=intra_op_threads, optimization_level=optimization_level)
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(f"{directory}/onnx.onnx", f"{directory}/onnx_int8.onnx", weight_type=QuantType.QInt8)
+    backends["onnx_int8"] = OnnxBackend(
+        f"{directory}/onnx_int8.onnx", intra_op_threads=intra_op_threads, optimization_level=optimization_level
+    )
+    return backends
+
+
+def run(args) -> dict:
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    rng = np.random.default_rng(0)
+    batches = {size: rng.random((size, 224, 224, 3), dtype=np.float32) for size in batch_sizes}
+    results = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        backends = build_backends(directory, args.hidden, args.intra_op_threads, args.optimization_level)
+        reference = {size: backends["numpy"].predict(batch) for size, batch in batches.items()}
+
+        for name, backend in backends.items():
+            results[name] = {}
+            for size, batch in batches.items():
+                row = measure(lambda: backend.predict(batch), repeat=args.repeat)
+                row["images_per_s"] = round(row["ops_per_s"] * size, 1)
+                if name != "stub":
+                    output = backend.predict(batch)
+                    row["max_abs_diff_vs_numpy"] = float(np.abs(output - reference[size]).max())
+                    row["top1_agreement"] = float((output.argmax(1) == reference[size].argmax(1)).mean())
+                results[name][f"batch_{size}"] = row
+                print(f"{name:10} batch {size:3}  p50 {row['p50_ms']:9.3f} ms  p95 {row['p95_ms']:9.3f} ms  "
+                      f"{row['images_per_s']:10.1f} img/s"
+                      + (f"  diff {row['max_abs_diff_vs_numpy']:.2e}  top1 {row['top1_agreement']:.2f}"
+                         if "top1_agreement" in row else ""))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--hidden", type=int, default=1024, help="ширина скрытого слоя демо-классификатора")
+    parser.add_argument("--batch-sizes", default="1,8,16,32")
+    parser.add_argument("--intra-op-threads", type=int, default=0)
+    parser.add_argument("--optimization-level", default="all", choices=OnnxBackend.OPTIMIZATION_LEVELS)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = run(args)
+    if args.json:
+        write_json(args.json, "backends", results, config=vars(args))
+
+
+if __name__ == "__main__":
+    main()
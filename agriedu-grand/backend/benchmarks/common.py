@@ -0,0 +1,84 @@
+"""Общие функции бенчмарков: статистика, окружение, сохранение результатов"""
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией по отсортированному списку"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarise(latencies: List[float]) -> Dict:
+    """p50/p95/p99/среднее/максимум в миллисекундах"""
+    values = sorted(latencies)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+
+def measure(fn: Callable[[], object], repeat: int = 20, min_time: float = 0.0, max_time: float = 5.0) -> Dict:
+    """Замер функции: прогрев, затем не меньше repeat запусков (и не меньше min_time секунд)"""
+    fn()
+    timings = []
+    started = time.perf_counter()
+    while True:
+        t0 = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        if len(timings) >= repeat and elapsed >= min_time:
+            break
+        if elapsed >= max_time and len(timings) >= 3:
+            break
+    summary = summarise(timings)
+    summary["ops_per_s"] = round(len(timings) / sum(timings), 1)
+    return summary
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def environment() -> Dict:
+    import numpy
+    import PIL
+
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "pillow": PIL.__version__,
+    }
+
+
+def write_json(path: str, benchmark: str, results: Dict, **extra):
+    payload = {"benchmark": benchmark, "environment": environment(), **extra, "results": results}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+    print(f"Результаты сохранены в {path}")
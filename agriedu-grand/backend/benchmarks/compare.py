@@ -0,0 +1,63 @@
+"""Сравнение двух JSON-результатов бенчмарков (micro, load, preprocess, ...).
+
+    python -m benchmarks.compare before.json after.json [--threshold 5]
+
+Печатает изменение каждой числовой метрики в процентах; изменения больше
+порога помечаются. Для *_ms меньше - лучше, для rps/ops_per_s - больше.
+"""
+import argparse
+import json
+from typing import Dict
+
+HIGHER_IS_BETTER = ("rps", "ops_per_s", "rows_per_s", "speedup")
+SKIP = ("count", "requests", "runs", "elapsed_s")
+
+
+def flatten(value, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    if isinstance(value, dict):
+        for key, item in value.items():
+            flat.update(flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            label = item.get("image", i) if isinstance(item, dict) else i
+            if isinstance(item, dict) and "variant" in item:
+                label = f"{label}/{item['variant']}"
+            flat.update(flatten(item, f"{prefix}[{label}]"))
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        flat[prefix] = float(value)
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=5.0, help="порог значимого изменения, %%")
+    args = parser.parse_args()
+
+    with open(args.before, encoding="utf-8") as f:
+        before = flatten(json.load(f).get("results", {}))
+    with open(args.after, encoding="utf-8") as f:
+        after = flatten(json.load(f).get("results", {}))
+
+    for key in sorted(set(before) & set(after)):
+        metric = key.rsplit(".", 1)[-1]
+        if metric in SKIP or "statuses" in key:
+            continue
+        old, new = before[key], after[key]
+        if old == 0:
+            continue
+        change = (new - old) / old * 100
+        better = change > 0 if metric.endswith(HIGHER_IS_BETTER) else change < 0
+        mark = ""
+        if abs(change) >= args.threshold:
+            mark = "  лучше" if better else "  ХУЖЕ"
+        print(f"{key:70} {old:12.3f} -> {new:12.3f}  {change:+7.1f}%{mark}")
+
+    for key in sorted(set(after) - set(before)):
+        print(f"{key:70} {'(новое)':>12} -> {after[key]:12.3f}")
+
+
+if __name__ == "__main__":
+    main()
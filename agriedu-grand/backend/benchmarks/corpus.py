@@ -0,0 +1,75 @@
+"""Синтетический корпус изображений размером с фото с телефона"""
+import io
+import os
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+# имя -> (ширина, высота, формат, режим, EXIF Orientation)
+CORPUS_SPECS = {
+    "phone_12mp.jpg": (4000, 3000, "JPEG", "RGB", 1),
+    "phone_12mp_rotated.jpg": (4000, 3000, "JPEG", "RGB", 6),
+    "phone_48mp.jpg": (8000, 6000, "JPEG", "RGB", 1),
+    "screenshot_rgba.png": (1170, 2532, "PNG", "RGBA", None),
+    "scan_grey.jpg": (2480, 3508, "JPEG", "L", None),
+    "small_web.jpg": (640, 480, "JPEG", "RGB", None),
+}
+
+DEFAULT_DIR = os.path.join(tempfile.gettempdir(), "agriedu_bench_corpus")
+
+
+def _synthetic_pixels(width: int, height: int, channels: int, seed: int) -> np.ndarray:
+    """Плавные градиенты с шумом - сжимаются в JPEG примерно как реальные фото"""
+    rng = np.random.default_rng(seed)
+    y = np.linspace(0, 1, height, dtype=np.float32)[:, None]
+    x = np.linspace(0, 1, width, dtype=np.float32)[None, :]
+    layers = []
+    for c in range(channels):
+        phase = rng.uniform(0, np.pi)
+        layer = 0.5 + 0.35 * np.sin(6 * x + phase) * np.cos(4 * y - phase)
+        layers.append(layer)
+    pixels = np.stack(layers, axis=-1) * 255
+    pixels += rng.normal(0, 12, size=(height, width, 1)).astype(np.float32)
+    return np.clip(pixels, 0, 255).astype(np.uint8)
+
+
+def encode_image(width: int, height: int, fmt: str = "JPEG", mode: str = "RGB",
+                 orientation: Optional[int] = None, seed: int = 0) -> bytes:
+    channels = {"RGB": 3, "RGBA": 4, "L": 1}[mode]
+    pixels = _synthetic_pixels(width, height, channels, seed)
+    image = Image.fromarray(pixels[..., 0] if channels == 1 else pixels, mode)
+
+    buffer = io.BytesIO()
+    kwargs = {"quality": 90} if fmt == "JPEG" else {}
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        kwargs["exif"] = exif.tobytes()
+    image.save(buffer, fmt, **kwargs)
+    return buffer.getvalue()
+
+
+def build_corpus(directory: str = DEFAULT_DIR, names: Optional[List[str]] = None) -> Dict[str, str]:
+    """Создаёт недостающие файлы корпуса и возвращает {имя: путь}"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for seed, (name, spec) in enumerate(CORPUS_SPECS.items()):
+        if names and name not in names:
+            continue
+        path = os.path.join(directory, name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                f.write(encode_image(*spec, seed=seed))
+        paths[name] = path
+    return paths
+
+
+def load_directory(directory: str) -> Dict[str, str]:
+    """Реальные фото из папки (jpg/jpeg/png)"""
+    return {
+        name: os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith((".jpg", ".jpeg", ".png"))
+    }
@@ -0,0 +1,153 @@
+"""Нагрузочный тест API: p50/p95/p99 и req/s по эндпоинтам.
+
+    python -m benchmarks.load [--url http://127.0.0.1:8000] [--concurrency 16]
+                              [--requests 500 | --duration 10] [--endpoints health,lessons]
+                              [--cache] [--json out.json]
+
+Без --url приложение запускается в этом же процессе (httpx через ASGI,
+с startup/shutdown событиями) - это меряет стоимость кода без сети.
+С --url нагрузка идёт на запущенный uvicorn.
+
+Кэш результатов анализа по умолчанию выключен (AGRIEDU_CACHE_MAX_ENTRIES=0),
+иначе повторяющиеся изображения меряют кэш, а не декодирование и инференс.
+"""
+import argparse
+import asyncio
+import os
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.common import summarise, write_json
+from benchmarks.corpus import encode_image
+
+ENDPOINTS = ("health", "lessons", "predict-yield", "analyze-plant")
+
+
+def build_requests(image_count: int, image_size) -> Dict[str, Callable[[int], dict]]:
+    """Фабрики аргументов httpx.request для каждого эндпоинта"""
+    images = [encode_image(*image_size, "JPEG", "RGB", seed=100 + i) for i in range(image_count)]
+    crops = ["wheat", "tomato", "potato", "corn"]
+
+    return {
+        "health": lambda i: {"method": "GET", "url": "/api/health"},
+        "lessons": lambda i: {"method": "GET", "url": "/api/lessons", "params": {"category": "agriculture"}},
+        "predict-yield": lambda i: {
+            "method": "GET", "url": "/api/predict-yield",
+            "params": {"crop": crops[i % len(crops)], "area": 1 + i % 50, "region": "Чуйская область"}
+        },
+        "analyze-plant": lambda i: {
+            "method": "POST", "url": "/api/analyze-plant",
+            "files": {"image": (f"leaf_{i}.jpg", images[i % len(images)], "image/jpeg")},
+            "data": {"plant_type": "tomato"}
+        },
+    }
+
+
+async def run_endpoint(client: httpx.AsyncClient, make_request: Callable[[int], dict], concurrency: int,
+                       total: Optional[int], duration: Optional[float]) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors = 0
+    counter = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_index() -> Optional[int]:
+        nonlocal counter
+        if total is not None and counter >= total:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        counter += 1
+        return counter - 1
+
+    async def worker():
+        nonlocal errors
+        while (index := next_index()) is not None:
+            started = time.perf_counter()
+            try:
+                response = await client.request(**make_request(index))
+                statuses[response.status_code] += 1
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError:
+                statuses["exception"] += 1
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    result = summarise(latencies)
+    result.update({
+        "requests": counter,
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(counter / elapsed, 1) if elapsed else 0,
+    })
+    return result
+
+
+async def run(args) -> Dict:
+    requests = build_requests(args.images, (args.image_width, args.image_height))
+    endpoints = [name.strip() for name in args.endpoints.split(",") if name.strip()]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+
+    app = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout)
+    else:
+        from app.main import app
+        await app.router.startup()
+        client = httpx.AsyncClient(app=app, base_url="http://bench", timeout=timeout)
+
+    results = {}
+    try:
+        async with client:
+            for name in endpoints:
+                if name not in requests:
+                    raise SystemExit(f"Неизвестный эндпоинт: {name} (доступны: {', '.join(ENDPOINTS)})")
+                result = await run_endpoint(client, requests[name], args.concurrency,
+                                            None if args.duration else args.requests, args.duration)
+                results[name] = result
+                print(f"{name:15} {result['rps']:9.1f} req/s  p50 {result.get('p50_ms', 0):9.2f} ms  "
+                      f"p95 {result.get('p95_ms', 0):9.2f} ms  p99 {result.get('p99_ms', 0):9.2f} ms  "
+                      f"errors {result['errors']}  {result['statuses']}")
+    finally:
+        if app is not None:
+            await app.router.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="адрес запущенного сервера; без него - ASGI в процессе")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="запросов на эндпоинт")
+    parser.add_argument("--duration", type=float, help="секунд на эндпоинт (вместо --requests)")
+    parser.add_argument("--images", type=int, default=8, help="разных изображений для analyze-plant")
+    parser.add_argument("--image-width", type=int, default=1600)
+    parser.add_argument("--image-height", type=int, default=1200)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--cache", action="store_true", help="не выключать кэш результатов (только в процессе)")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    if not args.url and not args.cache:
+        os.environ.setdefault("AGRIEDU_CACHE_MAX_ENTRIES", "0")
+
+    results = asyncio.run(run(args))
+    if args.json:
+        config = {k: v for k, v in vars(args).items() if k != "json"}
+        write_json(args.json, "load", results, config=config)
+
+
+if __name__ == "__main__":
+    main()
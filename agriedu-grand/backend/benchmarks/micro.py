@@ -0,0 +1,60 @@
+"""Микро-бенчмарки PlantDiseaseModel на фиксированном синтетическом корпусе.
+
+    python -m benchmarks.micro [--full] [--repeat N] [--json out.json]
+
+Корпус (benchmarks/corpus.py) детерминирован, поэтому результаты разных
+запусков можно сравнивать через benchmarks.compare. --full добавляет
+48-мегапиксельное фото.
+"""
+import argparse
+
+import numpy as np
+
+from app.ml.plant_disease import PlantDiseaseModel
+from benchmarks.common import measure, write_json
+from benchmarks.corpus import CORPUS_SPECS, build_corpus
+
+DEFAULT_IMAGES = ["small_web.jpg", "phone_12mp.jpg", "phone_12mp_rotated.jpg", "screenshot_rgba.png", "scan_grey.jpg"]
+
+
+def run(images, repeat: int) -> dict:
+    model = PlantDiseaseModel()
+    paths = build_corpus(names=images)
+    results = {}
+
+    def record(name: str, fn):
+        results[name] = measure(fn, repeat=repeat)
+        row = results[name]
+        print(f"{name:44} p50 {row['p50_ms']:9.3f} ms  p95 {row['p95_ms']:9.3f} ms  {row['ops_per_s']:10.1f} op/s")
+
+    for name, path in paths.items():
+        with open(path, "rb") as f:
+            data = f.read()
+        record(f"preprocess_image[{name}]", lambda: model.preprocess_image(data))
+        record(f"predict_disease[{name}]", lambda: model.predict_disease(data, "tomato"))
+
+    batch = np.random.default_rng(0).random((16, 224, 224, 3), dtype=np.float32)
+    record("predict_batch[16]", lambda: model.predict_batch(batch))
+    record("predict_yield", lambda: model.predict_yield("wheat", 12.5, "Чуйская область"))
+    crops, areas, regions = ["wheat", "corn"] * 500, [12.5] * 1000, ["Ошская область", None] * 500
+    record("predict_yield_batch[1000]", lambda: model.predict_yield_batch(crops, areas, regions))
+    for resolution in (22, 56, 224):
+        record(f"generate_heatmap[{resolution}]", lambda: model.generate_heatmap(resolution))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="все изображения корпуса, включая 48 Мп")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    images = list(CORPUS_SPECS) if args.full else DEFAULT_IMAGES
+    results = run(images, args.repeat)
+    if args.json:
+        write_json(args.json, "micro", results, config={"images": images, "repeat": args.repeat})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Декодирование + ресайз: старый путь (полное декодирование) против draft/reduce.
+
+    python -m benchmarks.preprocess [--images DIR] [--repeat N] [--json out.json]
+
+Время - медиана по N повторам в одном процессе. Пиковая память - прирост
+пикового RSS в отдельном дочернем процессе на каждую пару (вариант, файл).
+"""
+import argparse
+import io
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.ml.plant_disease import PlantDiseaseModel
+from benchmarks.corpus import build_corpus, load_directory
+
+
+def legacy_preprocess(image_bytes: bytes) -> np.ndarray:
+    """Реализация preprocess_image до оптимизации"""
+    image = Image.open(io.BytesIO(image_bytes))
+    image = image.resize((224, 224))
+    return np.array(image) / 255.0
+
+
+def current_preprocess(image_bytes: bytes) -> np.ndarray:
+    return _model.preprocess_image(image_bytes)
+
+
+_model = PlantDiseaseModel()
+VARIANTS = {"legacy": legacy_preprocess, "current": current_preprocess}
+
+
+def _peak_rss_kb() -> int:
+    # ru_maxrss в Linux наследуется от родителя через fork/exec, а VmHWM - нет
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS отдаёт байты, Linux - килобайты
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def _child(variant: str, path: str):
+    with open(path, "rb") as f:
+        data = f.read()
+    before = _peak_rss_kb()
+    array = VARIANTS[variant](data)
+    after = _peak_rss_kb()
+    print(json.dumps({"peak_kb": after - before, "shape": list(array.shape), "dtype": str(array.dtype)}))
+
+
+def measure_memory(variant: str, path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.preprocess", "--child", variant, path],
+        capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def measure_time(fn, data: bytes, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(data)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", help="папка с реальными фото вместо синтетического корпуса")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    parser.add_argument("--child", nargs=2, metavar=("VARIANT", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(*args.child)
+        return
+
+    paths = load_directory(args.images) if args.images else build_corpus()
+    results = []
+    print(f"{'image':28} {'variant':8} {'ms':>9} {'peak MB':>9}  output")
+    for name, path in paths.items():
+        with open(path, "rb") as f:
+            data = f.read()
+        for variant, fn in VARIANTS.items():
+            try:
+                ms = measure_time(fn, data, args.repeat)
+                memory = measure_memory(variant, path)
+            except Exception as e:
+                print(f"{name:28} {variant:8} failed: {e}")
+                results.append({"image": name, "variant": variant, "error": str(e)})
+                continue
+            row = {"image": name, "variant": variant, "bytes": len(data), "median_ms": round(ms, 2),
+                   "peak_mb": round(memory["peak_kb"] / 1024, 1), "shape": memory["shape"], "dtype": memory["dtype"]}
+            results.append(row)
+            print(f"{name:28} {variant:8} {row['median_ms']:9.2f} {row['peak_mb']:9.1f}  {row['shape']} {row['dtype']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"benchmark": "preprocess", "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Сериализация и сжатие ответов API.
+
+    python -m benchmarks.serialization [--rows N] [--json out.json]
+
+Для каждого эндпоинта (ASGI в процессе) тело ответа разбирается обратно в
+объект и замеряется: json.dumps стандартной библиотеки против dumps из
+app.api.responses (orjson, если установлен), размер тела без сжатия, в gzip и
+в brotli (если установлен пакет brotli), а также время сжатия.
+"""
+import argparse
+import asyncio
+import gzip
+import io
+import json
+
+import httpx
+import numpy as np
+from PIL import Image
+
+from app import config
+from app.api.responses import dumps, json_backend
+from benchmarks.common import measure, write_json
+from benchmarks.yield_batch import make_rows
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def make_image(size=(640, 480), seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    pixels = rng.integers(0, 255, size=(size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def build_requests(rows: int):
+    image = make_image()
+    batch = b"".join(json.dumps(row, ensure_ascii=False).encode() + b"\n" for row in make_rows(rows))
+    return {
+        "health": ("GET", "/api/health", {}),
+        "lessons": ("GET", "/api/lessons", {"params": {"category": "all", "limit": 100}}),
+        "dashboard-stats": ("GET", "/api/dashboard/stats", {}),
+        "predict-yield": ("GET", "/api/predict-yield", {"params": {"crop": "wheat", "area": 10}}),
+        "analyze-plant": ("POST", "/api/analyze-plant", {
+            "data": {"heatmap": "json"},
+            "files": {"image": ("leaf.jpg", image, "image/jpeg")},
+        }),
+        "yield-batch": ("POST", "/api/predict-yield/batch", {
+            "content": batch, "headers": {"Content-Type": "application/x-ndjson"},
+        }),
+    }
+
+
+def parse_body(body: bytes, content_type: str):
+    if content_type.startswith("application/x-ndjson"):
+        return [json.loads(line) for line in body.splitlines() if line]
+    return json.loads(body)
+
+
+def stdlib_dumps(content) -> bytes:
+    if isinstance(content, list) and content and isinstance(content[0], dict):
+        return b"".join(json.dumps(item, ensure_ascii=False).encode() + b"\n" for item in content)
+    return json.dumps(content, ensure_ascii=False).encode()
+
+
+def fast_dumps(content) -> bytes:
+    if isinstance(content, list) and content and isinstance(content[0], dict):
+        return b"".join(dumps(item) + b"\n" for item in content)
+    return dumps(content)
+
+
+def bench_body(body: bytes, content) -> dict:
+    brotli = _brotli()
+    result = {
+        "stdlib_json": measure(lambda: stdlib_dumps(content)),
+        "fast_json": measure(lambda: fast_dumps(content)),
+        "bytes_stdlib_json": len(stdlib_dumps(content)),
+        "bytes_identity": len(body),
+        "bytes_gzip": len(gzip.compress(body, compresslevel=config.COMPRESSION_GZIP_LEVEL)),
+        "gzip": measure(lambda: gzip.compress(body, compresslevel=config.COMPRESSION_GZIP_LEVEL)),
+    }
+    if brotli is not None:
+        result["bytes_br"] = len(brotli.compress(body, quality=config.COMPRESSION_BROTLI_QUALITY))
+        result["br"] = measure(lambda: brotli.compress(body, quality=config.COMPRESSION_BROTLI_QUALITY))
+    return result
+
+
+async def run(args) -> dict:
+    from app.main import app
+
+    await app.router.startup()
+    results = {}
+    try:
+        async with httpx.AsyncClient(app=app, base_url="http://bench", timeout=120) as client:
+            for name, (method, path, kwargs) in build_requests(args.rows).items():
+                response = await client.request(method, path, headers={
+                    "Accept-Encoding": "identity", **kwargs.pop("headers", {})
+                }, **kwargs)
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "")
+                result = bench_body(response.content, parse_body(response.content, content_type))
+                results[name] = result
+                speedup = result["stdlib_json"]["mean_ms"] / max(result["fast_json"]["mean_ms"], 1e-6)
+                line = (f"{name:16} json {result['stdlib_json']['mean_ms']:8.3f} ms  "
+                        f"{json_backend()} {result['fast_json']['mean_ms']:8.3f} ms (x{speedup:4.1f})  "
+                        f"bytes {result['bytes_identity']:8}  gzip {result['bytes_gzip']:7}")
+                if "bytes_br" in result:
+                    line += f"  br {result['bytes_br']:7}"
+                print(line)
+    finally:
+        await app.router.shutdown()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=2000, help="строк в пакетном прогнозе урожайности")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        write_json(args.json, "serialization", results, config={
+            "rows": args.rows, "json_backend": json_backend(), "brotli": _brotli() is not None,
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Время старта бэкенда: импорт app.main (-X importtime) и время до готовности модели.
+
+    python -m benchmarks.startup [--runs 5] [--top 15] [--json out.json]
+
+Каждый замер - новый процесс интерпретатора, поэтому кэш модулей не мешает.
+importtime: медиана кумулятивного времени импорта app.main, самые дорогие
+модули и сумма по пакетам верхнего уровня (fastapi, pydantic, numpy, ...).
+ready: импорт + startup-события + ожидание прогрева модели для каждого
+режима AGRIEDU_MODEL_LOADING. Результаты сравниваются через benchmarks.compare.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.common import write_json
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+READY_SCRIPT = """
+import asyncio, json, sys, time
+started = time.perf_counter()
+from app.main import app
+from app.api.endpoints import model_registry
+imported = time.perf_counter()
+heavy = [m for m in ("numpy", "PIL", "psutil", "app.ml.plant_disease") if m in sys.modules]
+
+async def main():
+    await app.router.startup()
+    startup = time.perf_counter()
+    # В режиме background ждёт фоновую загрузку, в lazy - выполняет её, как первый запрос
+    await model_registry.get_active()
+    ready = time.perf_counter()
+    await app.router.shutdown()
+    return startup, ready
+
+startup, ready = asyncio.run(main())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (startup - imported) * 1000,
+    "ready_ms": (ready - started) * 1000,
+    "heavy_modules_after_import": heavy,
+}))
+"""
+
+
+def _run_python(args: List[str], env_overrides: Dict[str, str] = None) -> subprocess.CompletedProcess:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR, **(env_overrides or {}))
+    env.pop("PYTHONPROFILEIMPORTTIME", None)
+    return subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """Строки -X importtime -> (модуль, self мкс, cumulative мкс)"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.split(":", 1)[1].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def bench_importtime(runs: int, top: int) -> Dict:
+    totals = []
+    self_times: Dict[str, List[int]] = defaultdict(list)
+    for _ in range(runs):
+        rows = parse_importtime(_run_python(["-X", "importtime", "-c", "import app.main"]).stderr)
+        totals.append(next(cum for name, _, cum in rows if name == "app.main"))
+        for name, self_us, _ in rows:
+            self_times[name].append(self_us)
+
+    medians = {name: statistics.median(values) for name, values in self_times.items()}
+    packages: Dict[str, float] = defaultdict(float)
+    for name, value in medians.items():
+        packages[name.split(".")[0]] += value
+
+    return {
+        "app_main_import_ms": round(statistics.median(totals) / 1000, 1),
+        "modules": len(medians),
+        "top_modules_self_ms": {
+            name: round(value / 1000, 2)
+            for name, value in sorted(medians.items(), key=lambda kv: -kv[1])[:top]
+        },
+        "packages_ms": {
+            name: round(value / 1000, 1)
+            for name, value in sorted(packages.items(), key=lambda kv: -kv[1])[:top]
+        },
+    }
+
+
+def bench_ready(runs: int, modes: List[str]) -> Dict:
+    results = {}
+    for mode in modes:
+        samples = [
+            json.loads(_run_python(["-c", READY_SCRIPT], {"AGRIEDU_MODEL_LOADING": mode}).stdout)
+            for _ in range(runs)
+        ]
+        results[mode] = {
+            key: round(statistics.median(s[key] for s in samples), 1)
+            for key in ("import_ms", "startup_ms", "ready_ms")
+        }
+        results[mode]["heavy_modules_after_import"] = samples[0]["heavy_modules_after_import"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--modes", default="background,lazy,preload", help="режимы AGRIEDU_MODEL_LOADING")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = {"importtime": bench_importtime(args.runs, args.top)}
+    importtime = results["importtime"]
+    print(f"import app.main: {importtime['app_main_import_ms']} ms ({importtime['modules']} модулей)")
+    print("пакеты, ms:", importtime["packages_ms"])
+    print("модули (self), ms:", importtime["top_modules_self_ms"])
+
+    results["ready"] = bench_ready(args.runs, [m.strip() for m in args.modes.split(",") if m.strip()])
+    for mode, row in results["ready"].items():
+        print(f"{mode:10} import {row['import_ms']:8.1f} ms  startup {row['startup_ms']:8.1f} ms  "
+              f"ready {row['ready_ms']:8.1f} ms  тяжёлые модули после импорта: {row['heavy_modules_after_import']}")
+
+    if args.json:
+        write_json(args.json, "startup", results, config={"runs": args.runs, "modes": args.modes})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Пакетный прогноз урожайности против прогноза по одному полю.
+
+    python -m benchmarks.yield_batch [--rows N] [--http-rows N] [--json out.json]
+
+Модель: цикл predict_yield против predict_yield_batch.
+HTTP (ASGI в процессе): N запросов GET /api/predict-yield против одного
+POST /api/predict-yield/batch с NDJSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import httpx
+
+from app.ml.plant_disease import PlantDiseaseModel
+
+CROPS = ["wheat", "tomato", "potato", "corn", "apple", "grape", "barley"]
+REGIONS = [None, "Чуйская область", "Иссык-Кульская область", "Ошская область", "Нарынская область"]
+
+
+def make_rows(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        {"crop": rng.choice(CROPS), "area": round(rng.uniform(0.5, 200), 2), "region": rng.choice(REGIONS)}
+        for _ in range(count)
+    ]
+
+
+def bench_model(rows) -> dict:
+    model = PlantDiseaseModel()
+
+    started = time.perf_counter()
+    for row in rows:
+        model.predict_yield(row["crop"], row["area"], row["region"])
+    single = time.perf_counter() - started
+
+    started = time.perf_counter()
+    model.predict_yield_batch([r["crop"] for r in rows], [r["area"] for r in rows], [r["region"] for r in rows])
+    batch = time.perf_counter() - started
+
+    return {
+        "rows": len(rows),
+        "single_rows_per_s": round(len(rows) / single),
+        "batch_rows_per_s": round(len(rows) / batch),
+        "speedup": round(single / batch, 1),
+    }
+
+
+async def bench_http(rows) -> dict:
+    from app.main import app
+
+    async with httpx.AsyncClient(app=app, base_url="http://bench") as client:
+        started = time.perf_counter()
+        for row in rows:
+            params = {"crop": row["crop"], "area": row["area"]}
+            if row["region"]:
+                params["region"] = row["region"]
+            response = await client.get("/api/predict-yield", params=params)
+            response.raise_for_status()
+        single = time.perf_counter() - started
+
+        body = "\n".join(json.dumps(row, ensure_ascii=False) for row in rows)
+        started = time.perf_counter()
+        response = await client.post(
+            "/api/predict-yield/batch", content=body.encode(),
+            headers={"content-type": "application/x-ndjson"}
+        )
+        response.raise_for_status()
+        batch = time.perf_counter() - started
+        summary = json.loads(response.text.strip().splitlines()[-1])["summary"]
+
+    return {
+        "rows": len(rows),
+        "predicted": summary["predicted"],
+        "single_rows_per_s": round(len(rows) / single),
+        "batch_rows_per_s": round(len(rows) / batch),
+        "speedup": round(single / batch, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="строк для сравнения на уровне модели")
+    parser.add_argument("--http-rows", type=int, default=2000, help="строк для сравнения через HTTP")
+    parser.add_argument("--json", help="сохранить результаты в JSON")
+    args = parser.parse_args()
+
+    results = {"benchmark": "yield_batch", "model": bench_model(make_rows(args.rows))}
+    print("model:", results["model"])
+    results["http"] = asyncio.run(bench_http(make_rows(args.http_rows, seed=1)))
+    print("http: ", results["http"])
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""Общие фикстуры: приложение только с маршрутами API, без фоновых служб main"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from app.analysis_store import AnalysisStore
+from app.api import endpoints
+
+
+@pytest.fixture
+def api(monkeypatch):
+    """request(method, path, **kwargs) -> httpx.Response; история анализов отключена"""
+    monkeypatch.setattr(endpoints, "analysis_store", AnalysisStore(path=""))
+    app = FastAPI()
+    app.include_router(endpoints.router, prefix="/api")
+
+    def request(method: str, path: str, **kwargs) -> httpx.Response:
+        async def send():
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test", timeout=60) as client:
+                return await client.request(method, path, **kwargs)
+        return asyncio.run(send())
+
+    return request
@@ -0,0 +1,160 @@
+"""История анализов (AnalysisStore): очередь записи, пакетные транзакции и дневные агрегаты"""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.analysis_store import AnalysisStore, yield_entry
+from app.api import endpoints
+
+
+def disease(analysis_id, created_at=None, region="Чуйская область", crop="tomato",
+            name="Фитофтороз", confidence=0.8, success=True):
+    return {
+        "id": analysis_id,
+        "kind": "disease",
+        "created_at": created_at or datetime.now().isoformat(),
+        "region": region,
+        "crop": crop,
+        "disease": name if success else None,
+        "success": success,
+        "confidence": confidence if success else None,
+        "model_version": "test",
+        "payload": '{"severity": "Низкая"}',
+    }
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "history.db")
+
+
+def test_unwritten_rows_readable_before_and_after_flush(path):
+    async def scenario():
+        store = AnalysisStore(path=path, batch_size=100, flush_interval=60)
+        assert store.record(disease("ANALYSIS_1"))
+        await asyncio.sleep(0)
+        # Пачка ещё собирается: строка видна из очереди, диска не касались
+        assert store.stats()["pending"] == 1
+        assert store.written == 0
+        entry = await store.get("ANALYSIS_1")
+        assert entry["disease"] == "Фитофтороз"
+        assert entry["success"] is True
+        assert entry["payload"] == {"severity": "Низкая"}
+
+        await store.shutdown()
+        assert store.written == 1
+        assert store.pending == 0
+        assert not store._unwritten
+        # После записи то же значение читается из базы
+        assert await store.get("ANALYSIS_1") == entry
+        assert await store.get("ANALYSIS_2") is None
+        await store.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_queued_rows_written_in_batches(path):
+    async def scenario():
+        store = AnalysisStore(path=path, batch_size=3, flush_interval=60, queue_size=5)
+        for index in range(5):
+            assert store.record(disease(f"ANALYSIS_{index}"))
+        # Очередь заполнена: запись отбрасывается, обработчик не ждёт
+        assert not store.record(disease("ANALYSIS_5"))
+        assert store.dropped == 1
+
+        await store.shutdown()
+        stats = store.stats()
+        assert stats["written"] == 5
+        assert stats["flushes"] == 2
+        assert stats["avg_flush_rows"] == 2.5
+        assert stats["failed"] == 0
+        assert len(await store.query(limit=10)) == 5
+        await store.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_duplicate_row_falls_back_to_single_inserts(path):
+    async def scenario():
+        store = AnalysisStore(path=path, batch_size=10, flush_interval=0)
+        store.record(disease("ANALYSIS_1", confidence=0.5))
+        await store.shutdown()
+
+        # Повтор ANALYSIS_1 откатывает транзакцию пачки, остальные строки пишутся поштучно
+        store.record_many([
+            disease("ANALYSIS_2", confidence=0.7),
+            disease("ANALYSIS_1", confidence=0.9),
+            disease("ANALYSIS_3", confidence=0.9),
+        ])
+        await store.shutdown()
+        assert store.written == 3
+        assert store.failed == 1
+        assert store.write_errors == 1
+        assert {entry["id"] for entry in await store.query()} == {"ANALYSIS_1", "ANALYSIS_2", "ANALYSIS_3"}
+        assert (await store.get("ANALYSIS_1"))["confidence"] == 0.5
+
+        # Агрегаты без отвергнутой строки и без двойного учёта откатанной пачки
+        summary = await store.summary()
+        assert summary["total_analyses"] == 3
+        assert summary["avg_confidence"] == 70.0
+        await store.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_dashboard_stats_from_daily_aggregates(path, monkeypatch):
+    now = datetime.now()
+    old = (now - timedelta(days=10)).isoformat()
+
+    async def scenario():
+        store = AnalysisStore(path=path, batch_size=2, flush_interval=0)
+        store.record_many([
+            disease("ANALYSIS_1", confidence=0.9),
+            disease("ANALYSIS_2", confidence=0.7, region="Ошская область"),
+            disease("ANALYSIS_3", name="Парша", crop="potato", confidence=0.8, region="Ошская область"),
+            disease("ANALYSIS_4", success=False),
+            disease("ANALYSIS_5", created_at=old, name="Парша", confidence=0.6),
+            yield_entry("PRED_1", "wheat", 10.0, "Чуйская область", {"predicted_yield_tons": 40.0}),
+            yield_entry("PRED_2", "wheat", 5.0, None, {"predicted_yield_tons": 20.0}, created_at=old),
+        ])
+        await store.shutdown()
+        monkeypatch.setattr(endpoints, "analysis_store", store)
+
+        stats = await endpoints.get_dashboard_stats()
+        assert stats["total_analyses"] == 5
+        assert stats["successful_predictions"] == 4
+        assert stats["success_rate"] == 80.0
+        assert stats["avg_confidence"] == 75.0
+        assert stats["total_yield_predictions"] == 2
+        assert stats["total_area_hectares"] == 15.0
+        assert stats["avg_yield_per_hectare"] == 4.0
+        assert stats["today"] == {"disease": 4, "yield": 1}
+        assert stats["top_diseases"] == {"Фитофтороз": 2, "Парша": 2}
+        assert stats["analyses_by_region"] == {"Чуйская область": 3, "Ошская область": 2}
+        assert stats["analyses_by_crop"] == {"tomato": 4, "potato": 1}
+        assert stats["yield_predictions_by_crop"] == {"wheat": 2}
+        # Прогноз без региона не попадает в разбивку по регионам
+        assert stats["yield_predictions_by_region"] == {"Чуйская область": 1}
+
+        # За последнюю неделю - без записей десятидневной давности
+        week = await endpoints.get_dashboard_stats(days=7)
+        assert week["period_days"] == 7
+        assert week["total_analyses"] == 4
+        assert week["avg_confidence"] == 80.0
+        assert week["top_diseases"] == {"Фитофтороз": 2, "Парша": 1}
+        assert week["total_area_hectares"] == 10.0
+        await store.shutdown()
+
+    asyncio.run(scenario())
+
+
+def test_disabled_store(api):
+    store = AnalysisStore(path="")
+    assert not store.record(disease("ANALYSIS_1"))
+    assert asyncio.run(store.get("ANALYSIS_1")) is None
+    # conftest подменяет историю выключенным хранилищем: дашборд отдаёт нули
+    response = api("GET", "/api/dashboard/stats")
+    assert response.status_code == 200
+    assert response.json()["total_analyses"] == 0
+    assert api("GET", "/api/dashboard/stats", params={"days": 0}).status_code == 400
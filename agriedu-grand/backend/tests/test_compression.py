@@ -0,0 +1,77 @@
+"""Сжатие ответов (CompressionMiddleware): пороги, заголовки и потоковые ответы"""
+import asyncio
+import gzip
+import zlib
+
+from app.api.compression import CompressionMiddleware
+
+
+def make_app(content_type: bytes, chunks, headers=()):
+    async def app(scope, receive, send):
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", content_type), *headers],
+        })
+        for index, chunk in enumerate(chunks):
+            await send({"type": "http.response.body", "body": chunk, "more_body": index < len(chunks) - 1})
+    return app
+
+
+def call(app, accept_encoding: bytes = b"gzip", method: str = "GET", min_size: int = 100):
+    middleware = CompressionMiddleware(app, min_size=min_size, gzip_level=6)
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "method": method, "path": "/", "headers": [(b"accept-encoding", accept_encoding)]}
+    asyncio.run(middleware(scope, receive, send))
+    return dict(messages[0]["headers"]), [message.get("body", b"") for message in messages[1:]]
+
+
+def test_whole_body_compressed():
+    body = b'{"value": "' + b"a" * 1000 + b'"}'
+    headers, bodies = call(make_app(b"application/json", [body], [(b"etag", b'"abc"')]))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert headers[b"vary"] == b"Accept-Encoding"
+    assert headers[b"etag"] == b'W/"abc"'
+    assert int(headers[b"content-length"]) == len(bodies[0])
+    assert gzip.decompress(b"".join(bodies)) == body
+
+
+def test_small_or_binary_bodies_untouched():
+    headers, bodies = call(make_app(b"application/json", [b'{"ok": true}']))
+    assert b"content-encoding" not in headers
+    assert bodies == [b'{"ok": true}']
+
+    headers, _ = call(make_app(b"image/png", [b"\x89PNG" * 100]))
+    assert b"content-encoding" not in headers
+
+    headers, _ = call(make_app(b"application/json", [b"a" * 1000]), accept_encoding=b"identity")
+    assert b"content-encoding" not in headers
+
+
+def test_stream_chunks_decodable_as_they_arrive():
+    lines = [b'{"index": %d, "text": "%s"}\n' % (index, b"x" * 50) for index in range(5)]
+    headers, bodies = call(make_app(b"application/x-ndjson", lines))
+    assert headers[b"content-encoding"] == b"gzip"
+    assert b"content-length" not in headers
+
+    # Каждый чанк сброшен (Z_SYNC_FLUSH): клиент получает строку сразу, не дожидаясь конца потока
+    decoder = zlib.decompressobj(31)
+    for line, chunk in zip(lines, bodies):
+        assert decoder.decompress(chunk) == line
+    decoder.decompress(b"".join(bodies[len(lines):]))
+    assert decoder.eof
+    assert gzip.decompress(b"".join(bodies)) == b"".join(lines)
+
+
+def test_event_stream_not_compressed():
+    events = [b"event: status\ndata: {}\n\n" * 20, b"event: result\ndata: {}\n\n"]
+    headers, bodies = call(make_app(b"text/event-stream", events))
+    assert b"content-encoding" not in headers
+    assert bodies == events
@@ -0,0 +1,90 @@
+"""Кодирование heatmap, хранилище HeatmapStore и выдача /analysis/{id}/heatmap"""
+import base64
+import io
+import json
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.api import endpoints
+from app.ml.heatmap import HeatmapStore, encode_heatmap
+
+
+@pytest.fixture
+def heatmap():
+    return np.arange(12 * 10, dtype=np.uint8).reshape(12, 10) * 2
+
+
+def test_encodings_roundtrip(heatmap):
+    encoded = encode_heatmap(heatmap, "json")
+    assert encoded["heatmap_format"] == {"encoding": "json", "width": 10, "height": 12, "dtype": "uint8"}
+    percent = np.array(json.loads(base64.b64decode(encoded["heatmap"])))
+    assert percent.shape == (12, 10)
+    assert percent.max() <= 100
+    assert np.array_equal(percent, np.rint(heatmap * (100 / 255)))
+
+    raw = base64.b64decode(encode_heatmap(heatmap, "raw")["heatmap"])
+    assert np.array_equal(np.frombuffer(raw, dtype=np.uint8).reshape(12, 10), heatmap)
+
+    png = base64.b64decode(encode_heatmap(heatmap, "png")["heatmap"])
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(png))), heatmap)
+
+    url = encode_heatmap(heatmap, "url")
+    assert url["heatmap"] is None
+    assert url["heatmap_format"]["encoding"] == "url"
+
+    with pytest.raises(ValueError):
+        encode_heatmap(heatmap, "bmp")
+
+
+def test_store_shared_between_instances(tmp_path, heatmap):
+    writer = HeatmapStore(str(tmp_path), max_entries=8)
+    writer.put("ANALYSIS_1", heatmap)
+    # Другой воркер видит heatmap через общий каталог
+    reader = HeatmapStore(str(tmp_path), max_entries=8)
+    assert reader.exists("ANALYSIS_1")
+    assert np.array_equal(reader.get("ANALYSIS_1"), heatmap)
+    assert not reader.exists("ANALYSIS_2")
+    assert reader.get("ANALYSIS_2") is None
+    # Идентификатор не превращается в путь за пределами каталога
+    assert not reader.exists("../ANALYSIS_1")
+    assert not any(name.endswith(".tmp") for name in os.listdir(tmp_path))
+
+
+def test_store_disabled_without_directory(heatmap):
+    store = HeatmapStore("", max_entries=8)
+    store.put("ANALYSIS_1", heatmap)
+    assert not store.shared
+    assert not store.exists("ANALYSIS_1")
+    assert store.get("ANALYSIS_1") is None
+
+
+def test_store_prunes_oldest_files(tmp_path, heatmap):
+    store = HeatmapStore(str(tmp_path), max_entries=4)
+    for index in range(8):
+        store.put(f"ANALYSIS_{index}", heatmap)
+        os.utime(tmp_path / f"ANALYSIS_{index}.npy", (index, index))
+    store._prune()
+    assert sorted(os.listdir(tmp_path)) == [f"ANALYSIS_{index}.npy" for index in range(4, 8)]
+
+
+def test_heatmap_endpoint(api, monkeypatch, tmp_path, heatmap):
+    monkeypatch.setattr(endpoints, "heatmap_store", HeatmapStore(str(tmp_path)))
+    endpoints.heatmap_store.put("ANALYSIS_1", heatmap)
+
+    response = api("GET", "/api/analysis/ANALYSIS_1/heatmap")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["x-heatmap-width"] == "10"
+    assert response.headers["x-heatmap-height"] == "12"
+    assert np.array_equal(np.asarray(Image.open(io.BytesIO(response.content))), heatmap)
+
+    response = api("GET", "/api/analysis/ANALYSIS_1/heatmap", params={"format": "raw"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert np.array_equal(np.frombuffer(response.content, dtype=np.uint8).reshape(12, 10), heatmap)
+
+    assert api("GET", "/api/analysis/ANALYSIS_1/heatmap", params={"format": "bmp"}).status_code == 400
+    assert api("GET", "/api/analysis/ANALYSIS_2/heatmap").status_code == 404
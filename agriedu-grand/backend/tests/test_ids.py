@@ -0,0 +1,50 @@
+"""Сортируемые идентификаторы (app.ids)"""
+import time
+from datetime import datetime, timedelta
+
+from app import ids
+from app.ids import CROCKFORD, ID_LENGTH, id_timestamp, new_id
+
+
+def test_format():
+    value = new_id("ANALYSIS")
+    prefix, body = value.split("_")
+    assert prefix == "ANALYSIS"
+    assert len(body) == ID_LENGTH
+    assert set(body) <= set(CROCKFORD)
+    assert len(new_id()) == ID_LENGTH
+
+
+def test_unique_and_sorted():
+    values = [new_id("A") for _ in range(10000)]
+    assert len(set(values)) == len(values)
+    assert values == sorted(values)
+
+
+def test_sorted_across_milliseconds():
+    first = new_id("A")
+    time.sleep(0.002)
+    assert new_id("A") > first
+
+
+def test_counter_wraps_within_field(monkeypatch):
+    # Переполнение счётчика не должно задевать биты узла и времени
+    monkeypatch.setattr(ids, "_counter", iter([(1 << 64) + 5]))
+    value = new_id()
+    number = 0
+    for char in value:
+        number = number * 32 + CROCKFORD.index(char)
+    assert number & ((1 << 64) - 1) == 5
+    assert (number >> 64) & 0xFFFF == ids._node_bits >> 64
+
+
+def test_timestamp_roundtrip():
+    created = id_timestamp(new_id("TRAIN"))
+    assert abs(created - datetime.now()) < timedelta(seconds=1)
+    assert id_timestamp(new_id().lower()) is not None
+
+
+def test_timestamp_rejects_foreign_ids():
+    assert id_timestamp("ANALYSIS_20240101_123456") is None
+    assert id_timestamp("U" * ID_LENGTH) is None
+    assert id_timestamp("") is None
@@ -0,0 +1,152 @@
+"""Пакетный анализ фото (/api/analyze-plant/batch): multipart, zip, поток NDJSON и сводка по полю"""
+import io
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app import config
+from app.api.image_batch import FieldSummary
+
+
+def png(color=(40, 160, 60)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def make_zip(files) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+    return buffer.getvalue()
+
+
+def lines(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    *results, last = rows
+    return sorted(results, key=lambda row: row["index"]), last["summary"]
+
+
+def test_multipart_images(api):
+    response = api("POST", "/api/analyze-plant/batch", data={"plant_type": "wheat", "heatmap": "raw"}, files=[
+        ("images", ("a.png", png(), "image/png")),
+        ("images", ("broken.jpg", b"not an image", "image/jpeg")),
+        ("images", ("c.png", png((120, 90, 30)), "image/png")),
+    ])
+    results, summary = lines(response)
+
+    # Строка на каждое фото; ошибка одного фото не прерывает пакет
+    assert [(row["index"], row["filename"]) for row in results] == [(0, "a.png"), (1, "broken.jpg"), (2, "c.png")]
+    assert [row["success"] for row in results] == [True, False, True]
+    assert "error" in results[1]
+    for row in (results[0], results[2]):
+        assert row["analysis_id"].startswith("ANALYSIS_")
+        assert row["heatmap_format"]["encoding"] == "raw"
+
+    assert summary["batch_id"].startswith("ANALYSIS_BATCH_")
+    assert (summary["images"], summary["analysed"], summary["failed"]) == (3, 2, 1)
+    assert sum(item["count"] for item in summary["disease_distribution"].values()) == 2
+
+
+def test_zip_archive(api):
+    archive = make_zip([
+        ("field/1.png", png()),
+        ("field/2.PNG", png((10, 10, 10))),
+        ("field/notes.txt", b"not an image"),
+        ("field/.hidden.png", png()),
+        ("__MACOSX/field/._1.png", b"resource fork"),
+    ])
+    response = api("POST", "/api/analyze-plant/batch", files={"archive": ("field.zip", archive, "application/zip")})
+    results, summary = lines(response)
+    assert [row["filename"] for row in results] == ["field/1.png", "field/2.PNG"]
+    assert all(row["success"] for row in results)
+    assert summary["images"] == summary["analysed"] == 2
+
+
+def test_zip_and_multipart_together(api):
+    archive = make_zip([("1.png", png())])
+    response = api("POST", "/api/analyze-plant/batch", files=[
+        ("images", ("a.png", png(), "image/png")),
+        ("archive", ("field.zip", archive, "application/zip")),
+    ])
+    results, summary = lines(response)
+    assert [row["filename"] for row in results] == ["a.png", "1.png"]
+    assert summary["images"] == 2
+
+
+def test_zip_limits(api, monkeypatch):
+    archive = make_zip([(f"{index}.png", png()) for index in range(3)])
+    files = {"archive": ("field.zip", archive, "application/zip")}
+
+    monkeypatch.setattr(config, "ANALYZE_BATCH_MAX_IMAGES", 2)
+    response = api("POST", "/api/analyze-plant/batch", files=files)
+    assert response.status_code == 413
+    monkeypatch.setattr(config, "ANALYZE_BATCH_MAX_IMAGES", 200)
+
+    # Размер файла проверяется по заголовку архива, до распаковки
+    monkeypatch.setattr(config, "UPLOAD_MAX_BYTES", 16)
+    response = api("POST", "/api/analyze-plant/batch", files=files)
+    assert response.status_code == 413
+    assert "0.png" in response.json()["detail"]
+
+
+@pytest.mark.parametrize("files, status", [
+    ({"archive": ("field.zip", b"not a zip", "application/zip")}, 400),
+    ({"archive": ("field.zip", make_zip([("notes.txt", b"text")]), "application/zip")}, 400),
+    (None, 400),
+])
+def test_rejected_requests(api, files, status):
+    response = api("POST", "/api/analyze-plant/batch", data={"plant_type": "tomato"}, files=files)
+    assert response.status_code == status
+
+
+def test_invalid_heatmap_encoding(api):
+    response = api("POST", "/api/analyze-plant/batch", data={"heatmap": "bmp"},
+                   files={"images": ("a.png", png(), "image/png")})
+    assert response.status_code == 400
+
+
+def test_field_summary():
+    summary = FieldSummary("ANALYSIS_BATCH_1")
+    for result in (
+        {"success": True, "disease": "Парша", "confidence": 0.9, "severity": "Высокая",
+         "affected_area": "40%", "model_version": "v2"},
+        {"success": True, "disease": "Парша", "confidence": 0.7, "severity": "Средняя",
+         "affected_area": "20%", "model_version": "v2"},
+        {"success": True, "disease": "Ржавчина", "confidence": 0.8, "severity": "Низкая",
+         "affected_area": "?", "model_version": "v3"},
+        {"success": False, "error": "Не удалось декодировать изображение"},
+    ):
+        summary.add(result)
+
+    assert summary.as_dict() == {
+        "batch_id": "ANALYSIS_BATCH_1",
+        "images": 4,
+        "analysed": 3,
+        "failed": 1,
+        "disease_distribution": {
+            "Парша": {"count": 2, "share": 0.667},
+            "Ржавчина": {"count": 1, "share": 0.333},
+        },
+        "mean_severity": 2.0,
+        "mean_severity_label": "Средняя",
+        "mean_affected_area_percent": 20.0,
+        "mean_confidence": 0.8,
+        "model_versions": ["v2", "v3"],
+    }
+
+
+def test_empty_field_summary():
+    summary = FieldSummary("ANALYSIS_BATCH_2")
+    summary.add({"success": False, "error": "timeout"})
+    result = summary.as_dict()
+    assert (result["images"], result["analysed"], result["failed"]) == (1, 0, 1)
+    assert result["disease_distribution"] == {}
+    assert result["mean_severity"] is None
+    assert result["mean_severity_label"] is None
+    assert result["mean_confidence"] is None
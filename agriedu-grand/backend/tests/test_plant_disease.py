@@ -0,0 +1,42 @@
+"""Ответ классификатора болезней: уверенность по классам растения"""
+import numpy as np
+import pytest
+
+from app.ml.plant_disease import PlantDiseaseModel, StubBackend
+
+
+@pytest.fixture
+def model():
+    return PlantDiseaseModel()
+
+
+def test_confidence_among_plant_classes(model):
+    model.diseases["test"] = ["Парша", "Ржавчина"]
+    # Выходы сверх двух болезней растения не уменьшают уверенность
+    probabilities = np.array([0.1, 0.3, 0.2, 0.2, 0.2], dtype=np.float32)
+    result = model.build_disease_result(probabilities, "test")
+    assert result["disease"] == "Ржавчина"
+    assert result["confidence"] == 0.75
+    assert result["plant_type_known"] is True
+
+
+def test_unknown_plant_has_no_confidence(model):
+    for probabilities in ([0.9, 0.025, 0.025, 0.025, 0.025], [0.01, 0.5, 0.3, 0.1, 0.09]):
+        result = model.build_disease_result(np.array(probabilities, dtype=np.float32), "кактус")
+        assert result["disease"] == "Здоровое растение"
+        assert result["confidence"] == 0.0
+        assert result["plant_type_known"] is False
+        assert result["plant_type"] == "кактус"
+
+
+def test_stub_backend_single_class():
+    probabilities = StubBackend(num_classes=1).predict(np.zeros((3, 4, 4, 3), dtype=np.float32))
+    assert probabilities.shape == (3, 1)
+    assert np.allclose(probabilities, 1.0)
+
+
+def test_stub_backend_distribution():
+    probabilities = StubBackend(num_classes=5).predict(np.zeros((8, 4, 4, 3), dtype=np.float32))
+    assert probabilities.shape == (8, 5)
+    assert np.allclose(probabilities.sum(axis=1), 1.0)
+    assert (probabilities.max(axis=1) >= 0.75).all()
@@ -0,0 +1,231 @@
+"""Допуск запросов (AdmissionController) и GCRA-лимиты в памяти (LocalRateStore)"""
+import asyncio
+
+import pytest
+
+from app.api import rate_limit
+from app.api.rate_limit import AdmissionController, LocalRateStore, RateLimit, RateLimiter, RateLimitMiddleware, default_routes
+
+
+async def _settle():
+    # Несколько оборотов цикла: ждущие задачи доходят до своего await
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_admission_hands_slot_to_waiter():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+        assert await controller.acquire() is None
+        waiter = asyncio.create_task(controller.acquire())
+        await _settle()
+        assert controller.stats()["queued"] == 1
+
+        controller.release()
+        assert await waiter is None
+        # Место передано ждущему, а не освобождено
+        assert controller.active == 1
+        controller.release()
+        assert controller.active == 0
+        assert controller.admitted == 2
+
+    asyncio.run(scenario())
+
+
+def test_admission_queue_full():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+        assert await controller.acquire() is None
+        waiter = asyncio.create_task(controller.acquire())
+        await _settle()
+        assert await controller.acquire() == "queue_full"
+        assert controller.rejected_queue_full == 1
+
+        controller.release()
+        assert await waiter is None
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_timeout():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=0.01)
+        assert await controller.acquire() is None
+        assert await controller.acquire() == "timeout"
+        assert controller.stats()["queued"] == 0
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_timeout_racing_release(monkeypatch):
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=1, queue_timeout=5)
+        assert await controller.acquire() is None
+
+        async def release_then_timeout(future, timeout):
+            # release() успевает передать место, но wait_for уже решил, что время вышло
+            controller.release()
+            assert future.done()
+            raise asyncio.TimeoutError()
+
+        monkeypatch.setattr(rate_limit.asyncio, "wait_for", release_then_timeout)
+        assert await controller.acquire() is None
+        assert controller.rejected_timeout == 0
+        assert controller.active == 1
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_cancelled_waiter_leaves_queue():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+        assert await controller.acquire() is None
+        waiter = asyncio.create_task(controller.acquire())
+        await _settle()
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert controller.stats()["queued"] == 0
+        controller.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_admission_cancelled_after_handoff_passes_slot_on():
+    async def scenario():
+        controller = AdmissionController(max_concurrent=1, max_queue=2, queue_timeout=5)
+        assert await controller.acquire() is None
+        first = asyncio.create_task(controller.acquire())
+        await _settle()
+        second = asyncio.create_task(controller.acquire())
+        await _settle()
+
+        # Место передано first, но клиент ушёл раньше, чем задача проснулась
+        controller.release()
+        first.cancel()
+        try:
+            admitted = await first is None
+        except asyncio.CancelledError:
+            admitted = False
+        if admitted:
+            # wait_for может вернуть уже готовый результат вопреки отмене - место тогда у first
+            controller.release()
+        assert await second is None
+        controller.release()
+        assert controller.active == 0
+        assert controller.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_gcra_burst_then_rate(clock):
+    async def scenario():
+        store = LocalRateStore()
+        limit = RateLimit("test", per_minute=60, burst=3)
+        results = [await store.take("ip:1", limit) for _ in range(3)]
+        assert [allowed for allowed, _, _ in results] == [True, True, True]
+        assert [remaining for _, _, remaining in results] == [2, 1, 0]
+
+        allowed, retry_after, remaining = await store.take("ip:1", limit)
+        assert not allowed
+        assert retry_after == pytest.approx(1.0)
+        assert remaining == 0
+
+        # Через интервал (60 / per_minute секунд) доступен ровно один запрос
+        clock[0] += 1.0
+        assert (await store.take("ip:1", limit))[0]
+        assert not (await store.take("ip:1", limit))[0]
+        # Другой клиент считается отдельно
+        assert (await store.take("ip:2", limit))[0]
+
+    asyncio.run(scenario())
+
+
+def test_gcra_cost_and_recovery(clock):
+    async def scenario():
+        store = LocalRateStore()
+        limit = RateLimit("test", per_minute=60, burst=4)
+        assert await store.take("ip:1", limit, cost=4) == (True, 0.0, 0)
+        allowed, retry_after, _ = await store.take("ip:1", limit, cost=2)
+        assert not allowed
+        assert retry_after == pytest.approx(2.0)
+
+        # Полная корзина восстанавливается за burst интервалов
+        clock[0] += 4.0
+        assert await store.take("ip:1", limit) == (True, 0.0, 3)
+
+    asyncio.run(scenario())
+
+
+def test_local_store_evicts_least_recent(clock):
+    async def scenario():
+        store = LocalRateStore(max_keys=2)
+        limit = RateLimit("test", per_minute=60, burst=1)
+        await store.take("a", limit)
+        await store.take("b", limit)
+        clock[0] += 1.0
+        await store.take("a", limit)
+        await store.take("c", limit)
+        assert store.stats() == {"keys": 2, "evicted": 1}
+        # Вытеснен b - давно не приходивший клиент начинает с полной корзиной
+        assert (await store.take("b", limit))[0]
+        assert not (await store.take("c", limit))[0]
+
+    asyncio.run(scenario())
+
+
+def test_batch_routes_have_own_limits(clock):
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    limiter = RateLimiter({
+        "analyze-plant": RateLimit("analyze-plant", per_minute=60, burst=20),
+        "analyze-plant-batch": RateLimit("analyze-plant-batch", per_minute=2, burst=2),
+        "predict-yield": RateLimit("predict-yield", per_minute=300, burst=60),
+        "predict-yield-batch": RateLimit("predict-yield-batch", per_minute=6, burst=1),
+        "train-model": RateLimit("train-model", per_minute=6, burst=2),
+    }, store=LocalRateStore(), api_keys=[])
+    middleware = RateLimitMiddleware(endpoint, limiter, AdmissionController(max_concurrent=0), default_routes())
+
+    async def status(method, path):
+        messages = []
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": method, "path": path, "headers": [], "client": ("10.0.0.1", 1)}
+        await middleware(scope, receive, send)
+        return messages[0]["status"]
+
+    async def scenario():
+        # Пакет в сотни фото не проходит по одиночному лимиту в 20 запросов
+        assert [await status("POST", "/api/analyze-plant/batch") for _ in range(3)] == [200, 200, 429]
+        assert await status("POST", "/api/predict-yield/batch") == 200
+        assert await status("POST", "/api/predict-yield/batch") == 429
+        # Одиночные запросы считаются отдельно и не расходуются пакетами
+        assert await status("POST", "/api/analyze-plant") == 200
+        assert await status("GET", "/api/predict-yield") == 200
+
+        clock[0] += 30.0
+        assert await status("POST", "/api/analyze-plant/batch") == 200
+
+    asyncio.run(scenario())
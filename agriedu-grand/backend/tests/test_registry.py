@@ -0,0 +1,80 @@
+"""Реестр моделей: общая для воркеров активная версия и защита её замены"""
+import asyncio
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+
+from app.api import endpoints
+from app.api.rate_limit import ApiKeys
+from app.ml.registry import ModelRegistry
+
+
+@pytest.fixture
+def models(tmp_path):
+    directory = tmp_path / "models"
+    for version in ("v2", "v3"):
+        (directory / version).mkdir(parents=True)
+        (directory / version / "model.json").write_text(json.dumps({"backend": "stub"}), encoding="utf-8")
+    return str(directory)
+
+
+def make_registry(models, tmp_path):
+    return ModelRegistry(directory=models, version="", state_path=str(tmp_path / "data" / "active.json"))
+
+
+def test_activation_reaches_other_workers(models, tmp_path):
+    async def scenario():
+        first = make_registry(models, tmp_path)
+        second = make_registry(models, tmp_path)
+        builtin = first.ensure_loaded().version
+        assert second.ensure_loaded().version == builtin
+
+        await first.activate("v2")
+        assert first.version == "v2"
+        assert second.version == builtin
+        await second.sync()
+        assert second.version == "v2"
+        assert second.swaps == 1
+
+        # Новый воркер сразу стартует с общей версии
+        assert make_registry(models, tmp_path).ensure_loaded().version == "v2"
+
+    asyncio.run(scenario())
+
+
+def test_unloadable_shared_version_keeps_current_model(models, tmp_path):
+    async def scenario():
+        registry = make_registry(models, tmp_path)
+        registry.ensure_loaded()
+        await registry.activate("v2")
+        os.makedirs(os.path.dirname(registry.state_path), exist_ok=True)
+        with open(registry.state_path, "w", encoding="utf-8") as f:
+            json.dump({"version": "missing"}, f)
+
+        await registry.sync()
+        assert registry.version == "v2"
+        assert registry.load_error.startswith("missing")
+        # Повторно та же версия не загружается, пока файл не изменится
+        await registry.sync()
+        assert registry.swaps == 1
+
+        await make_registry(models, tmp_path).activate("v3")
+        await registry.sync()
+        assert registry.version == "v3"
+        assert registry.load_error is None
+
+    asyncio.run(scenario())
+
+
+def test_activate_endpoint_requires_admin_key(monkeypatch):
+    async def activate(api_key, keys):
+        monkeypatch.setattr(endpoints, "model_admin_keys", ApiKeys(keys))
+        with pytest.raises(HTTPException) as error:
+            await endpoints.activate_model("v2", api_key)
+        return error.value.status_code
+
+    assert asyncio.run(activate("secret", [])) == 403
+    assert asyncio.run(activate(None, ["secret"])) == 401
+    assert asyncio.run(activate("guess", ["secret"])) == 401
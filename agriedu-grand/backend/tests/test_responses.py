@@ -0,0 +1,58 @@
+"""Сериализация ответов (app.api.responses): orjson и стандартный json дают одинаковый JSON"""
+import json
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from app import config
+from app.api import responses
+from app.api.responses import FastJSONResponse, dumps, dumps_line, json_backend
+
+
+@pytest.fixture(params=["orjson", "json"])
+def backend(request, monkeypatch):
+    monkeypatch.setattr(config, "JSON_BACKEND", request.param)
+    responses._orjson.cache_clear()
+    yield request.param
+    responses._orjson.cache_clear()
+
+
+def test_backend_selected(backend):
+    assert json_backend() == backend
+
+
+def test_non_finite_floats_become_null(backend):
+    content = {
+        "confidence": float("nan"),
+        "bounds": [float("inf"), 1.5, -float("inf")],
+        "nested": {"values": (float("nan"), 2)},
+        "array": np.array([np.nan, 0.5], dtype=np.float32),
+        "scalar": np.float64("inf"),
+    }
+    assert json.loads(dumps(content)) == {
+        "confidence": None,
+        "bounds": [None, 1.5, None],
+        "nested": {"values": [None, 2]},
+        "array": [None, 0.5],
+        "scalar": None,
+    }
+    assert FastJSONResponse(content).status_code == 200
+
+
+def test_same_output_for_regular_content(backend):
+    content = {
+        "disease": "Мучнистая роса",
+        "created_at": datetime(2024, 5, 1, 12, 30),
+        "heatmap": np.arange(4, dtype=np.uint8).reshape(2, 2),
+        "area": np.float32(2.5),
+        "tags": {"поле"},
+    }
+    expected = '{"disease":"Мучнистая роса","created_at":"2024-05-01T12:30:00","heatmap":[[0,1],[2,3]],"area":2.5,"tags":["поле"]}'
+    assert dumps(content).decode() == expected
+    assert dumps_line([1, 2]) == b"[1,2]\n"
+
+
+def test_unsupported_type(backend):
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
@@ -0,0 +1,166 @@
+"""Очередь обучения: захват с арендой, лимит параллельности, отмена и возврат в очередь"""
+import threading
+import time
+
+import pytest
+
+from app.ml import training
+from app.ml.training import TrainingJobStore, TrainingQueueFull, TrainingScheduler
+
+PARAMS = {"epochs": 1, "epoch_seconds": 0.01}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TrainingJobStore(str(tmp_path / "training.db"))
+    yield store
+    store.close()
+
+
+def test_claim_respects_limit_and_order(store):
+    first = store.create(PARAMS, max_queued=10)
+    second = store.create(PARAMS, max_queued=10)
+    claimed = store.claim_next(1, "worker-a")
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == "running"
+    # Лимит общий для всех воркеров базы
+    assert store.claim_next(1, "worker-b") is None
+    assert store.claim_next(2, "worker-b")["id"] == second["id"]
+    assert store.counts()["running"] == 2
+
+
+def test_queue_limit(store):
+    store.create(PARAMS, max_queued=1)
+    with pytest.raises(TrainingQueueFull):
+        store.create(PARAMS, max_queued=1)
+
+
+def test_cancel_queued_and_running(store):
+    queued = store.create(PARAMS, max_queued=10)
+    running = store.create(PARAMS, max_queued=10)
+    store.claim_next(1, "worker-a")
+    # Первая задача уже выполняется: только флаг, статус ставит процесс
+    assert store.request_cancel(queued["id"]) == "running"
+    assert store.get(queued["id"])["cancel_requested"]
+    assert store.request_cancel(running["id"]) == "cancelled"
+    assert store.request_cancel("TRAIN_missing") is None
+
+
+def test_only_expired_leases_are_requeued(store, monkeypatch):
+    job = store.create(PARAMS, max_queued=10)
+    store.claim_next(1, "worker-a")
+    # Свежая аренда (процесс ещё запускается, pid не записан) - задачу не трогаем
+    assert store.requeue_expired(30) == 0
+    assert store.get(job["id"])["status"] == "running"
+
+    now = time.time()
+    monkeypatch.setattr(training.time, "time", lambda: now + 60)
+    assert store.requeue_expired(30) == 1
+    assert store.get(job["id"])["status"] == "queued"
+
+
+def test_heartbeat_extends_lease(store, monkeypatch):
+    store.create(PARAMS, max_queued=10)
+    store.claim_next(1, "worker-a")
+    now = time.time()
+    monkeypatch.setattr(training.time, "time", lambda: now + 20)
+    store.heartbeat("worker-a")
+    monkeypatch.setattr(training.time, "time", lambda: now + 40)
+    assert store.requeue_expired(30) == 0
+
+
+class FakeProcess:
+    """Процесс обучения без spawn: жив, пока тест не завершит его"""
+
+    started = []
+
+    def __init__(self, target, args, name, daemon):
+        self.job_id = args[1]
+        self.pid = 4242
+        self.exitcode = None
+        self.alive = False
+
+    def start(self):
+        self.alive = True
+        FakeProcess.started.append(self)
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+    def terminate(self):
+        self.alive = False
+        self.exitcode = -15
+
+
+class FakeContext:
+    Process = FakeProcess
+
+
+@pytest.fixture
+def scheduler(tmp_path):
+    FakeProcess.started = []
+    scheduler = TrainingScheduler(db_path=str(tmp_path / "training.db"), max_concurrent=1, max_queued=10)
+    scheduler._context = FakeContext()
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_scheduler_runs_one_job_at_a_time(scheduler):
+    first = scheduler.store.create(PARAMS, 10)
+    second = scheduler.store.create(PARAMS, 10)
+    scheduler._tick()
+    assert [process.job_id for process in FakeProcess.started] == [first["id"]]
+    assert scheduler.stats()["running"] == 1
+    assert scheduler.store.get(first["id"])["pid"] == 4242
+
+    # Процесс упал, не записав статус: задача failed, место занимает следующая
+    FakeProcess.started[0].alive = False
+    FakeProcess.started[0].exitcode = 1
+    scheduler._tick()
+    assert scheduler.store.get(first["id"])["status"] == "failed"
+    assert [process.job_id for process in FakeProcess.started] == [first["id"], second["id"]]
+
+
+def test_scheduler_terminates_after_cancel_grace(scheduler, monkeypatch):
+    job = scheduler.store.create(PARAMS, 10)
+    scheduler._tick()
+    scheduler.store.request_cancel(job["id"])
+    now = time.time()
+    monkeypatch.setattr(training.time, "time", lambda: now + scheduler.cancel_grace + 1)
+    scheduler._tick()
+    assert not FakeProcess.started[0].alive
+    scheduler._tick()
+    assert scheduler.store.get(job["id"])["status"] == "cancelled"
+
+
+def test_shutdown_waits_for_running_tick(scheduler):
+    scheduler.store.create(PARAMS, 10)
+    entered = threading.Event()
+    release = threading.Event()
+    dispatch = scheduler._dispatch
+
+    def slow_dispatch():
+        entered.set()
+        release.wait(5)
+        dispatch()
+
+    scheduler._dispatch = slow_dispatch
+    ticker = threading.Thread(target=scheduler._tick)
+    ticker.start()
+    entered.wait(5)
+    stopper = threading.Thread(target=scheduler.shutdown)
+    stopper.start()
+    time.sleep(0.05)
+    # shutdown ждёт проход диспетчера, а не обходит словарь процессов параллельно с ним
+    assert stopper.is_alive()
+    release.set()
+    ticker.join(5)
+    stopper.join(5)
+    assert FakeProcess.started and not FakeProcess.started[0].alive
+    assert scheduler._processes == {}
+    # После остановки новые проходы ничего не запускают
+    scheduler._tick()
+    assert len(FakeProcess.started) == 1
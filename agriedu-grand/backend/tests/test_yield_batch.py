@@ -0,0 +1,68 @@
+"""Пакетный прогноз урожайности: ошибки отдельных строк и прерывание пакета"""
+import json
+
+from app import config
+
+
+def lines(response):
+    return [json.loads(line) for line in response.text.splitlines() if line]
+
+
+def check_mixed(rows):
+    """Строки 0 и 2 спрогнозированы, 1 - ошибка; ошибки приходят раньше прогнозов своего чанка"""
+    summary = rows[-1]["summary"]
+    rows = sorted(rows[:-1], key=lambda row: row["index"])
+    assert [row["index"] for row in rows] == [0, 1, 2]
+    assert "predicted_yield_tons" in rows[0]
+    assert "error" in rows[1]
+    assert "predicted_yield_tons" in rows[2]
+    assert (summary["rows"], summary["predicted"], summary["errors"]) == (3, 2, 1)
+    assert "aborted" not in summary
+    return rows
+
+
+def test_ndjson_bad_line_does_not_drop_the_rest(api):
+    body = b'{"crop": "wheat", "area": 1}\n{bad json\n{"crop": "corn", "area": 2}\n'
+    response = api("POST", "/api/predict-yield/batch", content=body,
+                   headers={"Content-Type": "application/x-ndjson"})
+    assert response.status_code == 200
+    rows = check_mixed(lines(response))
+    assert rows[1]["error"].startswith("Некорректный JSON")
+
+
+def test_ndjson_invalid_utf8_line(api):
+    body = b'{"crop": "wheat", "area": 1}\n\xff\xfe\n{"crop": "corn", "area": 2}\n'
+    response = api("POST", "/api/predict-yield/batch", content=body,
+                   headers={"Content-Type": "application/x-ndjson"})
+    check_mixed(lines(response))
+
+
+def test_csv_bad_row(api):
+    body = "crop,area,region\nwheat,1,Чуйская\ncorn,2,Чуйская,extra\nrice,3,\n".encode()
+    response = api("POST", "/api/predict-yield/batch", content=body, headers={"Content-Type": "text/csv"})
+    rows = check_mixed(lines(response))
+    assert rows[0]["region"] == "Чуйская область"
+
+
+def test_json_array_bad_row(api):
+    body = [{"crop": "wheat", "area": 1}, {"crop": "corn", "area": -1}, {"crop": "rice", "area": 3}]
+    response = api("POST", "/api/predict-yield/batch", json=body)
+    check_mixed(lines(response))
+
+
+def test_broken_json_body_aborts(api):
+    response = api("POST", "/api/predict-yield/batch", content=b'[{"crop": "wheat", "area": 1},',
+                   headers={"Content-Type": "application/json"})
+    rows = lines(response)
+    assert len(rows) == 1
+    assert rows[0]["summary"]["aborted"].startswith("Некорректный JSON")
+
+
+def test_row_limit_aborts(api, monkeypatch):
+    monkeypatch.setattr(config, "YIELD_BATCH_MAX_ROWS", 2)
+    body = b"".join(b'{"crop": "wheat", "area": 1}\n' for _ in range(4))
+    response = api("POST", "/api/predict-yield/batch", content=body,
+                   headers={"Content-Type": "application/x-ndjson"})
+    summary = lines(response)[-1]["summary"]
+    assert summary["predicted"] == 2
+    assert "aborted" in summary
@@ -16,10 +16,14 @@ document.addEventListener('DOMContentLoaded', function() {
             now.toLocaleDateString('ru-RU', options);
     }
     
+    // Адрес API из <meta name="agriedu-api-base">; пустой - запросы к тому же origin без CORS
+    const apiBaseMeta = document.querySelector('meta[name="agriedu-api-base"]');
+    const API_BASE = apiBaseMeta ? apiBaseMeta.content : 'http://localhost:8000';
+    
     // Проверка статуса backend
     async function checkBackendStatus() {
         try {
-            const response = await fetch('http://localhost:8000/api/health', {
+            const response = await fetch(`${API_BASE}/api/health`, {
                 method: 'GET',
                 mode: 'cors',
                 headers: {
@@ -1,25 +1,270 @@
-﻿from http.server import HTTPServer, SimpleHTTPRequestHandler
-import os
-
-class CustomHandler(SimpleHTTPRequestHandler):
-    def do_GET(self):
-        # Если запрос к корню, отдаём index.html
-        if self.path == '/':
-            self.path = '/index.html'
-        # Если файл не существует, тоже отдаём index.html
-        elif not os.path.exists('.' + self.path.split('?')[0]):
-            self.path = '/index.html'
-        return SimpleHTTPRequestHandler.do_GET(self)
-    
-    def end_headers(self):
-        self.send_header('Cache-Control', 'no-cache, no-store, must-revalidate')
-        SimpleHTTPRequestHandler.end_headers(self)
-
-PORT = 5600  # Изменяем порт
-server = HTTPServer(('', PORT), CustomHandler)
-print(f'========================================')
-print(f'🌱 AgriEdu Frontend запущен!')
-print(f'📂 Адрес: http://localhost:{PORT}')
-print(f'📁 Автоматически открывает index.html')
-print(f'========================================')
-server.serve_forever()
+﻿"""Статический сервер фронтенда AgriEdu.
+
+    python server_fixed.py [--port 5600] [--host ""] [--root .] [--watch 0]
+
+- многопоточный (ThreadingHTTPServer, HTTP/1.1 keep-alive): медленный клиент не держит остальных;
+- индекс файлов строится при старте, запросы не трогают файловую систему;
+- gzip и (если установлен пакет brotli) br-варианты текстовых файлов готовятся заранее;
+- ассеты из index.html получают ?v=<хэш содержимого> и кэшируются на год (immutable),
+  сам index.html и ассеты без версии всегда перепроверяются (no-cache + ETag);
+- ETag / Last-Modified и ответ 304; большие файлы отдаются через sendfile без копирования;
+- SPA: путь без расширения, которого нет в индексе, получает index.html.
+
+--watch N пересобирает индекс, если за N секунд изменились файлы (для разработки).
+"""
+import argparse
+import gzip
+import hashlib
+import mimetypes
+import os
+import sys
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import unquote, urlsplit
+
+# Индекс и версии ассетов - общий код с backend (app/static_index.py, только стандартная библиотека)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+from app.static_index import (  # noqa: E402
+    COMPRESS_MIN_SIZE, COMPRESSIBLE, IMMUTABLE, INDEX, MEMORY_LIMIT, REVALIDATE, version_assets, walk,
+)
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class StaticFile:
+    """Файл из индекса: метаданные, ETag и готовые варианты тела"""
+
+    def __init__(self, path: str, content: bytes, mtime: float):
+        self.path = path
+        self.size = len(content)
+        self.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if self.content_type.startswith("text/") or self.content_type == "application/javascript":
+            self.content_type += "; charset=utf-8"
+        self.digest = hashlib.blake2b(content, digest_size=8).hexdigest()
+        self.etag = f'"{self.digest}"'
+        self.last_modified = formatdate(mtime, usegmt=True)
+        self.mtime = int(mtime)
+        # Вариант кодирования -> тело (None - читать с диска)
+        self.variants: Dict[str, Optional[bytes]] = {"identity": content if self.size <= MEMORY_LIMIT else None}
+        if self.size >= COMPRESS_MIN_SIZE and self.content_type.startswith(COMPRESSIBLE):
+            self._compress(content)
+
+    def _compress(self, content: bytes):
+        compressed = gzip.compress(content, compresslevel=9, mtime=0)
+        if len(compressed) < self.size:
+            self.variants["gzip"] = compressed
+        brotli = _brotli()
+        if brotli is not None:
+            compressed = brotli.compress(content, quality=11)
+            if len(compressed) < self.size:
+                self.variants["br"] = compressed
+
+    def with_content(self, content: bytes) -> "StaticFile":
+        """Копия с другим содержимым (index.html с версиями ассетов)"""
+        return StaticFile(self.path, content, self.mtime)
+
+
+class FileIndex:
+    """Снимок каталога: URL-путь -> StaticFile"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.files: Dict[str, StaticFile] = {}
+        self.signature = None
+
+    def scan_signature(self):
+        """Дешёвый отпечаток каталога (имена, размеры, mtime) для --watch"""
+        return tuple(sorted(
+            (url, stat.st_size, stat.st_mtime_ns)
+            for url, full in walk(self.root)
+            for stat in [os.stat(full)]
+        ))
+
+    def build(self):
+        files = {}
+        for url, full in walk(self.root):
+            with open(full, "rb") as f:
+                content = f.read()
+            files[url] = StaticFile(full, content, os.path.getmtime(full))
+
+        index = files.get("/" + INDEX)
+        if index is not None:
+            with open(index.path, "rb") as f:
+                files["/" + INDEX] = index.with_content(version_assets(f.read(), files))
+        self.files = files
+        self.signature = self.scan_signature()
+
+
+def parse_accept_encoding(header: str) -> Dict[str, float]:
+    """Accept-Encoding -> {кодирование: q}"""
+    accepted = {}
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name.strip().lower()] = q
+    return accepted
+
+
+def choose_encoding(static: StaticFile, header: Optional[str]) -> str:
+    accepted = parse_accept_encoding(header or "")
+    for encoding in ("br", "gzip"):
+        if encoding in static.variants and accepted.get(encoding, accepted.get("*", 0)) > 0:
+            return encoding
+    return "identity"
+
+
+class StaticHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "AgriEduStatic/2.0"
+    # Неактивное keep-alive соединение закрывается через 30 секунд
+    timeout = 30
+
+    def do_GET(self):
+        self._serve(head=False)
+
+    def do_HEAD(self):
+        self._serve(head=True)
+
+    def _resolve(self, path: str):
+        """StaticFile по пути запроса и признак версии (?v=...) - только поиск в словаре"""
+        files = self.server.index.files
+        parts = urlsplit(path)
+        url = unquote(parts.path)
+        if url.endswith("/"):
+            url += INDEX
+        static = files.get(url)
+        if static is None and "." not in url.rsplit("/", 1)[-1]:
+            # Маршрут SPA
+            static = files.get("/" + INDEX)
+        versioned = static is not None and parts.query == f"v={static.digest}"
+        return static, versioned
+
+    def _not_modified(self, static: StaticFile, etag: str) -> bool:
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or etag in tags
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since:
+            try:
+                return int(parsedate_to_datetime(if_modified_since).timestamp()) >= static.mtime
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _serve(self, head: bool):
+        static, versioned = self._resolve(self.path)
+        if static is None:
+            body = b"Not Found"
+            self.send_response(HTTPStatus.NOT_FOUND)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+            return
+
+        encoding = choose_encoding(static, self.headers.get("Accept-Encoding"))
+        etag = static.etag if encoding == "identity" else f'"{static.digest}-{encoding}"'
+        body = static.variants[encoding]
+        length = static.size if body is None else len(body)
+        not_modified = self._not_modified(static, etag)
+
+        self.send_response(HTTPStatus.NOT_MODIFIED if not_modified else HTTPStatus.OK)
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", static.last_modified)
+        self.send_header("Cache-Control", IMMUTABLE if versioned else REVALIDATE)
+        self.send_header("Vary", "Accept-Encoding")
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", static.content_type)
+        self.send_header("Content-Length", str(length))
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        if head:
+            return
+        if body is not None:
+            self.wfile.write(body)
+        else:
+            # Крупный файл: socket.sendfile -> os.sendfile, данные идут из page cache в сокет
+            self.wfile.flush()
+            with open(static.path, "rb") as f:
+                self.connection.sendfile(f)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+
+class StaticServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, root: str, quiet: bool = False):
+        self.index = FileIndex(root)
+        self.index.build()
+        self.quiet = quiet
+        super().__init__(address, StaticHandler)
+
+    def watch(self, interval: float):
+        """Фоновая пересборка индекса при изменении файлов; индекс заменяется целиком"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    if self.index.scan_signature() != self.index.signature:
+                        index = FileIndex(self.index.root)
+                        index.build()
+                        self.index = index
+                        print("🔄 Индекс файлов обновлён")
+                except OSError as e:
+                    print(f"⚠️ Не удалось обновить индекс: {e}")
+
+        threading.Thread(target=loop, name="static-watch", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="")
+    parser.add_argument("--port", type=int, default=5600)
+    parser.add_argument("--root", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--watch", type=float, default=0, help="интервал проверки изменений, секунды (0 - выкл.)")
+    parser.add_argument("--quiet", action="store_true", help="без журнала запросов")
+    args = parser.parse_args()
+
+    server = StaticServer((args.host, args.port), args.root, args.quiet)
+    if args.watch > 0:
+        server.watch(args.watch)
+    print(f'========================================')
+    print(f'🌱 AgriEdu Frontend запущен!')
+    print(f'📂 Адрес: http://localhost:{args.port}')
+    print(f'📁 Файлов в индексе: {len(server.index.files)}, brotli: {"да" if _brotli() else "нет"}')
+    print(f'========================================')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -11,5 +11,5 @@ echo.
 echo ?? ??? ???????? ????:
 echo    frontend\index.html
 echo.
-python -m http.server 5500
+python server_fixed.py --port 5500
 pause